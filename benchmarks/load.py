@@ -0,0 +1,270 @@
+"""Replay a realistic mix of requests with concurrent clients.
+
+Clients browse sessions, log observations, edit notes and kinds, search and
+ask for reports, on a log made by astrolog.synthetic. The throughput, the
+latency percentiles and the errors are reported per route. By default the
+application is run in-process, through the Flask test client, on a new
+synthetic log. With --url, requests go to a running server instead, which
+should serve a log generated with the same --observations and --seed (and a
+user to --login with, unless it runs with TEST_FLASK set). Usage::
+
+    python benchmarks/load.py [--observations 10000] [--clients 8] [--requests 2000]
+    python benchmarks/load.py --url http://localhost:5065 --login user:password
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from astrolog.synthetic import KINDS, LAST_DATE, Sizes, object_name
+
+# Route name, method, path, form and JSON body of a request
+Request = tuple[str, str, str, dict[str, Any] | None, Any]
+
+
+def browse_sessions(rng: random.Random, sizes: Sizes) -> Request:
+    return "/session/all", "GET", "/session/all", None, None
+
+
+def view_session(rng: random.Random, sizes: Sizes) -> Request:
+    session = rng.randint(1, sizes.sessions)
+    return "/session/<id>", "GET", f"/session/{session}", None, None
+
+
+def log_observation(rng: random.Random, sizes: Sizes) -> Request:
+    session = rng.randint(1, sizes.sessions)
+    form = {
+        "object": object_name(rng.randint(1, sizes.objects)),
+        "observation-type": "telescope",
+        "telescope_id": "1",
+        "eyepiece_id": str(rng.randint(1, 4)),
+        "note": "Logged by the load test",
+    }
+    path = f"/observation/new/session/{session}"
+    return "/observation/new/session/<id>", "POST", path, form, None
+
+
+def update_note(rng: random.Random, sizes: Sizes) -> Request:
+    form = {
+        "observation-id": str(rng.randint(1, sizes.observations)),
+        "observation-note": f"Edited {rng.random():.6f}",
+    }
+    path = "/ajax/update/observation/note"
+    return path, "POST", path, form, None
+
+
+def update_kind(rng: random.Random, sizes: Sizes) -> Request:
+    body = {
+        "object_id": rng.randint(1, sizes.objects),
+        "kind_id": rng.randint(1, len(KINDS)),
+    }
+    return "/ajax/update/kind", "POST", "/ajax/update/kind", None, body
+
+
+def search(rng: random.Random, sizes: Sizes) -> Request:
+    text = rng.choice(("M1", "M31", "NGC 12", "clouds", "Clear sky", "PGC 5"))
+    query = urllib.parse.urlencode({"search": text})
+    return "/search", "GET", f"/search?{query}", None, None
+
+
+def report(rng: random.Random, sizes: Sizes) -> Request:
+    date = f"{LAST_DATE.year - rng.randrange(3)}-{rng.randint(1, 12):02}-01"
+    return "/ajax/get_report", "GET", f"/ajax/get_report?date={date}", None, None
+
+
+# Mostly reading, as someone going through their log
+MIX: dict[Callable[[random.Random, Sizes], Request], int] = {
+    browse_sessions: 20,
+    view_session: 30,
+    log_observation: 5,
+    update_note: 5,
+    update_kind: 5,
+    search: 15,
+    report: 10,
+}
+
+
+class LocalClient:
+    """The application in this process, through the Flask test client"""
+
+    def __init__(self) -> None:
+        from astrolog.web.app import app
+
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, form: Any, body: Any) -> int:
+        response = self.client.open(path, method=method, data=form, json=body)
+        return response.status_code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class HTTPClient:
+    """A server at `url`, with its own cookies"""
+
+    def __init__(self, url: str, login: str | None) -> None:
+        self.url = url.rstrip("/")
+        cookies = urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        self.opener = urllib.request.build_opener(cookies, NoRedirect)
+        if login is not None:
+            username, password = login.split(":", 1)
+            form = {"username": username, "password": password}
+            self.request("POST", "/login", form, None)
+
+    def request(self, method: str, path: str, form: Any, body: Any) -> int:
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        elif body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(
+            self.url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, route: str, latency: float, failed: bool) -> None:
+        with self.lock:
+            self.latencies[route].append(latency)
+            if failed:
+                self.errors[route] += 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted `values`"""
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def client_loop(
+    make_client: Callable[[], Any],
+    sizes: Sizes,
+    seed: int,
+    remaining: Callable[[], bool],
+    results: Results,
+) -> None:
+    rng = random.Random(seed)
+    client = make_client()
+    scenarios, weights = list(MIX), list(MIX.values())
+    while remaining():
+        [scenario] = rng.choices(scenarios, weights=weights)
+        route, method, path, form, body = scenario(rng, sizes)
+        start = time.perf_counter()
+        try:
+            failed = client.request(method, path, form, body) >= 400
+        except Exception:
+            failed = True
+        results.add(route, time.perf_counter() - start, failed)
+
+
+def run(
+    make_client: Callable[[], Any], sizes: Sizes, clients: int, requests: int, seed: int
+) -> tuple[Results, float]:
+    results = Results()
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def remaining() -> bool:
+        with counter_lock:
+            return next(counter, None) is not None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        loops = [
+            pool.submit(client_loop, make_client, sizes, seed + i, remaining, results)
+            for i in range(clients)
+        ]
+    for loop in loops:
+        loop.result()
+    return results, time.perf_counter() - start
+
+
+def print_results(results: Results, elapsed: float) -> None:
+    print(
+        f"{'route':<32} {'requests':>8} {'errors':>7} {'req/s':>8} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    total = total_errors = 0
+    for route, latencies in sorted(results.latencies.items()):
+        latencies.sort()
+        errors = results.errors.get(route, 0)
+        total += len(latencies)
+        total_errors += errors
+        p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (50, 95, 99))
+        print(
+            f"{route:<32} {len(latencies):>8} {errors / len(latencies):>6.1%} "
+            f"{len(latencies) / elapsed:>8.1f} "
+            f"{p50:>7.1f}ms {p95:>7.1f}ms {p99:>7.1f}ms"
+        )
+    print(
+        f"{total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s, "
+        f"{total_errors} errors"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--observations", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--url", help="Server to test instead of the local app")
+    parser.add_argument("--login", help="username:password for the server")
+    args = parser.parse_args()
+    sizes = Sizes.for_observations(args.observations)
+
+    if args.url:
+        results, elapsed = run(
+            lambda: HTTPClient(args.url, args.login),
+            sizes,
+            args.clients,
+            args.requests,
+            args.seed,
+        )
+        print_results(results, elapsed)
+        return
+
+    from astrolog.database import MODELS, AstroLogDatabase, database_proxy
+    from astrolog.synthetic import generate
+
+    os.environ["TEST_FLASK"] = "1"
+    with tempfile.TemporaryDirectory() as directory:
+        database = AstroLogDatabase(os.path.join(directory, "AstroLog.db"))
+        database_proxy.initialize(database)
+        database.create_tables(MODELS)
+        generate(args.observations, seed=args.seed)
+        results, elapsed = run(
+            LocalClient, sizes, args.clients, args.requests, args.seed
+        )
+        database.close()
+    print_results(results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Render visibility plots concurrently through the plot worker pool.
+
+Reports the throughput and the resident memory of the web process, which
+should stay flat however many plots are rendered. Usage::
+
+    python benchmarks/plots.py [--renders 200] [--clients 8] [--workers 4]
+"""
+
+import argparse
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from astrolog.web import planning
+from astrolog.web.app import app
+
+PARAMETERS = dict(
+    latitude=55.86,
+    longitude=-9.85,
+    altitude=0,
+    utcoffset=1,
+    date="2023-01-01",
+    names=[],
+)
+
+
+def render(_: int) -> None:
+    with app.app_context():
+        planning.render("visibility_plot", **PARAMETERS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    app.config["PLOT_WORKERS"] = args.workers
+
+    render(0)  # Start the workers and import the plotting stack
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as clients:
+        for done, _ in enumerate(clients.map(render, range(args.renders)), start=1):
+            if done % max(args.renders // 4, 1) == 0:
+                rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                print(f"{done:>6} renders, max RSS of web process {rss:.1f}MB")
+    elapsed = time.perf_counter() - start
+    print(f"{args.renders / elapsed:.1f} plots/s with {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Time the queries of the log on synthetic datasets, against stored baselines.
+
+Every size is generated by astrolog.synthetic into a temporary database, and
+each benchmark reports the median of its runs in milliseconds. Timings more
+than --tolerance times their baseline are flagged, and make the script fail
+with --check. Usage::
+
+    python benchmarks/queries.py [--sizes 10000 100000] [--runs 5] [--check]
+    python benchmarks/queries.py --save  # Store the timings as the new baselines
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from astrolog.api import (
+    create_observation,
+    get_monthly_report,
+    get_yearly_report,
+    search_objects,
+    search_observations,
+    search_sessions,
+)
+from astrolog.database import (
+    MODELS,
+    AstroLogDatabase,
+    EyePiece,
+    Object,
+    Session,
+    Structure,
+    Telescope,
+    database_proxy,
+)
+from astrolog.report import Report
+from astrolog.synthetic import LAST_DATE, generate
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def benchmarks() -> dict[str, Callable[[], object]]:
+    """The functions to time, on the dataset in database_proxy"""
+    year = LAST_DATE.year
+    session = Session.get_by_id(1)
+    popular = Object.get_by_id(1)
+    structure = Structure.get_by_id(1)
+    telescope, eyepiece = Telescope.get_by_id(1), EyePiece.get_by_id(3)
+    notes = itertools.count()
+
+    def log() -> object:
+        return create_observation(
+            session,
+            popular,
+            telescope=telescope,
+            eyepiece=eyepiece,
+            note=str(next(notes)),
+        )
+
+    return {
+        "create_observation": log,
+        "Report.from_query": lambda: Report.from_query(
+            Session.select().where(Session.date.year == year)
+        ),
+        "get_monthly_report": lambda: get_monthly_report(year, 1),
+        "get_yearly_report": lambda: get_yearly_report(year),
+        "search_objects": lambda: search_objects("NGC 1", size=50),
+        "search_sessions": lambda: search_sessions("clouds", size=50),
+        "search_observations": lambda: search_observations("M1", size=50),
+        "Structure.objects": lambda: structure.objects,
+        "Session.number_of_observations": lambda: session.number_of_observations,
+    }
+
+
+def measure(function: Callable[[], object], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(size: int, runs: int, seed: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        database = AstroLogDatabase(os.path.join(directory, "AstroLog.db"))
+        database_proxy.initialize(database)
+        database.create_tables(MODELS)
+        start = time.perf_counter()
+        generate(size, seed=seed)
+        print(f"Generated {size} observations in {time.perf_counter() - start:.1f}s")
+        timings = {name: measure(f, runs) for name, f in benchmarks().items()}
+        database.close()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    baselines: dict[str, dict[str, float]] = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    regressions = 0
+    for size in args.sizes:
+        timings = run(size, args.runs, args.seed)
+        baseline = baselines.get(str(size), {})
+        print(f"{'benchmark':<32} {'median':>10} {'baseline':>10}")
+        for name, timing in timings.items():
+            reference = baseline.get(name)
+            flag = ""
+            if reference is not None and timing > reference * args.tolerance:
+                flag = "  slower"
+                regressions += 1
+            shown = f"{reference:>8.2f}ms" if reference is not None else f"{'-':>10}"
+            print(f"{name:<32} {timing:>8.2f}ms {shown}{flag}")
+        if args.save:
+            baselines[str(size)] = {name: round(t, 3) for name, t in timings.items()}
+    if args.save:
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+    if args.check and regressions:
+        sys.exit(f"{regressions} benchmarks are slower than their baseline")
+
+
+if __name__ == "__main__":
+    main()
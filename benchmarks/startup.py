@@ -0,0 +1,58 @@
+"""Measure the cold start of the web application.
+
+Every run imports the module in a fresh interpreter, so nothing is cached in
+``sys.modules`` between runs. Usage::
+
+    python benchmarks/startup.py [--runs 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ("astropy", "astroquery") if m in sys.modules)
+print(elapsed, ",".join(heavy))
+"""
+
+MODULES = ("astrolog.web.app", "astrolog.plots")
+
+
+def measure(module: str, runs: int) -> tuple[list[float], str]:
+    timings = []
+    heavy = ""
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ""
+    return timings, heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    print(f"{'module':<20} {'median':>9} {'min':>9} {'max':>9}  heavy imports")
+    for module in MODULES:
+        timings, heavy = measure(module, args.runs)
+        print(
+            f"{module:<20} "
+            f"{statistics.median(timings) * 1000:>7.1f}ms "
+            f"{min(timings) * 1000:>7.1f}ms "
+            f"{max(timings) * 1000:>7.1f}ms  "
+            f"{heavy or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
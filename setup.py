@@ -12,14 +12,14 @@ setup(
         "astroquery",
         "bcrypt",
         "Flask>=2.3.2",
-        "matplotlib",
-        "mpld3",
         "numpy",
         "peewee>=3.15",
+        "Pillow",
         "pygments>=2.15.1",
         "pytest",
         "setuptools>=68.0.0",
     ],
+    extras_require={"brotli": ["brotli"]},
     author="Daniel Thaagaard Andreasen",
     license="MIT",
 )
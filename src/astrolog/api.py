@@ -1,19 +1,27 @@
-import bcrypt
+from peewee import JOIN, ModelSelect
 
+from astrolog import passwords
 from astrolog.database import (
+    AltName,
     Barlow,
     Binocular,
     Camera,
     EyePiece,
     Filter,
     FrontFilter,
+    Image,
+    Kind,
     Location,
     Object,
     Observation,
     Session,
+    Structure,
     Telescope,
     User,
+    load_alt_names,
 )
+from astrolog.pagination import Page, paginate
+from astrolog.passwords import PasswordHasher
 from astrolog.report import Report
 
 
@@ -63,6 +71,109 @@ def create_observation(
     )
 
 
+def get_sessions(
+    size: int, after: str | None = None, before: str | None = None
+) -> Page:
+    """Sessions, newest first, a page at a time"""
+    query = Session.select(Session, Location, Session.count_observations()).join(
+        Location
+    )
+    return paginate(
+        query, [Session.date, Session.id], size, after, before, descending=True
+    )
+
+
+def get_objects(size: int, after: str | None = None, before: str | None = None) -> Page:
+    """Objects by name, with their kind, structure and alt names, a page at a time"""
+    query = (
+        Object.select(Object, Kind, Structure)
+        .join(Kind, JOIN.LEFT_OUTER)
+        .switch(Object)
+        .join(Structure, JOIN.LEFT_OUTER)
+    )
+    page = paginate(query, [Object.name, Object.id], size, after, before)
+    load_alt_names(page.items)
+    return page
+
+
+def matching_objects(text: str) -> ModelSelect:
+    expr = f"%{text}%"
+    return (
+        Object.select()
+        .join(AltName, JOIN.LEFT_OUTER)
+        .switch(Object)
+        .join(Structure, JOIN.LEFT_OUTER)
+        .where((Object.name**expr) | (AltName.name**expr) | (Structure.name**expr))
+    )
+
+
+def search_objects(
+    text: str, size: int, after: str | None = None, before: str | None = None
+) -> Page:
+    """Objects with `text` in their name, an alternative name or structure"""
+    query = matching_objects(text).select(
+        Object, Structure, Object.count_observations()
+    )
+    page = paginate(query.distinct(), [Object.name, Object.id], size, after, before)
+    load_alt_names(page.items)
+    return page
+
+
+def search_sessions(
+    text: str, size: int, after: str | None = None, before: str | None = None
+) -> Page:
+    """Sessions with `text` in their note, newest first"""
+    query = (
+        Session.select(Session, Location, Session.count_observations())
+        .join(Location)
+        .where(Session.note ** f"%{text}%")
+    )
+    return paginate(
+        query, [Session.date, Session.id], size, after, before, descending=True
+    )
+
+
+def search_observations(
+    text: str, size: int, after: str | None = None, before: str | None = None
+) -> Page:
+    """Observations with `text` in their note or of an object found by it"""
+    objects = matching_objects(text).select(Object.id)
+    query = (
+        Observation.with_related()
+        .select_extend(Session, Location)
+        .switch(Observation)
+        .join(Session)
+        .join(Location)
+        .where((Observation.note ** f"%{text}%") | (Observation.object.in_(objects)))
+    )
+    return paginate(query, [Observation.id], size, after, before, descending=True)
+
+
+def get_gallery(size: int, after: str | None = None, before: str | None = None) -> Page:
+    """Observations with an image, newest image first, a page at a time.
+
+    The image, object and session of each observation are in the same query.
+    """
+    query = (
+        Observation.select(Observation, Image, Object, Session)
+        .join(Image)
+        .switch(Observation)
+        .join(Object)
+        .switch(Observation)
+        .join(Session)
+    )
+    return paginate(
+        query,
+        # The same image may be on several observations
+        [Image.id, Observation.id],
+        size,
+        after,
+        before,
+        descending=True,
+        values=lambda observation: [observation.image.id, observation.id],
+    )
+
+
 def get_monthly_report(year: int, month: int) -> None | Report:
     query = Session.select().where(
         (Session.date.year == year) & (Session.date.month == month)
@@ -89,18 +200,33 @@ def delete_location(location: Location) -> bool:
             return False
 
 
-def create_user(username: str, password: str) -> User:
+def create_user(
+    username: str, password: str, hasher: PasswordHasher | None = None
+) -> User:
+    hasher = hasher or passwords.get_hasher()
     if not username or not password:
         raise ValueError("Username and password are both required")
     if len(password) < 8:
         raise ValueError("Too short password, minimum of 8 characters are required")
-    hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    hashed_password = hasher.hash(password)
     return User.create(username=username, hashed_password=hashed_password)
 
 
-def valid_login(username: str, password: str) -> bool:
+def valid_login(
+    username: str, password: str, hasher: PasswordHasher | None = None
+) -> bool:
+    """Whether the password is right, rehashing it if the cost has changed.
+
+    Raises HasherBusy when too many passwords are being checked already.
+    """
+    hasher = hasher or passwords.get_hasher()
     if (not username) or (not password):
         return False
     if (user := User.get_or_none(username=username)) is None:
         return False
-    return bcrypt.checkpw(password.encode(), user.hashed_password)
+    if not hasher.verify(password, user.hashed_password):
+        return False
+    if hasher.needs_rehash(user.hashed_password):
+        user.hashed_password = hasher.hash(password)
+        user.save()
+    return True
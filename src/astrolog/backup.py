@@ -0,0 +1,334 @@
+"""Online backups of the log and its uploads, and their verified restore.
+
+The database is copied with SQLite's online backup API a few pages at a time,
+pausing between steps, from a connection of its own, so the application keeps
+serving requests meanwhile, best with the database in WAL mode. Uploads are
+kept by content hash in objects/, shared by every snapshot, so a snapshot only
+copies the files that are new or changed since the previous one. Usage::
+
+    python -m astrolog.backup create backups [--keep 7] [--every 24]
+    python -m astrolog.backup verify backups/20241231T235959.000000
+    python -m astrolog.backup restore backups/20241231T235959.000000
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any
+
+from astrolog.images import DEFAULT_UPLOAD_FOLDER, file_sha256
+
+DEFAULT_DATABASE = os.getenv(
+    "ASTRO_LOG_DB", os.path.join(os.path.abspath("."), "AstroLog.db")
+)
+MANIFEST = "manifest.json"
+DATABASE = "AstroLog.db"
+NAME_FORMAT = "%Y%m%dT%H%M%S.%f"
+# SQLITE_BUSY and SQLITE_LOCKED, which the sqlite3 module only has from 3.11
+BUSY = (5, 6)
+
+logger = logging.getLogger("astrolog.backup")
+
+
+@dataclass
+class Snapshot:
+    path: str
+    # The database file and its hash, and the hash, size and mtime of uploads
+    manifest: dict[str, Any]
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        with open(os.path.join(path, MANIFEST)) as f:
+            return cls(path, json.load(f))
+
+    @property
+    def created(self) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(self.manifest["created"])
+
+    @property
+    def uploads(self) -> dict[str, dict[str, Any]]:
+        return self.manifest["uploads"]
+
+
+def snapshots(directory: str) -> list[Snapshot]:
+    """The complete snapshots in `directory`, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(os.listdir(directory))
+    return [
+        Snapshot.load(os.path.join(directory, name))
+        for name in names
+        if os.path.exists(os.path.join(directory, name, MANIFEST))
+    ]
+
+
+def object_path(directory: str, sha256: str) -> str:
+    return os.path.join(directory, "objects", sha256[:2], sha256)
+
+
+def copy_database(
+    source: str,
+    target: str,
+    pages: int = 256,
+    pause: float = 0.01,
+    max_retries: int = 100,
+) -> None:
+    """Copy the database `source` to `target`, `pages` pages at a time.
+
+    In WAL mode the copy is made in a read transaction, which writers do not
+    wait for, and which keeps it to the state the database was in when it
+    started (without it, every write made meanwhile would restart the copy).
+    With a rollback journal, writers only wait for the step being copied, but
+    steps are retried while the database is locked, `max_retries` times.
+    """
+    retries = 0
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal retries
+        if status in BUSY:
+            retries += 1
+            if retries > max_retries:
+                raise sqlite3.OperationalError(f"{source} is too busy to back up")
+        time.sleep(pause)
+
+    with (
+        closing(sqlite3.connect(source, isolation_level=None)) as connection,
+        closing(sqlite3.connect(target)) as copy,
+    ):
+        if connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            connection.execute("BEGIN")
+            connection.execute("SELECT count(*) FROM sqlite_master").fetchall()
+        connection.backup(copy, pages=pages, progress=progress, sleep=pause)
+
+
+def check_database(path: str) -> bool:
+    with closing(sqlite3.connect(path)) as connection:
+        return connection.execute("PRAGMA integrity_check").fetchall() == [("ok",)]
+
+
+def create_snapshot(
+    directory: str,
+    database: str = DEFAULT_DATABASE,
+    uploads: str = DEFAULT_UPLOAD_FOLDER,
+    pages: int = 256,
+    pause: float = 0.01,
+) -> Snapshot:
+    """Back up `database` and the files in `uploads` to a new snapshot.
+
+    Uploads are only hashed when their size or time of modification changed
+    since the previous snapshot, and only copied when their content is new.
+    The snapshot is written to a directory of its own, which only gets its
+    final name once complete.
+    """
+    previous = snapshots(directory)
+    known = previous[-1].uploads if previous else {}
+    now = datetime.datetime.now()
+    path = os.path.join(directory, now.strftime(NAME_FORMAT))
+    partial = f"{path}.partial"
+    os.makedirs(partial)
+
+    copy_database(database, os.path.join(partial, DATABASE), pages, pause)
+    if not check_database(os.path.join(partial, DATABASE)):
+        shutil.rmtree(partial)
+        raise ValueError(f"The copy of {database} does not pass the integrity check")
+
+    files: dict[str, dict[str, Any]] = {}
+    copied = 0
+    for root, _, names in os.walk(uploads):
+        for name in names:
+            if name.endswith(".upload"):
+                continue  # Still being uploaded
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, uploads)
+            stat = os.stat(source)
+            entry = known.get(relative)
+            if (
+                entry is None
+                or entry["size"] != stat.st_size
+                or entry["mtime_ns"] != stat.st_mtime_ns
+            ):
+                entry = {
+                    "sha256": file_sha256(source),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+            target = object_path(directory, entry["sha256"])
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(source, f"{target}.partial")
+                os.replace(f"{target}.partial", target)
+                copied += 1
+            files[relative] = entry
+
+    manifest = {
+        "created": now.isoformat(),
+        "database": file_sha256(os.path.join(partial, DATABASE)),
+        "uploads": files,
+    }
+    with open(os.path.join(partial, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(partial, path)
+    logger.info("Backed up to %s, %d of %d uploads copied", path, copied, len(files))
+    return Snapshot(path, manifest)
+
+
+def verify_snapshot(path: str) -> list[str]:
+    """What is missing or damaged in the snapshot at `path`"""
+    snapshot = Snapshot.load(path)
+    problems = []
+    database = os.path.join(path, DATABASE)
+    if not os.path.exists(database):
+        problems.append("The database is missing")
+    elif file_sha256(database) != snapshot.manifest["database"]:
+        problems.append("The database does not match its hash")
+    elif not check_database(database):
+        problems.append("The database does not pass the integrity check")
+    directory = os.path.dirname(os.path.abspath(path))
+    for sha256 in sorted({entry["sha256"] for entry in snapshot.uploads.values()}):
+        stored = object_path(directory, sha256)
+        if not os.path.exists(stored):
+            problems.append(f"The upload {sha256} is missing")
+        elif file_sha256(stored) != sha256:
+            problems.append(f"The upload {sha256} does not match its hash")
+    return problems
+
+
+def restore_snapshot(
+    path: str,
+    database: str = DEFAULT_DATABASE,
+    uploads: str = DEFAULT_UPLOAD_FOLDER,
+) -> None:
+    """Restore the snapshot at `path`, once verified, over `database` and `uploads`.
+
+    The database is written through the backup API, so that SQLite replaces
+    it whole, and checked afterwards. Uploads not in the snapshot are kept.
+    """
+    if problems := verify_snapshot(path):
+        raise ValueError(f"{path} cannot be restored: {'; '.join(problems)}")
+    copy_database(os.path.join(path, DATABASE), database, pages=-1)
+    if not check_database(database):
+        raise ValueError(f"The restored {database} does not pass the integrity check")
+    directory = os.path.dirname(os.path.abspath(path))
+    for relative, entry in Snapshot.load(path).uploads.items():
+        target = os.path.join(uploads, relative)
+        if os.path.exists(target) and file_sha256(target) == entry["sha256"]:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(object_path(directory, entry["sha256"]), f"{target}.partial")
+        os.replace(f"{target}.partial", target)
+
+
+def rotate(directory: str, keep: int) -> list[str]:
+    """Remove all but the `keep` latest snapshots, and the uploads only they had"""
+    existing = snapshots(directory)
+    removed = existing[:-keep] if keep > 0 else existing
+    for snapshot in removed:
+        shutil.rmtree(snapshot.path)
+    kept = {
+        entry["sha256"]
+        for snapshot in existing[len(removed) :]
+        for entry in snapshot.uploads.values()
+    }
+    objects = os.path.join(directory, "objects")
+    for root, _, names in os.walk(objects):
+        for name in names:
+            if name not in kept:
+                os.remove(os.path.join(root, name))
+    return [snapshot.path for snapshot in removed]
+
+
+class BackupScheduler(threading.Thread):
+    """Makes a snapshot every `interval` seconds and keeps the `keep` latest.
+
+    The first is made once `interval` has passed since the latest snapshot,
+    so restarting the application does not postpone the backups.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        interval: float,
+        keep: int,
+        database: str = DEFAULT_DATABASE,
+        uploads: str = DEFAULT_UPLOAD_FOLDER,
+    ) -> None:
+        super().__init__(name="backup", daemon=True)
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.database = database
+        self.uploads = uploads
+        self.stopped = threading.Event()
+
+    def delay(self) -> float:
+        """Seconds until the next snapshot is due"""
+        existing = snapshots(self.directory)
+        if not existing:
+            return 0
+        age = (datetime.datetime.now() - existing[-1].created).total_seconds()
+        return max(self.interval - age, 0)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.delay()):
+            try:
+                create_snapshot(self.directory, self.database, self.uploads)
+                rotate(self.directory, self.keep)
+            except Exception:
+                logger.exception("The backup to %s failed", self.directory)
+                self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--uploads", default=DEFAULT_UPLOAD_FOLDER)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Make a snapshot")
+    create.add_argument("directory")
+    create.add_argument("--keep", type=int, default=7)
+    create.add_argument("--every", type=float, help="Hours between snapshots")
+    verify = commands.add_parser("verify", help="Check a snapshot")
+    verify.add_argument("snapshot")
+    restore = commands.add_parser("restore", help="Restore a verified snapshot")
+    restore.add_argument("snapshot")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.command == "create" and args.every:
+        scheduler = BackupScheduler(
+            args.directory, args.every * 3600, args.keep, args.database, args.uploads
+        )
+        scheduler.run()
+    elif args.command == "create":
+        create_snapshot(args.directory, args.database, args.uploads)
+        for path in rotate(args.directory, args.keep):
+            print(f"Removed {path}")
+    elif args.command == "verify":
+        problems = verify_snapshot(args.snapshot)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print(f"{args.snapshot} is complete")
+    else:
+        try:
+            restore_snapshot(args.snapshot, args.database, args.uploads)
+        except ValueError as error:
+            sys.exit(str(error))
+        print(f"Restored {args.snapshot} to {args.database} and {args.uploads}")
+
+
+if __name__ == "__main__":
+    main()
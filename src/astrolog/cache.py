@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+def cache_key(*parts: Any) -> str:
+    """Canonical hash of JSON serialisable parts, independent of dict order"""
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory cache keeping the `maxsize` most recently used items.
+
+    Items can be given an absolute expiry time (as returned by `time.time()`).
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            if (item := self._items.get(key)) is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires: float | None = None) -> None:
+        with self._lock:
+            self._items[key] = (expires, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class DiskCache:
+    """Cache of JSON serialisable values stored as one file per key.
+
+    When the files take up more than `max_bytes`, the least recently used ones
+    are removed. Files are written atomically, so several processes can share
+    the same directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024**2) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> tuple[Any, float | None] | None:
+        """Value and expiry time stored under `key`, if any"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                item = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if item["expires"] is not None and item["expires"] < time.time():
+            self.delete(key)
+            return None
+        os.utime(path)
+        return item["value"], item["expires"]
+
+    def get(self, key: str) -> Any | None:
+        if (item := self.load(key)) is None:
+            return None
+        return item[0]
+
+    def set(self, key: str, value: Any, expires: float | None = None) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"expires": expires, "value": value}, f)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            self.delete(entry.name.removesuffix(".json"))
+
+    def _entries(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def evict(self) -> None:
+        files = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.name))
+        size = sum(file[1] for file in files)
+        for _, file_size, name in sorted(files):
+            if size <= self.max_bytes:
+                break
+            self.delete(name.removesuffix(".json"))
+            size -= file_size
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional (shared) disk cache"""
+
+    def __init__(self, memory: LRUCache, disk: DiskCache | None = None) -> None:
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Any | None:
+        if (value := self.memory.get(key)) is not None:
+            return value
+        if self.disk is None or (item := self.disk.load(key)) is None:
+            return None
+        value, expires = item
+        self.memory.set(key, value, expires)
+        return value
+
+    def set(self, key: str, value: Any, expires: float | None = None) -> None:
+        self.memory.set(key, value, expires)
+        if self.disk is not None:
+            self.disk.set(key, value, expires)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
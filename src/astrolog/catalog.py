@@ -0,0 +1,78 @@
+import copy
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, TypeVar
+
+from peewee import Model
+
+from astrolog.database import (
+    Barlow,
+    Binocular,
+    Camera,
+    DataVersion,
+    EyePiece,
+    Filter,
+    FrontFilter,
+    Telescope,
+)
+from astrolog.optics import OpticsMatrix, optics_matrix
+
+EQUIPMENT = (Barlow, Binocular, Camera, EyePiece, Filter, FrontFilter, Telescope)
+
+M = TypeVar("M", bound=Model)
+
+
+@dataclass(frozen=True)
+class Equipment:
+    """All the equipment, by model and id, as it was when it was loaded"""
+
+    version: dict[str, tuple[int, float]]
+    items: dict[type[Model], dict[int, Model]]
+
+    def all(self, model: type[M]) -> list[M]:
+        return list(self.items[model].values())  # type: ignore[arg-type]
+
+    def get(self, model: type[M], id: Any) -> M | None:
+        """The item with `id` (e.g. from a form), if any.
+
+        A copy is returned, as telescopes are changed by using them.
+        """
+        try:
+            item = self.items[model].get(int(id))
+        except (TypeError, ValueError):
+            return None
+        return copy.copy(item) if item is not None else None  # type: ignore
+
+    @cached_property
+    def optics(self) -> OpticsMatrix:
+        """Every telescope, eyepiece and barlow combination, computed once"""
+        return optics_matrix(self.all(Telescope), self.all(EyePiece), self.all(Barlow))
+
+
+class EquipmentCatalog:
+    """In-memory copy of the equipment, which rarely changes.
+
+    The equipment is loaded again after `invalidate()`, or when the DataVersion
+    of one of its tables has changed, e.g. by another process. Checking that is
+    a single query, instead of one for each kind of equipment.
+    """
+
+    def __init__(self) -> None:
+        self._equipment: Equipment | None = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Equipment:
+        version = DataVersion.of(*EQUIPMENT)
+        with self._lock:
+            if self._equipment is None or self._equipment.version != version:
+                items = {
+                    model: {item.id: item for item in model.select().order_by(model.id)}
+                    for model in EQUIPMENT
+                }
+                self._equipment = Equipment(version, items)
+            return self._equipment
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._equipment = None
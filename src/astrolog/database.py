@@ -1,25 +1,92 @@
 import os
-from typing import Iterable, Optional, cast
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, cast
 
-import astropy.units as u
-from astropy.coordinates import EarthLocation
 from peewee import (
+    JOIN,
     AutoField,
     BlobField,
     BooleanField,
     Check,
     DatabaseProxy,
     DateField,
+    DateTimeField,
     FloatField,
     ForeignKeyField,
     IntegerField,
     Model,
+    ModelSelect,
+    SqliteDatabase,
     TextField,
+    fn,
 )
+from playhouse.sqlite_ext import AutoIncrementField
+
+from astrolog import optics
+
+if TYPE_CHECKING:
+    from astropy.coordinates import EarthLocation
 
 database_proxy = DatabaseProxy()
-degree = cast(u.UnitBase, u.deg)
-meter = cast(u.UnitBase, u.m)
+
+
+class AstroLogDatabase(SqliteDatabase):
+    """SQLite database telling its listeners about every statement it runs.
+
+    Listeners are called with the SQL, its parameters and the time it took in
+    seconds, in the thread that ran the statement (see astrolog.web.profiling).
+    """
+
+    listeners: list[Callable[[str, Any, float], None]] = []
+
+    def execute_sql(self, sql: str, params: Any = None) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params)
+        finally:
+            duration = time.perf_counter() - start
+            for listener in self.listeners:
+                listener(sql, params, duration)
+
+
+@contextmanager
+def count_queries() -> Iterator[list[str]]:
+    """The SQL of the statements run through database_proxy within the block"""
+    database = database_proxy.obj
+    execute_sql = database.execute_sql
+    queries: list[str] = []
+
+    def counting(sql: str, params: Any = None, *args: Any, **kwargs: Any) -> Any:
+        queries.append(sql)
+        return execute_sql(sql, params, *args, **kwargs)
+
+    database.execute_sql = counting
+    try:
+        yield queries
+    finally:
+        del database.execute_sql
+
+
+# Counts every write to a table in its DataVersion row, whatever makes the write
+VERSION_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS "{table}_version_{event}" AFTER {event} ON "{table}"
+BEGIN
+    UPDATE "dataversion"
+    SET "version" = "version" + 1,
+        "modified" = (julianday('now') - 2440587.5) * 86400.0
+    WHERE "name" = '{table}';
+END
+"""
+
+# Appends every write to a table to the change log, in the same transaction
+CHANGE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS "{table}_change_{event}" AFTER {event} ON "{table}"
+BEGIN
+    INSERT INTO "changeevent" ("name", "row_id", "action", "time")
+    VALUES ('{table}', {row}."id", '{event}', (julianday('now') - 2440587.5) * 86400.0);
+END
+"""
 
 
 class AstroLogModel(Model):
@@ -28,6 +95,73 @@ class AstroLogModel(Model):
     class Meta:
         database = database_proxy
 
+    @classmethod
+    def create_table(cls, safe: bool = True, **options: Any) -> None:
+        """Create the table, and the triggers keeping its DataVersion up to date
+        and adding its writes to the change log.
+
+        The triggers are created on existing tables too, so databases made
+        before they existed get them the next time the tables are created.
+        """
+        super().create_table(safe=safe, **options)
+        if cls in (DataVersion, ChangeEvent):
+            return
+        DataVersion.create_table(safe=True)
+        ChangeEvent.create_table(safe=True)
+        table = cls._meta.table_name
+        DataVersion.insert(
+            name=table, version=0, modified=time.time()
+        ).on_conflict_ignore().execute()
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cls._meta.database.execute_sql(
+                VERSION_TRIGGER.format(table=table, event=event)
+            )
+            row = "OLD" if event == "DELETE" else "NEW"
+            cls._meta.database.execute_sql(
+                CHANGE_TRIGGER.format(table=table, event=event, row=row)
+            )
+
+
+class DataVersion(AstroLogModel):
+    """Number of writes to a table and the time of the last one"""
+
+    name = TextField(unique=True)
+    version = IntegerField(default=0)
+    modified = FloatField()
+
+    @staticmethod
+    def of(*models: type[Model] | str) -> dict[str, tuple[int, float]]:
+        """Version and time of the last change of `models`, or of tables by name"""
+        names = [m if isinstance(m, str) else m._meta.table_name for m in models]
+        query = DataVersion.select().where(DataVersion.name.in_(names))
+        return {row.name: (row.version, row.modified) for row in query}
+
+
+class ChangeEvent(AstroLogModel):
+    """A row inserted, updated or deleted, in the order the writes were made.
+
+    The id is the sequence number of the change. SQLite makes one write at a
+    time, so the changes are committed in the order of their ids, and a reader
+    having seen the changes up to an id will not miss any below it later.
+    """
+
+    id = AutoIncrementField()  # Never reused
+    name = TextField()
+    row_id = IntegerField()
+    action = TextField()
+    time = FloatField()
+
+    @staticmethod
+    def since(seq: int, limit: int = 1000) -> list["ChangeEvent"]:
+        """The first `limit` changes after the change `seq`, oldest first"""
+        query = ChangeEvent.select().where(ChangeEvent.id > seq)
+        return list(query.order_by(ChangeEvent.id).limit(limit))
+
+    @staticmethod
+    def latest() -> int:
+        """Sequence number of the last change, 0 if there are none"""
+        return ChangeEvent.select(fn.MAX(ChangeEvent.id)).scalar() or 0
+
 
 class Location(AstroLogModel):
     name = TextField()
@@ -45,7 +179,13 @@ class Location(AstroLogModel):
         return parts[0] + parts[1] / 60 + parts[2] / 3600
 
     @property
-    def earth_location(self) -> EarthLocation:
+    def earth_location(self) -> "EarthLocation":
+        # astropy is only needed for planning, so keep it out of the import path
+        import astropy.units as u
+        from astropy.coordinates import EarthLocation
+
+        degree = cast(u.UnitBase, u.deg)
+        meter = cast(u.UnitBase, u.m)
         latitude_decimal = Location.coordinate_to_decimal(str(self.latitude))
         longitude_decimal = Location.coordinate_to_decimal(str(self.longitude))
         return EarthLocation(
@@ -109,23 +249,34 @@ class Telescope(AstroLogModel):
 
     @property
     def magnification(self) -> Optional[int]:
-        if eyepiece := self.eyepiece:
-            if barlow := self.barlow:
-                return int(
-                    self.focal_length / eyepiece.focal_length * barlow.multiplier
-                )
-            return int(self.focal_length / eyepiece.focal_length)
-        return None
+        return self.magnification_with(self.eyepiece, self.barlow)
 
     @property
     def fov(self) -> float | None:
-        """True field of view, which is apparent fov (afov) / magnification"""
-        if eyepiece := self.eyepiece:
-            if eyepiece.afov:
-                return round(
-                    eyepiece.afov / (self.focal_length / eyepiece.focal_length), 2
-                )
-        return None
+        return self.fov_with(self.eyepiece, self.barlow)
+
+    def magnification_with(
+        self, eyepiece: Optional[EyePiece], barlow: Optional[Barlow] = None
+    ) -> Optional[int]:
+        """Magnification with an eyepiece and barlow, without using them"""
+        if eyepiece is None:
+            return None
+        multiplier = barlow.multiplier if barlow is not None else 1
+        return int(
+            optics.magnification(self.focal_length, eyepiece.focal_length, multiplier)
+        )
+
+    def fov_with(
+        self, eyepiece: Optional[EyePiece], barlow: Optional[Barlow] = None
+    ) -> float | None:
+        """True field of view with an eyepiece and barlow, without using them"""
+        if eyepiece is None:
+            return None
+        multiplier = barlow.multiplier if barlow is not None else 1
+        power = optics.magnification(
+            self.focal_length, eyepiece.focal_length, multiplier
+        )
+        return optics.true_fov(eyepiece.afov, power)
 
     @property
     def eyepiece(self) -> Optional[EyePiece]:
@@ -169,7 +320,8 @@ class Structure(AstroLogModel):
 
     @property
     def objects(self) -> list["Object"]:
-        return list(Object.select().join(Structure).where(Structure.name == self.name))
+        # A list once prefetched with the structures, a query otherwise
+        return list(self.object_set)
 
     @property
     def objects_str(self) -> str:
@@ -193,15 +345,42 @@ class Object(AstroLogModel):
 
     @property
     def alt_names(self) -> list[str | None]:
-        query = AltName.select().join(Object).where(Object.id == self.id)
+        # Listings load them for all their objects at once, see load_alt_names()
+        if (names := self.__dict__.get("_alt_names")) is not None:
+            return names
+        query = AltName.select().where(AltName.object == self.id)
         return [alt.name for alt in query]
 
+    @staticmethod
+    def count_observations() -> ModelSelect:
+        """Column with the number of observations of each object, for listings"""
+        query = Observation.select(fn.COUNT(Observation.id))
+        return query.where(Observation.object == Object.id).alias("n_observations")
+
+    @property
+    def number_of_observations(self) -> int:
+        if (count := self.__dict__.get("n_observations")) is not None:
+            return count
+        return Observation.select().where(Observation.object == self.id).count()
+
 
 class AltName(AstroLogModel):
     object = ForeignKeyField(Object)
     name = TextField(unique=True)
 
 
+def load_alt_names(objects: Iterable[Object]) -> None:
+    """Fetch the alt names of all `objects` with one query"""
+    names: dict[int, list[str | None]] = {object.id: [] for object in objects}
+    query = AltName.select(AltName.object, AltName.name).where(
+        AltName.object.in_(list(names))
+    )
+    for alt in query.order_by(AltName.id):
+        names[alt.object_id].append(alt.name)
+    for object in objects:
+        object._alt_names = names[object.id]
+
+
 class Condition(AstroLogModel):
     temperature = IntegerField()
     humidity = IntegerField(
@@ -221,22 +400,51 @@ class Session(AstroLogModel):
 
     @property
     def observations(self) -> Iterable["Observation"]:
-        query = Observation.select().join(Session).where(Session.id == self.id)
-        for observation in query:
-            yield observation
+        query = Observation.with_related().where(Observation.session == self.id)
+        return query.order_by(Observation.id)
+
+    @staticmethod
+    def count_observations() -> ModelSelect:
+        """Column with the number of observations of each session, for listings"""
+        query = Observation.select(fn.COUNT(Observation.id))
+        return query.where(Observation.session == Session.id).alias("n_observations")
 
     @property
     def number_of_observations(self) -> int:
-        return len(Observation.select().join(Session).where(Session.id == self.id))
+        if (count := self.__dict__.get("n_observations")) is not None:
+            return count
+        return Observation.select().where(Observation.session == self.id).count()
 
 
 class Image(AstroLogModel):
     fname = TextField()
+    # Hex digest of the content, which the file is stored under
+    sha256 = TextField(null=True, unique=True)
+    # Smaller copies of the image, see astrolog.images
+    thumbnail = TextField(null=True)
+    preview = TextField(null=True)
+    # From the header of FITS frames
+    exposure = FloatField(null=True)
+    filter = TextField(null=True)
+    gain = FloatField(null=True)
+    date_obs = DateTimeField(null=True)
 
     @property
     def image_loc(self) -> str:
         return os.path.join("/static/uploads", str(self.fname))
 
+    @property
+    def thumbnail_loc(self) -> str:
+        if self.thumbnail is None:
+            return self.image_loc
+        return os.path.join("/static/uploads", str(self.thumbnail))
+
+    @property
+    def preview_loc(self) -> str:
+        if self.preview is None:
+            return self.image_loc
+        return os.path.join("/static/uploads", str(self.preview))
+
     @property
     def observation(self) -> "Observation":
         return Observation.get(image=self)
@@ -255,13 +463,20 @@ class Observation(AstroLogModel):
     note = TextField(null=True)
     image = ForeignKeyField(Image, null=True)
 
+    @classmethod
+    def with_related(cls) -> ModelSelect:
+        """Observations with their object, image and equipment in the same query"""
+        related = [Image, Telescope, EyePiece, Barlow, Binocular, Camera]
+        related += [FrontFilter, Filter]
+        query = cls.select(cls, Object, *related).join(Object)
+        for model in related:
+            query = query.switch(cls).join(model, JOIN.LEFT_OUTER)
+        return query
+
     @property
     def magnification(self) -> Optional[int]:
         if self.telescope:
-            self.telescope.use_eyepiece(self.eyepiece)
-            if self.barlow:
-                self.telescope.use_barlow(self.barlow)
-            return self.telescope.magnification
+            return self.telescope.magnification_with(self.eyepiece, self.barlow)
         elif self.binocular:
             return self.binocular.magnification
         return None
@@ -270,14 +485,7 @@ class Observation(AstroLogModel):
     def fov(self) -> Optional[float]:
         if not self.telescope:
             return None
-        if not self.eyepiece:
-            return None
-        if not self.eyepiece.afov:
-            return None
-        self.telescope.use_eyepiece(self.eyepiece)
-        if self.barlow:
-            self.telescope.use_barlow(self.barlow)
-        return self.telescope.fov
+        return self.telescope.fov_with(self.eyepiece, self.barlow)
 
     @property
     def naked_eye(self) -> bool:
@@ -300,7 +508,9 @@ MODELS = [
     Barlow,
     Binocular,
     Camera,
+    ChangeEvent,
     Condition,
+    DataVersion,
     EyePiece,
     Filter,
     FrontFilter,
@@ -0,0 +1,183 @@
+import hashlib
+import math
+import os
+import tempfile
+from typing import Any, BinaryIO
+
+from peewee import IntegrityError
+from PIL import Image as PILImage
+from PIL import ImageOps, UnidentifiedImageError
+
+from astrolog.database import Image
+
+CHUNK_SIZE = 1024**2
+# Where the web application keeps uploads, unless configured otherwise
+DEFAULT_UPLOAD_FOLDER = os.path.join(
+    os.path.dirname(__file__), "web", "static", "uploads"
+)
+
+# Longest side, in pixels, of the smaller copies made of every uploaded image.
+# Thumbnails are used in lists, previews where a single image is shown.
+SIZES = {"thumbnail": 320, "preview": 1600}
+
+# astropy is only imported when a FITS frame is handled
+FITS_EXTENSIONS = {"fits", "fit", "fts"}
+FITS_KEYWORDS = {
+    "exposure": ("EXPTIME", "EXPOSURE"),
+    "filter": ("FILTER",),
+    "gain": ("GAIN", "EGAIN"),
+    "date_obs": ("DATE-OBS",),
+}
+
+
+def content_path(sha256: str, extension: str) -> str:
+    """Path of a file, relative to the upload folder, given its content hash"""
+    return os.path.join(sha256[:2], f"{sha256}.{extension.lower()}")
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def store_upload(
+    stream: BinaryIO, extension: str, directory: str
+) -> tuple[Image, bool]:
+    """Store an uploaded file under its content hash and return its Image.
+
+    The stream is written to disk in chunks while it is hashed, so memory use
+    does not depend on the size of the file. A file that has been uploaded
+    before is not written again, and its existing Image is returned instead.
+    """
+    sha256 = hashlib.sha256()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                sha256.update(chunk)
+                f.write(chunk)
+        digest = sha256.hexdigest()
+        if (image := Image.get_or_none(sha256=digest)) is not None:
+            return image, False
+        fname = content_path(digest, extension)
+        path = os.path.join(directory, fname)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            os.replace(tmp, path)
+        try:
+            return Image.create(fname=fname, sha256=digest), True
+        except IntegrityError:
+            # The same file was uploaded at the same time
+            return Image.get(sha256=digest), False
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def verify(image: Image, directory: str) -> bool:
+    """Whether the stored file still has the content it was uploaded with"""
+    path = os.path.join(directory, str(image.fname))
+    if image.sha256 is None or not os.path.exists(path):
+        return False
+    return file_sha256(path) == image.sha256
+
+
+def fits_header(path: str) -> dict[str, Any]:
+    """Exposure, filter, gain and date of observation of a FITS frame"""
+    from astropy.io import fits
+    from astropy.time import Time
+
+    values: dict[str, Any] = {}
+    with fits.open(path, memmap=True) as hdul:
+        # The keywords may be in the primary header or in the image extension
+        for hdu in hdul:
+            for column, keywords in FITS_KEYWORDS.items():
+                for keyword in keywords:
+                    value = hdu.header.get(keyword)
+                    if column not in values and value not in (None, ""):
+                        values[column] = value
+    if "date_obs" in values:
+        values["date_obs"] = Time(values["date_obs"]).datetime
+    return values
+
+
+def fits_image(path: str, size: int) -> PILImage.Image:
+    """Stretched, 8-bit image of a FITS frame, at most `size` pixels across.
+
+    The frame is memory-mapped and read `factor` rows at a time, each block
+    averaged down to a single row, so it is never held in memory in full. The
+    small image is then stretched with zscale limits and an asinh stretch.
+    """
+    import numpy as np
+    from astropy.io import fits
+    from astropy.visualization import AsinhStretch, ZScaleInterval
+
+    with fits.open(path, memmap=True) as hdul:
+        hdu = next(hdu for hdu in hdul if hdu.is_image and hdu.header["NAXIS"] >= 2)
+        # Colour cubes and the like: only use the first plane
+        leading = (0,) * (hdu.header["NAXIS"] - 2)
+        height, width = hdu.header["NAXIS2"], hdu.header["NAXIS1"]
+        factor = max(math.ceil(max(height, width) / size), 1)
+        rows, columns = height // factor, width // factor
+        small = np.empty((rows, columns), dtype=np.float32)
+        for row in range(rows):
+            block = hdu.section[(*leading, slice(row * factor, (row + 1) * factor))]
+            block = np.asarray(block[:, : columns * factor], dtype=np.float32)
+            small[row] = block.reshape(factor, columns, factor).mean(axis=(0, 2))
+    small = np.nan_to_num(small, nan=float(np.nanmedian(small)))
+    stretched = AsinhStretch()(ZScaleInterval()(small, clip=True))
+    # FITS images start in the lower left corner
+    return PILImage.fromarray(np.flipud(stretched * 255).astype(np.uint8))
+
+
+def save_derivatives(image: PILImage.Image, stem: str) -> dict[str, str]:
+    fnames = {}
+    for name, size in sorted(SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size))
+        derivative = f"{stem}-{name}.jpg"
+        image.save(derivative, "JPEG", quality=85, optimize=True)
+        fnames[name] = os.path.basename(derivative)
+    return fnames
+
+
+def make_derivatives(path: str) -> dict[str, str]:
+    """Save a JPEG of each size in SIZES next to `path` and return their names"""
+    stem, extension = os.path.splitext(path)
+    largest = max(SIZES.values())
+    if extension.lower().lstrip(".") in FITS_EXTENSIONS:
+        return save_derivatives(fits_image(path, largest), stem)
+    with PILImage.open(path) as original:
+        # JPEGs can be decoded directly at a reduced scale, which is much faster
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    return save_derivatives(image, stem)
+
+
+def add_derivatives(image_id: int, directory: str) -> None:
+    """Make the smaller copies of an uploaded image and record them on it.
+
+    Files that are not images (e.g. PDFs) are left without, in which case the
+    templates fall back to the original. The header of FITS frames is recorded
+    on the image as well.
+    """
+    image = Image.get_by_id(image_id)
+    path = os.path.join(directory, str(image.fname))
+    values: dict[str, Any] = {}
+    if path.lower().rsplit(".", 1)[-1] in FITS_EXTENSIONS:
+        try:
+            values.update(fits_header(path))
+        except (OSError, ValueError):
+            pass
+    try:
+        # Next to the original, which may be in a subfolder of `directory`
+        folder = os.path.dirname(str(image.fname))
+        for name, fname in make_derivatives(path).items():
+            values[name] = os.path.join(folder, fname)
+    except (UnidentifiedImageError, OSError, ValueError, StopIteration):
+        pass
+    if values:
+        Image.update(**values).where(Image.id == image_id).execute()
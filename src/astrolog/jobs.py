@@ -0,0 +1,90 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+@dataclass
+class Job:
+    key: str
+    future: Future
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+
+    @property
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "pending"
+        return "failed" if self.future.exception() is not None else "done"
+
+    @property
+    def result(self) -> Any:
+        return self.future.result()
+
+    @property
+    def error(self) -> str | None:
+        if self.future.done() and (error := self.future.exception()) is not None:
+            return repr(error)
+        return None
+
+
+class JobQueue:
+    """Table of jobs running on an executor, which can be polled by id.
+
+    Jobs are submitted with a key, and submitting a job while another job with
+    the same key is still in flight returns the job already running. Finished
+    jobs are kept for `keep` seconds, so their result can be collected.
+    """
+
+    def __init__(self, executor: Executor, keep: float = 600) -> None:
+        self.executor = executor
+        self.keep = keep
+        self._jobs: dict[str, Job] = {}
+        self._in_flight: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(
+        self,
+        key: str,
+        function: Callable[..., Any],
+        *args: Any,
+        on_done: Callable[[Job], None] | None = None,
+        **kwargs: Any,
+    ) -> Job:
+        """Run `function(*args, **kwargs)` unless a job with `key` is in flight.
+
+        `on_done` is called with the job once it has finished, successfully or not.
+        """
+        with self._lock:
+            self._prune()
+            if (job := self._in_flight.get(key)) is not None:
+                return job
+            job = Job(key=key, future=self.executor.submit(function, *args, **kwargs))
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+
+        def finish(_: Future) -> None:
+            with self._lock:
+                job.finished = time.time()
+                self._in_flight.pop(key, None)
+            if on_done is not None:
+                on_done(job)
+
+        job.future.add_done_callback(finish)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        oldest = time.time() - self.keep
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < oldest:
+                del self._jobs[job_id]
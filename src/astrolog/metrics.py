@@ -0,0 +1,241 @@
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Iterator
+
+# A minimal implementation of Prometheus metrics, enough for the /metrics view
+# (see astrolog.web.monitoring), without another dependency. Metrics are created
+# once, at import, and updated with a lock held only for a few additions.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+    return "{" + pairs + "}"
+
+
+class Metric(abc.ABC):
+    """A metric, with a child of `_new_child()` for every set of label values"""
+
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    @abc.abstractmethod
+    def _new_child(self) -> Any:
+        """The value of the metric for one combination of label values"""
+
+    def labels(self, *values: Any) -> Any:
+        """The metric for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}")
+        if (child := self._children.get(key)) is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """(name suffix, labels, value) of every sample"""
+        for key, child in sorted(self._children.items()):
+            for suffix, extra, value in child.samples():
+                names, values = (*self.label_names, *extra[:1]), (*key, *extra[1:])
+                yield suffix, format_labels(names, values), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class _CounterValue:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        return [("_total", (), self.value)]
+
+
+class _GaugeValue(_CounterValue):
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        return [("", (), self.value)]
+
+
+class _HistogramValue:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = [], 0
+        for bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            samples.append(("_bucket", ("le", format_value(bound)), cumulative))
+        samples.append(("_sum", (), total))
+        samples.append(("_count", (), cumulative))
+        return samples
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: "Registry | None" = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self, *labels: Any) -> Callable[[Any], Any]:
+        """Decorator observing how long each call of a function takes"""
+        child = self.labels(*labels)
+
+        def decorator(f: Any) -> Any:
+            @wraps(f)
+            def wrap(*args: Any, **kwargs: Any) -> Any:
+                with child.time():
+                    return f(*args, **kwargs)
+
+            return wrap
+
+        return decorator
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"A metric named {metric.name} already exists")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter(
+    "astrolog_http_requests",
+    "Requests answered, by endpoint, method and status",
+    ("endpoint", "method", "status"),
+)
+REQUEST_SECONDS = Histogram(
+    "astrolog_http_request_duration_seconds",
+    "Time taken to answer requests, by endpoint",
+    ("endpoint",),
+)
+IN_FLIGHT = Gauge("astrolog_http_requests_in_flight", "Requests being answered")
+QUERIES = Counter("astrolog_db_queries", "SQL statements run")
+QUERY_SECONDS = Histogram(
+    "astrolog_db_query_duration_seconds",
+    "Time taken by SQL statements",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
+FUNCTION_SECONDS = Histogram(
+    "astrolog_function_duration_seconds",
+    "Time taken by the slowest functions, by function",
+    ("function",),
+)
+CACHE = Counter(
+    "astrolog_cache_requests",
+    "Lookups in the caches, by cache and result (hit or miss)",
+    ("cache", "result"),
+)
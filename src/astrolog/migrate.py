@@ -0,0 +1,373 @@
+"""Ordered, resumable upgrades of the schema and the data of a log.
+
+Every migration has a version, and the versions applied to a database are
+recorded in its schemaversion table, so each runs once and in order. The steps
+of a migration are skipped when already done: tables and columns that exist
+are left alone, so a database made with every table at once, or upgraded by
+the old scripts, is only recorded as up to date. Data is backfilled in chunks,
+each in a transaction of its own, over the rows still needing it, so an
+interrupted upgrade carries on where it stopped when run again. Usage::
+
+    python -m astrolog.migrate [AstroLog.db] [--dry-run] [--chunk-size 1000]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from peewee import (
+    SQL,
+    DatabaseProxy,
+    DateTimeField,
+    Field,
+    FloatField,
+    ForeignKeyField,
+    IntegerField,
+    Model,
+    ModelSelect,
+    OperationalError,
+    SqliteDatabase,
+    TextField,
+)
+from playhouse.migrate import SqliteMigrator, make_index_name, migrate
+
+from astrolog.database import (
+    MODELS,
+    AstroLogDatabase,
+    Barlow,
+    Camera,
+    FrontFilter,
+    Image,
+    Kind,
+    Structure,
+    database_proxy,
+)
+from astrolog.images import DEFAULT_UPLOAD_FOLDER, add_derivatives, file_sha256
+
+# Name of the backfill, rows done and rows to do
+Progress = Callable[[str, int, int], None]
+
+
+class SchemaVersion(Model):
+    """A migration applied to the database"""
+
+    version = IntegerField(primary_key=True)
+    name = TextField()
+    applied = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = database_proxy
+
+
+class Migrator:
+    """The steps a migration is made of, each skipped when already done.
+
+    With `dry_run`, steps are only listed in `steps`, with the migration they
+    belong to, and the database is left as it is.
+    """
+
+    def __init__(
+        self,
+        database: SqliteDatabase | DatabaseProxy,
+        dry_run: bool = False,
+        chunk_size: int = 1000,
+        progress: Progress | None = None,
+        upload_folder: str = DEFAULT_UPLOAD_FOLDER,
+    ) -> None:
+        self.database = database
+        self.migrator = SqliteMigrator(database)
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.upload_folder = upload_folder
+        self.migration = ""
+        self.steps: list[tuple[str, str]] = []
+        # Tables created whole by this upgrade, or by the dry run
+        self.created: set[str] = set()
+
+    def step(self, description: str) -> bool:
+        """Record a step, and whether to carry it out"""
+        self.steps.append((self.migration, description))
+        return not self.dry_run
+
+    def create_table(self, model: type[Model]) -> None:
+        table = model._meta.table_name
+        if self.database.table_exists(table):
+            return
+        self.created.add(table)
+        if self.step(f"create table {table}"):
+            model.create_table()
+
+    def add_column(self, table: str, name: str, field: Field) -> None:
+        columns = {column.name for column in self.database.get_columns(table)}
+        if table in self.created or name in columns:
+            return
+        if not self.step(f"add column {table}.{name}"):
+            return
+        if not field.null and isinstance(field.default, (int, float)):
+            # SQLite adds a column with a constant default without touching the
+            # rows, where peewee would fill it and then copy the whole table
+            field = field.clone()
+            field.constraints = [
+                *(field.constraints or []),
+                SQL(f"DEFAULT {field.default!r}"),
+            ]
+            operations = [
+                self.migrator.alter_add_column(table, name, field, allow_not_null=True)
+            ]
+            if field.index or field.unique:
+                operations.append(self.migrator.add_index(table, (name,), field.unique))
+        else:
+            operations = [self.migrator.add_column(table, name, field)]
+        with self.database.atomic():
+            migrate(*operations)
+
+    def add_index(self, table: str, columns: tuple[str, ...], unique: bool) -> None:
+        name = make_index_name(table, columns)
+        indexes = {index.name for index in self.database.get_indexes(table)}
+        if table in self.created or name in indexes:
+            return
+        if self.step(f"add index {name}"):
+            with self.database.atomic():
+                migrate(self.migrator.add_index(table, columns, unique))
+
+    def backfill(
+        self, name: str, query: ModelSelect, function: Callable[[Model], None]
+    ) -> None:
+        """Call `function` on the rows of `query`, `chunk_size` rows at a time.
+
+        `query` should only select the rows still to be backfilled, so that a
+        backfill that was interrupted resumes with the rows it did not get to.
+        """
+        model = query.model
+        if model._meta.table_name in self.created:
+            return
+        try:
+            total = query.count()
+        except OperationalError:
+            if not self.dry_run:
+                raise
+            # The columns are only added by the earlier steps of the migration
+            self.step(f"backfill {name}")
+            return
+        if not total or not self.step(f"backfill {name} ({total} rows)"):
+            return
+        done = last = 0
+        while True:
+            with self.database.atomic():
+                rows = list(
+                    query.where(model.id > last)
+                    .order_by(model.id)
+                    .limit(self.chunk_size)
+                )
+                for row in rows:
+                    function(row)
+            if not rows:
+                break
+            done, last = done + len(rows), rows[-1].id
+            if self.progress is not None:
+                self.progress(name, done, total)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    function: Callable[[Migrator], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(
+    version: int, name: str
+) -> Callable[[Callable[[Migrator], None]], Callable[[Migrator], None]]:
+    def register(function: Callable[[Migrator], None]) -> Callable[[Migrator], None]:
+        MIGRATIONS.append(Migration(version, name, function))
+        return function
+
+    return register
+
+
+@migration(1, "add-kind")
+def add_kind(migrator: Migrator) -> None:
+    kind = ForeignKeyField(Kind, field=Kind.id, null=True)
+    migrator.add_column("object", "kind_id", kind)
+
+
+@migration(2, "add-structures")
+def add_structures(migrator: Migrator) -> None:
+    structure = ForeignKeyField(Structure, field=Structure.id, null=True)
+    migrator.add_column("object", "structure_id", structure)
+
+
+@migration(3, "session-note")
+def session_note(migrator: Migrator) -> None:
+    migrator.add_column("session", "note", TextField(null=True))
+
+
+@migration(4, "location-utcoffset")
+def location_utcoffset(migrator: Migrator) -> None:
+    migrator.add_column("location", "utcoffset", IntegerField(default=0))
+
+
+@migration(5, "eyepiece-fov")
+def eyepiece_fov(migrator: Migrator) -> None:
+    migrator.add_column("eyepiece", "afov", IntegerField(null=True, default=None))
+
+
+@migration(6, "add-barlow")
+def add_barlow(migrator: Migrator) -> None:
+    barlow = ForeignKeyField(Barlow, field=Barlow.id, null=True)
+    migrator.add_column("observation", "barlow_id", barlow)
+
+
+@migration(7, "add-front-filter")
+def add_front_filter(migrator: Migrator) -> None:
+    front_filter = ForeignKeyField(FrontFilter, field=FrontFilter.id, null=True)
+    migrator.add_column("observation", "front_filter_id", front_filter)
+
+
+@migration(8, "add-camera")
+def add_camera(migrator: Migrator) -> None:
+    camera = ForeignKeyField(Camera, field=Camera.id, null=True)
+    migrator.add_column("observation", "camera_id", camera)
+
+
+@migration(9, "add-image")
+def add_image(migrator: Migrator) -> None:
+    image = ForeignKeyField(Image, field=Image.id, null=True)
+    migrator.add_column("observation", "image_id", image)
+
+
+@migration(10, "image-derivatives")
+def image_derivatives(migrator: Migrator) -> None:
+    migrator.add_column("image", "thumbnail", TextField(null=True))
+    migrator.add_column("image", "preview", TextField(null=True))
+
+
+@migration(11, "image-sha256")
+def image_sha256(migrator: Migrator) -> None:
+    migrator.add_column("image", "sha256", TextField(null=True))
+    migrator.add_index("image", ("sha256",), unique=True)
+
+    def fill(image: Image) -> None:
+        path = os.path.join(migrator.upload_folder, str(image.fname))
+        if not os.path.exists(path):
+            return
+        digest = file_sha256(path)
+        # Of the files uploaded more than once before they were deduplicated,
+        # only the first gets the hash
+        if not Image.select().where(Image.sha256 == digest).exists():
+            Image.update(sha256=digest).where(Image.id == image.id).execute()
+
+    # Only the columns the table has at this version
+    query = Image.select(Image.id, Image.fname).where(Image.sha256.is_null())
+    migrator.backfill("image.sha256", query, fill)
+
+
+@migration(12, "image-fits-header")
+def image_fits_header(migrator: Migrator) -> None:
+    migrator.add_column("image", "exposure", FloatField(null=True))
+    migrator.add_column("image", "filter", TextField(null=True))
+    migrator.add_column("image", "gain", FloatField(null=True))
+    migrator.add_column("image", "date_obs", DateTimeField(null=True))
+
+
+@migration(13, "image-derivative-folders")
+def image_derivative_folders(migrator: Migrator) -> None:
+    # Derivatives of uploads stored by content hash were recorded without the
+    # subfolder they are in
+    def fill(image: Image) -> None:
+        folder = os.path.dirname(str(image.fname))
+        Image.update(
+            thumbnail=os.path.join(folder, str(image.thumbnail)),
+            preview=os.path.join(folder, str(image.preview)),
+        ).where(Image.id == image.id).execute()
+
+    query = Image.select(Image.id, Image.fname, Image.thumbnail, Image.preview).where(
+        Image.fname.contains("/"),
+        Image.thumbnail.is_null(False),
+        ~Image.thumbnail.contains("/"),
+    )
+    migrator.backfill("image derivative folders", query, fill)
+
+
+@migration(14, "image-derivatives-backfill")
+def image_derivatives_backfill(migrator: Migrator) -> None:
+    # Images uploaded before derivatives were made are shown at full size.
+    # Those that are not images, or whose file is missing, are left without.
+    def fill(image: Image) -> None:
+        add_derivatives(image.id, migrator.upload_folder)
+
+    query = Image.select(Image.id).where(Image.thumbnail.is_null())
+    migrator.backfill("image derivatives", query, fill)
+
+
+def pending() -> list[Migration]:
+    """The migrations not applied yet to the database in database_proxy"""
+    applied: set[int] = set()
+    if SchemaVersion.table_exists():
+        applied = {
+            version
+            for (version,) in SchemaVersion.select(SchemaVersion.version).tuples()
+        }
+    migrations = sorted(MIGRATIONS, key=lambda migration: migration.version)
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+def upgrade(dry_run: bool = False, **options: Any) -> list[tuple[str, str]]:
+    """Apply the pending migrations in order, and return the steps taken.
+
+    Tables that do not exist yet are first created whole, so the migrations
+    have nothing to do on a new database. `options` are passed to Migrator.
+    """
+    migrator = Migrator(database_proxy.obj, dry_run, **options)
+    for model in (SchemaVersion, *MODELS):
+        migrator.create_table(model)
+    for migration in pending():
+        migrator.migration = f"{migration.version:04} {migration.name}"
+        migration.function(migrator)
+        if not dry_run:
+            SchemaVersion.create(version=migration.version, name=migration.name)
+    if not dry_run:
+        # The triggers and DataVersion rows of the tables that were upgraded
+        migrator.database.create_tables(MODELS)
+    return migrator.steps
+
+
+def print_progress(name: str, done: int, total: int) -> None:
+    end = "\n" if done == total else ""
+    print(f"\r{name}: {done}/{total} ({done / total:.0%})", end=end, file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    default = os.getenv(
+        "ASTRO_LOG_DB", os.path.join(os.path.abspath("."), "AstroLog.db")
+    )
+    parser.add_argument("path", nargs="?", default=default)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the steps")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--uploads", default=DEFAULT_UPLOAD_FOLDER)
+    args = parser.parse_args()
+    database = AstroLogDatabase(args.path)
+    database_proxy.initialize(database)
+    steps = upgrade(
+        args.dry_run,
+        chunk_size=args.chunk_size,
+        progress=print_progress,
+        upload_folder=args.uploads,
+    )
+    for migration, description in steps:
+        print(f"{migration or 'tables'}: {description}")
+    if not steps:
+        print("The database is up to date")
+    database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterator
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from astrolog.database import Barlow, EyePiece, Telescope
+
+# The pupil of a dark adapted eye, in mm. A larger exit pupil wastes light.
+EYE_PUPIL = 7.0
+# Beyond about twice the aperture in mm, the image only gets blurrier.
+MAX_MAGNIFICATION_PER_MM = 2.0
+
+
+def magnification(
+    focal_length: float, eyepiece_focal_length: float, multiplier: float = 1
+) -> float:
+    return focal_length / eyepiece_focal_length * multiplier
+
+
+def true_fov(afov: float | None, magnification: float) -> float | None:
+    """True field of view in degrees, which is apparent fov (afov) / magnification"""
+    if not afov:
+        return None
+    return round(afov / magnification, 2)
+
+
+def exit_pupil(aperture: float, magnification: float) -> float:
+    return aperture / magnification
+
+
+@dataclass(frozen=True)
+class OpticsMatrix:
+    """Every combination of telescope, eyepiece and barlow (or none).
+
+    The arrays are indexed by telescope, eyepiece and barlow, in the order of
+    the lists, where the first "barlow" is None for not using any. Fields of
+    view are NaN for eyepieces without an apparent field of view.
+    """
+
+    telescopes: list["Telescope"]
+    eyepieces: list["EyePiece"]
+    barlows: list["Barlow | None"]
+    magnification: "np.ndarray"
+    fov: "np.ndarray"
+    exit_pupil: "np.ndarray"
+    too_high: "np.ndarray"
+    too_low: "np.ndarray"
+
+    def configurations(self, telescope: int) -> Iterator[dict[str, Any]]:
+        """Combinations for the telescope with index `telescope`, by magnification"""
+        magnification = self.magnification[telescope]
+        for e, b in zip(*divmod(magnification.argsort(axis=None), len(self.barlows))):
+            fov = self.fov[telescope, e, b]
+            yield {
+                "eyepiece": self.eyepieces[e],
+                "barlow": self.barlows[b],
+                "magnification": int(magnification[e, b]),
+                "fov": None if fov != fov else round(float(fov), 2),
+                "exit_pupil": round(float(self.exit_pupil[telescope, e, b]), 2),
+                "too_high": bool(self.too_high[telescope, e, b]),
+                "too_low": bool(self.too_low[telescope, e, b]),
+            }
+
+
+def optics_matrix(
+    telescopes: list["Telescope"], eyepieces: list["EyePiece"], barlows: list["Barlow"]
+) -> OpticsMatrix:
+    """Magnification, field of view and exit pupil of all the combinations"""
+    import numpy as np
+
+    focal_length = np.array([t.focal_length for t in telescopes], dtype=float)
+    aperture = np.array([t.aperture for t in telescopes], dtype=float)
+    eyepiece = np.array([e.focal_length for e in eyepieces], dtype=float)
+    afov = np.array([e.afov or np.nan for e in eyepieces], dtype=float)
+    multiplier = np.array([1.0] + [b.multiplier for b in barlows], dtype=float)
+
+    # Broadcast to (telescopes, eyepieces, barlows)
+    power = magnification(
+        focal_length[:, None, None], eyepiece[None, :, None], multiplier[None, None, :]
+    )
+    pupil = exit_pupil(aperture[:, None, None], power)
+    return OpticsMatrix(
+        telescopes=list(telescopes),
+        eyepieces=list(eyepieces),
+        barlows=[None, *barlows],
+        magnification=power,
+        fov=afov[None, :, None] / power,
+        exit_pupil=pupil,
+        too_high=power > MAX_MAGNIFICATION_PER_MM * aperture[:, None, None],
+        too_low=pupil > EYE_PUPIL,
+    )
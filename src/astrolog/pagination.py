@@ -0,0 +1,88 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from peewee import Field, ModelSelect, Tuple
+
+
+@dataclass
+class Page:
+    """One page of rows, with the cursors of the pages before and after it"""
+
+    items: list[Any]
+    next: str | None = None
+    prev: str | None = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    text = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int | None = None) -> list[Any]:
+    """Values encoded by `encode_cursor`, raising ValueError if it is invalid.
+
+    The cursor must hold `length` values, if given, each a string or number.
+    """
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(text)
+    except (binascii.Error, UnicodeDecodeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from error
+    if (
+        not isinstance(values, list)
+        or (length is not None and len(values) != length)
+        or not all(isinstance(value, (str, int, float)) for value in values)
+    ):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def paginate(
+    query: ModelSelect,
+    keys: Sequence[Field],
+    size: int,
+    after: str | None = None,
+    before: str | None = None,
+    descending: bool = False,
+    values: Callable[[Any], Sequence[Any]] | None = None,
+) -> Page:
+    """Rows of `query` ordered by `keys`, starting after or ending before a cursor.
+
+    Pages are found by comparing the keys with the values of the last row seen
+    (keyset pagination), so a page costs the same wherever it is in the table
+    and rows added meanwhile do not shift the pages. The keys must identify a
+    row, which is easiest by ending them with the primary key. `values` returns
+    the keys of a row, for queries where they are not fields of the row itself.
+    """
+    if values is None:
+
+        def values(row: Any) -> Sequence[Any]:
+            return [getattr(row, key.name) for key in keys]
+
+    columns = Tuple(*keys)
+    backwards = before is not None
+    if after is not None:
+        cursor = Tuple(*decode_cursor(after, len(keys)))
+        query = query.where(columns < cursor if descending else columns > cursor)
+    if before is not None:
+        cursor = Tuple(*decode_cursor(before, len(keys)))
+        query = query.where(columns > cursor if descending else columns < cursor)
+    # Going backwards, fetch the rows in reverse and turn them around afterwards
+    reverse = descending != backwards
+    order = [key.desc() if reverse else key.asc() for key in keys]
+    # One more row than needed tells whether there is another page
+    rows = list(query.order_by(*order).limit(size + 1))
+    more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+    page = Page(items=rows)
+    if rows:
+        if more or backwards:
+            page.next = encode_cursor(values(rows[-1]))
+        if (more and backwards) or after is not None:
+            page.prev = encode_cursor(values(rows[0]))
+    return page
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import bcrypt
+
+from astrolog.metrics import FUNCTION_SECONDS
+
+DEFAULT_ROUNDS = int(os.getenv("ASTRO_LOG_BCRYPT_ROUNDS", 12))
+MAX_KEYS = 10_000
+
+
+class HasherBusy(RuntimeError):
+    """Raised when too many passwords are already waiting to be hashed"""
+
+
+class PasswordHasher:
+    """bcrypt on a few threads of its own, with at most `max_pending` waiting.
+
+    Each hash takes a few hundred milliseconds of CPU at the default cost, so
+    they are limited to `workers` at a time whatever the number of requests,
+    and a burst beyond that is refused with HasherBusy rather than queued.
+    bcrypt releases the GIL, so the other requests are served meanwhile.
+    """
+
+    def __init__(
+        self, rounds: int = DEFAULT_ROUNDS, workers: int = 2, max_pending: int = 16
+    ) -> None:
+        self.rounds = rounds
+        self.workers = workers
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _run(self, name: str, function: Callable[..., Any], *args: Any) -> Any:
+        if not self._pending.acquire(blocking=False):
+            raise HasherBusy("Too many passwords are being checked, try again later")
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix="bcrypt"
+                    )
+            with FUNCTION_SECONDS.labels(name).time():
+                return self._executor.submit(function, *args).result()
+        finally:
+            self._pending.release()
+
+    def hash(self, password: str) -> bytes:
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run("bcrypt.hashpw", bcrypt.hashpw, password.encode(), salt)
+
+    def verify(self, password: str, hashed: bytes) -> bool:
+        return self._run("bcrypt.checkpw", bcrypt.checkpw, password.encode(), hashed)
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        """Whether `hashed` was made with another cost than `rounds`"""
+        # bcrypt hashes start with $2b$<rounds>$
+        return int(bytes(hashed)[4:6]) != self.rounds
+
+
+class LoginThrottle:
+    """Failed logins by key (a username or an address) in a sliding window.
+
+    A key is throttled once it has `attempts` failures within `window` seconds,
+    until the oldest of them is out of the window.
+    """
+
+    def __init__(self, attempts: int = 5, window: float = 300) -> None:
+        self.attempts = attempts
+        self.window = window
+        self._failures: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, now: float) -> deque[float]:
+        failures = self._failures.get(key, deque())
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            self._failures.pop(key, None)
+        return failures
+
+    def retry_after(self, *keys: str) -> float:
+        """Seconds until all of `keys` may try again, 0 if they may now"""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in keys:
+                failures = self._recent(key, now)
+                if len(failures) >= self.attempts:
+                    oldest = failures[-self.attempts]
+                    wait = max(wait, oldest + self.window - now)
+        return wait
+
+    def failed(self, *keys: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) > MAX_KEYS:
+                # Forget the keys without recent failures, as a flood adds many
+                for key in list(self._failures):
+                    self._recent(key, now)
+            for key in keys:
+                failures = self._recent(key, now)
+                failures.append(now)
+                self._failures[key] = failures
+
+    def succeeded(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+_hasher: PasswordHasher | None = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher(**options: Any) -> PasswordHasher:
+    """The hasher of the process, made with `options` on first use.
+
+    All passwords are checked by this one, so they share its workers and its
+    limit on waiting hashes. Options given once it is made have no effect.
+    """
+    global _hasher
+    with _hasher_lock:
+        if _hasher is None:
+            _hasher = PasswordHasher(**options)
+        return _hasher
@@ -0,0 +1,124 @@
+import datetime
+from typing import Any, cast
+
+import astropy.units as u
+import numpy as np
+from astropy.coordinates import AltAz, EarthLocation, SkyCoord, get_body, get_sun
+from astropy.coordinates.name_resolve import NameResolveError
+from astropy.time import Time
+from astroquery.vo_conesearch import ConeSearch
+
+degree = cast(u.UnitBase, u.deg)
+meter = cast(u.UnitBase, u.m)
+hour = cast(u.UnitBase, u.hour)
+
+# Number of points on a visibility curve for one night (every 10 minutes), and
+# the number of days between points on a visibility curve for a whole year.
+NIGHT_POINTS = 145
+YEAR_STEP = 3
+
+# The plots are drawn by the browser (static/js/plots.js). The functions below
+# only compute the data, as compact lists of rounded numbers, and run in worker
+# processes (see astrolog.web.planning). They only take plain, picklable
+# arguments and return the names that could not be resolved.
+
+
+def get_earth_location(
+    latitude: float, longitude: float, altitude: float
+) -> EarthLocation:
+    return EarthLocation(
+        lat=latitude * degree, lon=longitude * degree, height=altitude * meter
+    )
+
+
+def resolve_names(names: list[str]) -> tuple[dict[str, SkyCoord], list[str]]:
+    resolved, missing = {}, []
+    for name in names:
+        try:
+            resolved[name] = SkyCoord.from_name(name)
+        except NameResolveError:
+            missing.append(name)
+    return resolved, missing
+
+
+def rounded(values: Any, decimals: int = 1) -> list[float]:
+    return np.round(np.asarray(values, dtype=float), decimals).tolist()
+
+
+def visibility_plot_year(
+    latitude: float, longitude: float, altitude: float, year: int, names: list[str]
+) -> tuple[dict[str, Any], list[str]]:
+    earth_location = get_earth_location(latitude, longitude, altitude)
+
+    first_day = datetime.datetime(year, 1, 1)
+    days = list(range(1, 366, YEAR_STEP))
+    times = Time([first_day + datetime.timedelta(days=day) for day in days])
+    frames = AltAz(obstime=times, location=earth_location)
+    objects, missing = resolve_names(names)
+
+    targets = {}
+    for name, obj in objects.items():
+        targets[name] = rounded(obj.transform_to(frames).alt.deg)
+    return {"year": year, "columns": {"day": days}, "targets": targets}, missing
+
+
+def visibility_plot(
+    latitude: float,
+    longitude: float,
+    altitude: float,
+    utcoffset: int,
+    date: str,
+    names: list[str],
+) -> tuple[dict[str, Any], list[str]]:
+    earth_location = get_earth_location(latitude, longitude, altitude)
+    midnight = Time(date) - utcoffset * hour
+    delta_midnight = np.linspace(-12, 12, NIGHT_POINTS) * hour
+    times = midnight + delta_midnight
+    frames = AltAz(obstime=times, location=earth_location)
+    sun_pos = get_sun(times).transform_to(frames)
+    moon_pos = get_body("moon", times).transform_to(frames)
+    objects, missing = resolve_names(names)
+
+    targets = {}
+    for name, obj in objects.items():
+        targets[name] = rounded(obj.transform_to(frames).alt.deg)
+    columns = {
+        "hours": rounded(delta_midnight.value, 2),
+        "sun": rounded(sun_pos.alt.deg),
+        "moon": rounded(moon_pos.alt.deg),
+    }
+    return {"date": date, "columns": columns, "targets": targets}, missing
+
+
+def finding_chart_plot(
+    name: str, radius: float, threshold: float
+) -> tuple[dict[str, Any] | None, list[str]]:
+    def filter_table(table, obj, tol=1e-3):
+        diff_ra = abs(table["ra"] - obj.ra)
+        diff_dec = abs(table["dec"] - obj.dec)
+        n = len(table)
+        while (min(diff_ra) < tol) and (min(diff_dec) < tol):
+            table = table[(diff_ra != min(diff_ra)) & (diff_dec != min(diff_dec))]
+            diff_ra = abs(table["ra"] - obj.ra)
+            diff_dec = abs(table["dec"] - obj.dec)
+            if len(table) == n:
+                # RA for object1 is close to obj, while DEC for object2 is close to obj.
+                break
+        return table
+
+    objects, missing = resolve_names([name])
+    if not (obj := objects.get(name)):
+        return None, missing
+    result = ConeSearch.query_region(obj, radius * degree)
+    if result is None:
+        return None, missing
+    result = result[result["Mag"] <= threshold]
+    result = filter_table(result, obj)
+
+    columns = {
+        "ra": rounded(result["ra"], 5),
+        "dec": rounded(result["dec"], 5),
+        "mag": rounded(result["Mag"], 2),
+    }
+    target = {"name": name, "ra": round(obj.ra.deg, 5), "dec": round(obj.dec.deg, 5)}
+    return {"threshold": threshold, "columns": columns, "target": target}, missing
@@ -1,16 +1,28 @@
 from dataclasses import dataclass
 
-from peewee import ModelSelect, fn
+from peewee import JOIN, ModelSelect, fn
 
-from astrolog.database import Object, Observation, Session
+from astrolog.database import Kind, Object, Observation, Session, Structure
+from astrolog.metrics import FUNCTION_SECONDS
+
+
+def objects_with_details() -> ModelSelect:
+    """Objects with their kind and structure, as shown in the reports"""
+    return (
+        Object.select(Object, Kind, Structure)
+        .join(Kind, JOIN.LEFT_OUTER)
+        .switch(Object)
+        .join(Structure, JOIN.LEFT_OUTER)
+    )
 
 
 def get_most_observed_objects(query: ModelSelect) -> set[Object]:
     object_observations = (
-        Object.select(Object, fn.Count(Object.id).alias("st_count"))
+        objects_with_details()
+        .select_extend(fn.Count(Object.id).alias("st_count"))
+        .switch(Object)
         .join(Observation)
-        .join(Session)
-        .where(Session.id.in_(query))
+        .where(Observation.session.in_(query.select(Session.id)))
         .group_by(Object.name)
     )
     max_obs = 0
@@ -35,21 +47,19 @@ class Report:
     most_observed_objects: set[Object]
 
     @classmethod
+    @FUNCTION_SECONDS.time("Report.from_query")
     def from_query(cls, query: ModelSelect) -> "Report":
-        n_sessions = query.count()
-        n_observations = 0
-        unique_objects = set()
-        session: Session
-        for session in query:
-            for observation in session.observations:
-                n_observations += 1
-                obj = observation.object
-                unique_objects.add(obj)
-
+        """Report on the sessions of `query`, in a fixed number of queries"""
+        observations = Observation.select().where(
+            Observation.session.in_(query.select(Session.id))
+        )
+        unique_objects = objects_with_details().where(
+            Object.id.in_(observations.select(Observation.object))
+        )
         most_observed_objects = get_most_observed_objects(query)
         return cls(
-            n_sessions=n_sessions,
-            n_observations=n_observations,
+            n_sessions=query.count(),
+            n_observations=observations.count(),
             unique_objects=sorted(unique_objects, key=lambda x: x.name),
             most_observed_objects=sorted(most_observed_objects, key=lambda x: x.name),
         )
@@ -0,0 +1,274 @@
+"""Deterministic synthetic logs, for benchmarks and tests at realistic sizes.
+
+The same size and seed always give the same rows. Usage::
+
+    python -m astrolog.synthetic AstroLog-100k.db --observations 100000 [--seed 0]
+"""
+
+import argparse
+import datetime
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+from peewee import Model
+
+from astrolog.database import (
+    MODELS,
+    AltName,
+    AstroLogDatabase,
+    Barlow,
+    Binocular,
+    Camera,
+    Condition,
+    EyePiece,
+    Filter,
+    FrontFilter,
+    Kind,
+    Location,
+    Object,
+    Observation,
+    Session,
+    Structure,
+    Telescope,
+    database_proxy,
+)
+
+KINDS = (
+    "Galaxy",
+    "Emission nebula",
+    "Planetary nebula",
+    "Open cluster",
+    "Globular cluster",
+    "Double star",
+    "Planet",
+)
+NOTES = (
+    "Clear sky",
+    "Some high clouds",
+    "Windy, shaky views",
+    "Dew on the optics",
+    "Excellent transparency",
+    "Moon washed out the faint stuff",
+)
+# Longer nights give more sessions in winter
+MONTH_WEIGHTS = (12, 11, 10, 7, 4, 2, 2, 4, 8, 10, 11, 12)
+LAST_DATE = datetime.date(2024, 12, 31)
+CHUNK = 500
+
+
+@dataclass
+class Sizes:
+    """Number of rows of each kind, derived from the number of observations"""
+
+    observations: int
+    sessions: int
+    objects: int
+    locations: int
+    structures: int
+
+    @classmethod
+    def for_observations(cls, observations: int) -> "Sizes":
+        # About 8 objects a session, and a catalogue growing slower than the log
+        sessions = max(1, observations // 8)
+        return cls(
+            observations=observations,
+            sessions=sessions,
+            objects=max(110, observations // 50),
+            locations=max(2, math.isqrt(sessions) // 4),
+            structures=max(2, observations // 2000),
+        )
+
+
+def chunked(rows: Iterable[dict[str, Any]], size: int = CHUNK) -> Iterator[list]:
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def insert(model: type[Model], rows: Iterable[dict[str, Any]]) -> None:
+    for chunk in chunked(rows):
+        model.insert_many(chunk).execute()
+
+
+def object_name(id: int) -> str:
+    """Name of the object with `id`: the Messier objects, then NGC objects"""
+    return f"M{id}" if id <= 110 else f"NGC {id - 110}"
+
+
+def generate(observations: int, seed: int = 0) -> Sizes:
+    """Fill the empty tables of the database with a log of `observations`.
+
+    Objects are observed with a Zipf-like popularity, so a few are seen in most
+    sessions, and sessions fall more often in the long nights of winter. Rows
+    are inserted in chunks, in one transaction.
+    """
+    if Observation.select().exists():
+        raise ValueError("The database already has observations")
+    rng = random.Random(seed)
+    sizes = Sizes.for_observations(observations)
+    with database_proxy.atomic():
+        insert(Kind, ({"id": i, "name": name} for i, name in enumerate(KINDS, 1)))
+        insert(Filter, ({"id": 1, "name": "UHC"}, {"id": 2, "name": "OIII"}))
+        insert(FrontFilter, ({"id": 1, "name": "Solar"},))
+        insert(Barlow, ({"id": 1, "name": "2x", "multiplier": 2},))
+        insert(
+            Binocular,
+            ({"id": 1, "name": "10x50", "aperture": 50, "magnification": 10},),
+        )
+        insert(
+            Camera,
+            ({"id": 1, "manufacture": "ZWO", "model": "ASI294MC", "megapixel": 11.7},),
+        )
+        insert(
+            Telescope,
+            (
+                {"id": 1, "name": "Dobson", "aperture": 200, "focal_length": 1200},
+                {"id": 2, "name": "Refractor", "aperture": 80, "focal_length": 480},
+            ),
+        )
+        insert(
+            EyePiece,
+            (
+                {
+                    "id": i,
+                    "type": "Plössl",
+                    "focal_length": fl,
+                    "width": 1.25,
+                    "afov": 52,
+                }
+                for i, fl in enumerate((32, 25, 10, 6), 1)
+            ),
+        )
+        insert(
+            Location,
+            (
+                {
+                    "id": i,
+                    "name": f"Site {i}",
+                    "country": "Denmark",
+                    "latitude": f"{rng.randint(54, 57)}:{rng.randint(0, 59)}:0",
+                    "longitude": f"{rng.randint(8, 12)}:{rng.randint(0, 59)}:0",
+                    "utcoffset": 1,
+                    "altitude": rng.randint(0, 150),
+                }
+                for i in range(1, sizes.locations + 1)
+            ),
+        )
+        insert(
+            Structure,
+            ({"id": i, "name": f"Group {i}"} for i in range(1, sizes.structures + 1)),
+        )
+        insert(
+            Object,
+            (
+                {
+                    "id": i,
+                    "name": object_name(i),
+                    "favourite": rng.random() < 0.05,
+                    "to_be_watched": rng.random() < 0.02,
+                    "kind": rng.randint(1, len(KINDS)) if rng.random() < 0.9 else None,
+                    "structure": (
+                        rng.randint(1, sizes.structures) if rng.random() < 0.2 else None
+                    ),
+                }
+                for i in range(1, sizes.objects + 1)
+            ),
+        )
+        alt_ids = itertools.count(1)
+        insert(
+            AltName,
+            (
+                {"id": next(alt_ids), "object": i, "name": f"PGC {i}-{n}"}
+                for i in range(1, sizes.objects + 1)
+                if rng.random() < 0.3
+                for n in range(rng.randint(1, 2))
+            ),
+        )
+        insert(Condition, condition_rows(rng, sizes))
+        insert(Session, session_rows(rng, sizes))
+        insert(Observation, observation_rows(rng, sizes))
+    return sizes
+
+
+def session_rows(rng: random.Random, sizes: Sizes) -> Iterator[dict[str, Any]]:
+    # A few sessions a week, going back from LAST_DATE
+    years = min(30, max(1, sizes.sessions // 150))
+    for i in range(1, sizes.sessions + 1):
+        year = LAST_DATE.year - rng.randrange(years)
+        month = rng.choices(range(1, 13), weights=MONTH_WEIGHTS)[0]
+        yield {
+            "id": i,
+            "date": datetime.date(year, month, rng.randint(1, 28)),
+            "location": rng.randint(1, sizes.locations),
+            "moon_phase": rng.randint(0, 100),
+            "condition": i if i % 10 < 7 else None,
+            "note": rng.choice(NOTES) if rng.random() < 0.5 else None,
+        }
+
+
+def condition_rows(rng: random.Random, sizes: Sizes) -> Iterator[dict[str, Any]]:
+    # Seven in ten sessions have a condition, with the id of the session
+    for i in range(1, sizes.sessions + 1):
+        if i % 10 < 7:
+            yield {
+                "id": i,
+                "temperature": rng.randint(-10, 20),
+                "humidity": rng.randint(40, 100),
+                "seeing": round(rng.uniform(0.5, 4), 1),
+            }
+
+
+def observation_rows(rng: random.Random, sizes: Sizes) -> Iterator[dict[str, Any]]:
+    popularity = list(
+        itertools.accumulate(1 / rank**0.8 for rank in range(1, sizes.objects + 1))
+    )
+    objects = range(1, sizes.objects + 1)
+    for i in range(1, sizes.observations + 1):
+        # Every session has an observation, the rest are spread at random
+        session = i if i <= sizes.sessions else rng.randint(1, sizes.sessions)
+        row: dict[str, Any] = {
+            "id": i,
+            "session": session,
+            "object": rng.choices(objects, cum_weights=popularity)[0],
+            "binocular": None,
+            "telescope": None,
+            "eyepiece": None,
+            "barlow": None,
+            "camera": None,
+            "front_filter": None,
+            "optic_filter": None,
+            "note": rng.choice(NOTES) if rng.random() < 0.3 else None,
+            "image": None,
+        }
+        kind = rng.random()
+        if kind < 0.2:
+            row["binocular"] = 1
+        elif kind < 0.8:
+            row["telescope"] = rng.randint(1, 2)
+            row["eyepiece"] = rng.randint(1, 4)
+            row["barlow"] = 1 if rng.random() < 0.2 else None
+            row["optic_filter"] = rng.choice((None, None, None, 1, 2))
+        elif kind < 0.9:
+            row["telescope"] = rng.randint(1, 2)
+            row["camera"] = 1
+        yield row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="SQLite database to create")
+    parser.add_argument("--observations", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    database = AstroLogDatabase(args.path, pragmas={"journal_mode": "wal"})
+    database_proxy.initialize(database)
+    database.create_tables(MODELS)
+    sizes = generate(args.observations, seed=args.seed)
+    print(sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,37 @@
-from typing import cast
+from typing import Any, Callable, cast
 
-from flask import Blueprint, render_template, request
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+    url_for,
+)
+from markupsafe import Markup
 
-from astrolog.api import get_monthly_report, get_yearly_report
-from astrolog.database import Kind, Object, Observation
+from astrolog.api import (
+    get_monthly_report,
+    get_objects,
+    get_sessions,
+    get_yearly_report,
+    search_objects,
+    search_observations,
+    search_sessions,
+)
+from astrolog.database import (
+    ChangeEvent,
+    Kind,
+    Object,
+    Observation,
+    Session,
+    Structure,
+)
+from astrolog.pagination import Page
+from astrolog.web.caching import cached, conditional, data_version
+from astrolog.web.paging import get_page
 
 bp = Blueprint("ajax", __name__, url_prefix="/ajax")
 
@@ -35,9 +63,108 @@ def update_observation_note() -> tuple[str, int]:
 
 
 @bp.route("/get_report", methods=["GET"])
-def get_report() -> str:
+@conditional(Session, Observation, Object, Kind, Structure)
+def get_report() -> Markup:
     date_str = request.values.get("date", "")
     year, month = map(int, date_str.split("-")[0:2])
-    report_monthly = get_monthly_report(year, month)
-    report_yearly = get_yearly_report(year)
-    return render_template("sub/report.html", year=report_yearly, month=report_monthly)
+
+    def render() -> str:
+        return render_template(
+            "sub/report.html",
+            year=get_yearly_report(year),
+            month=get_monthly_report(year, month),
+        )
+
+    version = data_version(Session, Observation, Object, Kind, Structure)
+    return cached("report", year, month, version, render=render)
+
+
+# The listings as JSON, with the same cursors as the pages
+def session_json(session: Session) -> dict[str, Any]:
+    return {
+        "id": session.id,
+        "date": session.date.isoformat(),
+        "location": session.location.name,
+        "note": session.note,
+        "url": url_for("session_page", session_id=session.id),
+    }
+
+
+def object_json(object: Object) -> dict[str, Any]:
+    return {
+        "id": object.id,
+        "name": object.name,
+        "favourite": object.favourite,
+        "to_be_watched": object.to_be_watched,
+    }
+
+
+def observation_json(observation: Observation) -> dict[str, Any]:
+    return {
+        "id": observation.id,
+        "object": observation.object.name,
+        "session": session_json(observation.session),
+        "note": observation.note,
+    }
+
+
+def page_json(page: Page, item_json: Callable[[Any], dict[str, Any]]) -> Response:
+    return jsonify(
+        items=[item_json(item) for item in page.items], next=page.next, prev=page.prev
+    )
+
+
+@bp.route("/sessions", methods=["GET"])
+def sessions() -> Response:
+    return page_json(get_page(get_sessions), session_json)
+
+
+@bp.route("/objects", methods=["GET"])
+def objects() -> Response:
+    return page_json(get_page(get_objects), object_json)
+
+
+SEARCHES = {
+    "objects": (search_objects, object_json),
+    "sessions": (search_sessions, session_json),
+    "observations": (search_observations, observation_json),
+}
+
+
+@bp.route("/search/<kind>", methods=["GET"])
+def search(kind: str) -> Response:
+    if kind not in SEARCHES:
+        abort(404)
+    function, item_json = SEARCHES[kind]
+    return page_json(get_page(function, request.args.get("search", "")), item_json)
+
+
+def change_json(change: ChangeEvent) -> dict[str, Any]:
+    return {
+        "seq": change.id,
+        "table": change.name,
+        "id": change.row_id,
+        "action": change.action.lower(),
+        "time": change.time,
+    }
+
+
+@bp.route("/changes", methods=["GET"])
+def changes() -> Response:
+    """The changes after the sequence number `since`, `size` at a time.
+
+    `last` is the sequence number to ask from next, and `more` whether there
+    are more changes after it already.
+    """
+    try:
+        since = int(request.args.get("since", 0))
+        size = int(request.args.get("size", current_app.config["PAGE_SIZE"]))
+    except ValueError:
+        abort(400)
+    size = min(max(size, 1), current_app.config["MAX_PAGE_SIZE"])
+    changes = ChangeEvent.since(since, size + 1)
+    return jsonify(
+        items=[change_json(change) for change in changes[:size]],
+        last=changes[:size][-1].id if changes else since,
+        more=len(changes) > size,
+    )
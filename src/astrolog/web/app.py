@@ -1,31 +1,47 @@
 import datetime
+import math
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Any, cast
-
-import astropy.units as u
-import matplotlib
-import matplotlib.pyplot as plt
-import mpld3
-import numpy as np
-from astropy.coordinates import AltAz, EarthLocation, SkyCoord, get_body, get_sun
-from astropy.coordinates.name_resolve import NameResolveError
-from astropy.time import Time
-from astropy.visualization import quantity_support
-from astroquery.vo_conesearch import ConeSearch
-from flask import Flask, flash, redirect, render_template, request, session, url_for
-from peewee import JOIN, IntegrityError, SqliteDatabase
-from werkzeug.datastructures import ImmutableMultiDict
-from werkzeug.utils import secure_filename
+from typing import Any
+
+from flask import (
+    Flask,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
+from peewee import JOIN, IntegrityError, prefetch
+from werkzeug.serving import is_running_from_reloader
 from werkzeug.wrappers.response import Response
 
-from astrolog.api import create_observation, create_user, delete_location, valid_login
+from astrolog import passwords
+from astrolog.api import (
+    create_observation,
+    create_user,
+    delete_location,
+    get_gallery,
+    get_objects,
+    get_sessions,
+    search_objects,
+    search_observations,
+    search_sessions,
+    valid_login,
+)
+from astrolog.backup import BackupScheduler
+from astrolog.catalog import EQUIPMENT, EquipmentCatalog
 from astrolog.database import (
-    MODELS,
     AltName,
+    AstroLogDatabase,
     Barlow,
     Binocular,
     Camera,
+    Condition,
     EyePiece,
     Filter,
     FrontFilter,
@@ -39,18 +55,79 @@ from astrolog.database import (
     Telescope,
     User,
     database_proxy,
+    load_alt_names,
+)
+from astrolog.images import DEFAULT_UPLOAD_FOLDER, add_derivatives, store_upload
+from astrolog.jobs import JobQueue
+from astrolog.migrate import print_progress, upgrade
+from astrolog.passwords import DEFAULT_ROUNDS, HasherBusy, LoginThrottle, PasswordHasher
+from astrolog.web import ajax, monitoring, planning, profiling, slow_queries
+from astrolog.web.caching import (
+    FragmentCacheExtension,
+    conditional,
+    data_version,
+    static_cache_headers,
+    static_url_defaults,
 )
-from astrolog.web.ajax import bp
+from astrolog.web.compression import compress
+from astrolog.web.paging import get_page
 
-ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "gif"}
+catalog = EquipmentCatalog()
+ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "gif", "fits", "fit", "fts"}
 app = Flask(__name__, template_folder="templates")
 app.secret_key = os.urandom(24)
-app.config["UPLOAD_FOLDER"] = os.path.join(str(app.static_folder), "uploads")
-app.register_blueprint(bp)
-
-degree = cast(u.UnitBase, u.deg)
-meter = cast(u.UnitBase, u.m)
-hour = cast(u.UnitBase, u.hour)
+app.config["UPLOAD_FOLDER"] = DEFAULT_UPLOAD_FOLDER
+app.config["IMAGE_WORKERS"] = 2
+app.config["PAGE_SIZE"] = 50
+app.config["MAX_PAGE_SIZE"] = 500
+app.config["GALLERY_PAGE_SIZE"] = 24
+app.config["PLOT_WORKERS"] = int(os.getenv("ASTRO_LOG_PLOT_WORKERS", os.cpu_count()))
+app.config["PLOT_MAX_TASKS_PER_WORKER"] = 100
+app.config["PLOT_CACHE_SIZE"] = 128
+app.config["PLOT_CACHE_DIR"] = os.path.join(app.instance_path, "plot-cache")
+app.config["PLOT_CACHE_MAX_BYTES"] = 256 * 1024**2
+app.config["PLOT_CACHE_TIMEOUT"] = 7 * 24 * 3600
+app.config["FRAGMENT_CACHE_SIZE"] = 256
+app.config["FRAGMENT_CACHE_DIR"] = os.getenv("ASTRO_LOG_FRAGMENT_CACHE_DIR")
+app.config["FRAGMENT_CACHE_MAX_BYTES"] = 64 * 1024**2
+app.config["FRAGMENT_CACHE_TIMEOUT"] = 24 * 3600
+app.config["COMPRESS_MIN_SIZE"] = 500
+app.config["COMPRESS_LEVEL"] = 6
+app.config["STATIC_MAX_AGE"] = 365 * 24 * 3600
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.globals["data_version"] = data_version
+app.config["DEBUG_PROFILE"] = bool(os.getenv("ASTRO_LOG_DEBUG_PROFILE"))
+app.config["PROFILE_HISTORY"] = 50
+app.config["PROFILE_SLOWEST"] = 5
+app.config["SLOW_QUERY_THRESHOLD"] = float(
+    os.getenv("ASTRO_LOG_SLOW_QUERY_THRESHOLD", 0.1)
+)
+app.config["SLOW_QUERY_LOG"] = os.path.join(app.instance_path, "slow-queries.log")
+app.config["SLOW_QUERY_LOG_MAX_BYTES"] = 10 * 1024**2
+app.config["SLOW_QUERY_LOG_BACKUPS"] = 5
+app.config["SLOW_QUERY_HISTORY"] = 100
+monitoring.init_app(app)
+profiling.init_app(app)
+slow_queries.init_app(app)
+app.url_defaults(static_url_defaults)
+app.after_request(compress)
+app.after_request(static_cache_headers)
+app.config["BCRYPT_ROUNDS"] = DEFAULT_ROUNDS
+app.config["PASSWORD_WORKERS"] = 2
+app.config["PASSWORD_MAX_PENDING"] = 16
+app.config["LOGIN_ATTEMPTS_PER_USER"] = 5
+app.config["LOGIN_ATTEMPTS_PER_ADDRESS"] = 20
+app.config["LOGIN_WINDOW"] = 300
+app.config["BACKUP_DIR"] = os.getenv("ASTRO_LOG_BACKUP_DIR")
+app.config["BACKUP_INTERVAL"] = float(os.getenv("ASTRO_LOG_BACKUP_INTERVAL", 24 * 3600))
+app.config["BACKUP_KEEP"] = int(os.getenv("ASTRO_LOG_BACKUP_KEEP", 7))
+app.register_blueprint(ajax.bp)
+app.register_blueprint(planning.bp)
+
+_image_jobs: JobQueue | None = None
+_image_jobs_lock = threading.Lock()
+_throttles: tuple[LoginThrottle, LoginThrottle] | None = None
+_throttles_lock = threading.Lock()
 
 
 def login_required(f: Any) -> Any:
@@ -71,6 +148,45 @@ def allowed_file(fname: str) -> bool:
     return "." in fname and fname.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def get_image_jobs() -> JobQueue:
+    """Threads making thumbnails and previews of uploaded images"""
+    global _image_jobs
+    with _image_jobs_lock:
+        if _image_jobs is None:
+            executor = ThreadPoolExecutor(
+                max_workers=app.config["IMAGE_WORKERS"], thread_name_prefix="images"
+            )
+            _image_jobs = JobQueue(executor)
+        return _image_jobs
+
+
+def get_hasher() -> PasswordHasher:
+    """The hasher of astrolog.passwords, made from the config on first use"""
+    config = current_app.config
+    return passwords.get_hasher(
+        rounds=config["BCRYPT_ROUNDS"],
+        workers=config["PASSWORD_WORKERS"],
+        max_pending=config["PASSWORD_MAX_PENDING"],
+    )
+
+
+def get_throttles() -> tuple[LoginThrottle, LoginThrottle]:
+    """Failed logins by username and by address"""
+    global _throttles
+    with _throttles_lock:
+        if _throttles is None:
+            config = current_app.config
+            _throttles = (
+                LoginThrottle(
+                    config["LOGIN_ATTEMPTS_PER_USER"], config["LOGIN_WINDOW"]
+                ),
+                LoginThrottle(
+                    config["LOGIN_ATTEMPTS_PER_ADDRESS"], config["LOGIN_WINDOW"]
+                ),
+            )
+        return _throttles
+
+
 @app.route("/")
 def main() -> Response:
     if not User.select().count():
@@ -85,8 +201,12 @@ def create_user_page() -> Response | str:
             create_user(
                 username=request.form.get("username", ""),
                 password=request.form.get("password", ""),
+                hasher=get_hasher(),
             )
             return redirect(url_for("login"))
+        except HasherBusy:
+            flash("The server is busy, please try again", category="danger")
+            return redirect(url_for("create_user_page"))
         except ValueError:
             flash(
                 "Both username and password are required. Password should be minimum 8 characters long",
@@ -97,45 +217,53 @@ def create_user_page() -> Response | str:
 
 
 @app.route("/login", methods=["GET", "POST"])
-def login() -> Response | str:
+def login() -> Response | str | tuple[str, int]:
     if request.method == "POST":
         form = request.form
         if "logout" in form.keys():
             del session["logged_in"]
             flash("You are now logged out", category="success")
             return redirect(url_for("main"))
-        if valid_login(
-            username=form.get("username", ""), password=form.get("password", "")
-        ):
+        username, address = form.get("username", ""), str(request.remote_addr)
+        user_throttle, address_throttle = get_throttles()
+        # Floods of attempts are turned away before any password is hashed
+        wait = max(
+            user_throttle.retry_after(username),
+            address_throttle.retry_after(address),
+        )
+        if wait > 0:
+            minutes = math.ceil(wait / 60)
+            flash(
+                f"Too many failed logins, try again in {minutes} minutes",
+                category="danger",
+            )
+            return render_template("login.html", logged_in=False), 429
+        try:
+            valid = valid_login(username, form.get("password", ""), hasher=get_hasher())
+        except HasherBusy:
+            flash("The server is busy, please try again", category="danger")
+            return render_template("login.html", logged_in=False), 503
+        if valid:
+            user_throttle.succeeded(username)
             session["logged_in"] = True
             flash("You are now logged in", category="success")
             return redirect(url_for("main"))
         else:
+            user_throttle.failed(username)
+            address_throttle.failed(address)
             flash("Wrong username and/or password", category="danger")
     return render_template("login.html", logged_in=session.get("logged_in"))
 
 
 @app.route("/search")
 def search() -> str:
-    text = request.values.get("search")
-    expr = f"%{text}%"
-    objects = (
-        Object.select()
-        .join(AltName, JOIN.LEFT_OUTER)
-        .switch(Object)
-        .join(Structure, JOIN.LEFT_OUTER)
-        .where((Object.name**expr) | (AltName.name**expr) | (Structure.name**expr))
-    )
-    observations = Observation.select().where(
-        (Observation.note**expr) | (Observation.object.in_(objects))
-    )
-    sessions = Session.select().where(Session.note**expr)
+    text = request.values.get("search", "")
     return render_template(
         "search.html",
         text=text,
-        objects=objects,
-        observations=observations,
-        sessions=sessions,
+        objects=get_page(search_objects, text, prefix="objects_"),
+        observations=get_page(search_observations, text, prefix="observations_"),
+        sessions=get_page(search_sessions, text, prefix="sessions_"),
     )
 
 
@@ -179,19 +307,20 @@ def new_observation(session_id: int) -> Response | str:
             flash(
                 f"Congratulations! First time observing {obj.name}", category="success"
             )
+        equipment = catalog.current()
         telescope = eyepiece = optic_filter = front_filter = binocular = barlow = (
             camera
         ) = None
         match form.get("observation-type"):
             case "telescope":
-                telescope = Telescope.get_or_none(id=form.get("telescope_id"))
-                eyepiece = EyePiece.get_or_none(id=form.get("eyepiece_id"))
-                barlow = Barlow.get_or_none(id=form.get("barlow_id"))
-                camera = Camera.get_or_none(id=form.get("camera_id"))
-                optic_filter = Filter.get_or_none(id=form.get("optical_filter_id"))
-                front_filter = FrontFilter.get_or_none(id=form.get("front_filter_id"))
+                telescope = equipment.get(Telescope, form.get("telescope_id"))
+                eyepiece = equipment.get(EyePiece, form.get("eyepiece_id"))
+                barlow = equipment.get(Barlow, form.get("barlow_id"))
+                camera = equipment.get(Camera, form.get("camera_id"))
+                optic_filter = equipment.get(Filter, form.get("optical_filter_id"))
+                front_filter = equipment.get(FrontFilter, form.get("front_filter_id"))
             case "binocular":
-                binocular = Binocular.get_or_none(id=form.get("binocular_id"))
+                binocular = equipment.get(Binocular, form.get("binocular_id"))
             case "naked_eye":
                 pass
         try:
@@ -214,16 +343,17 @@ def new_observation(session_id: int) -> Response | str:
             return redirect(url_for("new_observation", session_id=session_id))
         flash("Observation created", category="success")
 
+    equipment = catalog.current()
     return render_template(
         "observation.html",
         session=session,
-        telescopes=Telescope,
-        eyepieces=EyePiece,
-        barlows=Barlow,
-        cameras=Camera,
-        optical_filters=Filter,
-        front_filters=FrontFilter,
-        binoculars=Binocular,
+        telescopes=equipment.all(Telescope),
+        eyepieces=equipment.all(EyePiece),
+        barlows=equipment.all(Barlow),
+        cameras=equipment.all(Camera),
+        optical_filters=equipment.all(Filter),
+        front_filters=equipment.all(FrontFilter),
+        binoculars=equipment.all(Binocular),
     )
 
 
@@ -237,23 +367,30 @@ def upload_image(observation_id: int) -> Response | str:
     if not allowed_file(str(file.filename)):
         flash("Image extension not allowed", category="warning")
         return redirect(url_for("session_page", session_id=observation.session.id))
-    fname_path = os.path.join(
-        app.config["UPLOAD_FOLDER"], secure_filename(str(file.filename))
-    )
-    file.save(fname_path)
-    observation.add_image(fname_path)
+    directory = app.config["UPLOAD_FOLDER"]
+    extension = str(file.filename).rsplit(".", 1)[1]
+    image, created = store_upload(file.stream, extension, directory)
+    observation.image = image
+    observation.save()
+    if created:
+        if app.config["IMAGE_WORKERS"] == 0:
+            add_derivatives(image.id, directory)
+        else:
+            get_image_jobs().submit(
+                f"image-{image.id}", add_derivatives, image.id, directory
+            )
     flash("Image successfully saved", category="success")
     return redirect(url_for("session_page", session_id=observation.session.id))
 
 
 @app.route("/session/all")
+@conditional(Session, Location, Observation)
 def all_sessions() -> str:
-    return render_template(
-        "sessions.html", sessions=Session.select().order_by(Session.date.desc())
-    )
+    return render_template("sessions.html", sessions=get_page(get_sessions))
 
 
 @app.route("/session/<int:session_id>")
+@conditional(Session, Location, Observation, Object, Image, Condition, *EQUIPMENT)
 def session_page(session_id: int) -> Response | str:
     session = Session.get_or_none(session_id)
     if not session:
@@ -264,8 +401,14 @@ def session_page(session_id: int) -> Response | str:
 
 # Objects
 @app.route("/structures", methods=["GET"])
+@conditional(Structure, Object)
 def structures() -> str:
-    return render_template("structures.html", structures=Structure, objects=Object)
+    objects = Object.select(Object.id, Object.name, Object.structure)
+    return render_template(
+        "structures.html",
+        structures=prefetch(Structure.select(), objects),
+        objects=Object.select(Object.id, Object.name),
+    )
 
 
 @app.route("/structures/add", methods=["POST"])
@@ -316,9 +459,17 @@ def objects() -> str:
                     )
                 if structure := Structure.get_or_none(id=form.get("structure_id")):
                     structure.add_object(object)
+    to_be_watched = list(
+        Object.select(Object, Structure)
+        .join(Structure, JOIN.LEFT_OUTER)
+        .where(Object.to_be_watched)
+        .order_by(Object.name)
+    )
+    load_alt_names(to_be_watched)
     return render_template(
         "objects.html",
-        objects=Object.select().order_by(Object.name),
+        objects=get_page(get_objects),
+        to_be_watched=to_be_watched,
         structures=Structure.select().order_by(Structure.name),
         kinds=Kind.select().order_by(Kind.name),
     )
@@ -328,7 +479,9 @@ def objects() -> str:
 @login_required
 def add_alt_name() -> Response | str:
     form = request.form
-    object = Object.get(name=form.get("object"))
+    if (object := Object.get_or_none(name=form.get("object"))) is None:
+        flash(f'Object "{form.get("object")}" was not found', category="danger")
+        return redirect(url_for("objects"))
     if alt_name := form.get("alt-name"):
         try:
             AltName.create(object=object, name=alt_name)
@@ -350,6 +503,7 @@ def add_alt_name() -> Response | str:
 
 # Equipments
 @app.route("/equipments")
+@conditional(*EQUIPMENT)
 def equipments() -> str:
     return render_template(
         "equipments.html",
@@ -363,6 +517,12 @@ def equipments() -> str:
     )
 
 
+@app.route("/equipments/planner")
+@conditional(*EQUIPMENT)
+def equipment_planner() -> str:
+    return render_template("equipment_planner.html", optics=catalog.current().optics)
+
+
 @app.route("/equipments/new/telescope", methods=["POST"])
 @login_required
 def new_telescope() -> Response:
@@ -380,6 +540,7 @@ def new_telescope() -> Response:
         name=name, aperture=aperture, focal_length=focal_length
     )
     if created:
+        catalog.invalidate()
         flash(f'Telescope "{telescope.name}" was created', category="success")
     else:
         flash(f'Telescope "{telescope.name}" already exists', category="warning")
@@ -403,6 +564,7 @@ def new_binocular() -> Response:
         name=name, aperture=aperture, magnification=magnification
     )
     if created:
+        catalog.invalidate()
         flash(f'Binocular "{binocular.name}" was created', category="success")
     else:
         flash(f'Binocular "{binocular.name}" already exists', category="warning")
@@ -426,6 +588,7 @@ def new_eyepiece() -> Response:
         type=type_, focal_length=focal_length, width=width, afov=form.get("afov", None)
     )
     if created:
+        catalog.invalidate()
         flash(f'Eyepiece "{eyepiece.type}" was created', category="success")
     else:
         flash(f'Eyepiece "{eyepiece.type}" already exists', category="warning")
@@ -444,6 +607,7 @@ def new_barlow() -> Response:
         return redirect(url_for("equipments"))
     barlow, created = Barlow.get_or_create(name=name, multiplier=multiplier)
     if created:
+        catalog.invalidate()
         flash(
             f'Barlow "{barlow.name} ({barlow.multiplier})" was created',
             category="success",
@@ -473,6 +637,7 @@ def new_camera() -> Response:
         manufacture=manufacture, model=model, megapixel=megapixel
     )
     if created:
+        catalog.invalidate()
         flash(
             f'Camera "{camera.manufacture}, {camera.model} ({camera.megapixel}MP)" was created',
             category="success",
@@ -494,6 +659,7 @@ def new_filter() -> Response:
         return redirect(url_for("equipments"))
     filter_, created = Filter.get_or_create(name=name)
     if created:
+        catalog.invalidate()
         flash(f'Filter "{filter_.name}" was created', category="success")
     else:
         flash(f'Filter "{filter_.name}" already exists', category="warning")
@@ -509,6 +675,7 @@ def new_front_filter() -> Response:
         return redirect(url_for("equipments"))
     filter_, created = FrontFilter.get_or_create(name=name)
     if created:
+        catalog.invalidate()
         flash(f'Front filter "{filter_.name}" was created', category="success")
     else:
         flash(f'Front filter "{filter_.name}" already exists', category="warning")
@@ -579,203 +746,11 @@ def new_location() -> Response:
     return redirect(url_for("locations"))
 
 
-# Planning
-@app.route("/visibility", methods=["GET", "POST"])
-def visibility() -> str:
-    if request.method == "POST":
-        if request.form.get("year"):
-            fig = visibility_plot_year(request.form)
-        else:
-            fig = visibility_plot(request.form)
-        return render_template(
-            "visibility_curve.html",
-            locations=Location,
-            fig=fig,
-            is_year=request.form.get("year") is not None,
-            latitude=request.form.get("latitude"),
-            longitude=request.form.get("longitude"),
-            utcoffset=request.form.get("utcoffset"),
-            altitude=request.form.get("altitude"),
-            date=request.form.get("date"),
-            name=request.form.get("name"),
-        )
-    today = datetime.datetime.today().date()
-    return render_template(
-        "visibility_curve.html",
-        locations=Location,
-        date=today,
-        fig=None,
-        name=None,
-        latitude=None,
-        longitude=None,
-        utcoffset=None,
-        altitude=None,
-        is_year=None,
-    )
-
-
-def get_earth_location(form: ImmutableMultiDict[str, str]) -> EarthLocation:
-    latitude, longitude = form.get("latitude"), form.get("longitude")
-    if latitude and longitude:
-        latitude_decimal = Location.coordinate_to_decimal(latitude)
-        longitude_decimal = Location.coordinate_to_decimal(longitude)
-        return EarthLocation(
-            lat=latitude_decimal * degree,
-            lon=longitude_decimal * degree,
-            height=int(form.get("altitude", 0) or 0) * meter,
-        )
-    return Location.get_by_id(int(form.get("location", -1))).earth_location
-
-
-def visibility_plot_year(form: ImmutableMultiDict[str, str]) -> str:
-    quantity_support()
-    matplotlib.use("agg")
-    earth_location = get_earth_location(form)
-
-    first_day = datetime.datetime(datetime.date.today().year, 1, 1)
-    times_list = [first_day + datetime.timedelta(days=i) for i in range(1, 366)]
-    times = Time(times_list)
-    frames = AltAz(obstime=times, location=earth_location)
-    fig = plt.figure(figsize=(12, 6))
-    for name in form.get("name", "").split(","):
-        try:
-            obj = SkyCoord.from_name(name)
-        except NameResolveError:
-            flash(f"Could not find object: {name}", category="danger")
-            continue
-        obj_pos = obj.transform_to(frames)
-
-        plt.plot(times_list, obj_pos.alt, label=name, lw=5)
-
-    plt.ylim(0, 90)
-    plt.grid(True, which="both", axis="both")
-    plt.xlabel("Day of year")
-    plt.ylabel("Altitude [deg]")
-    plt.legend(loc="upper left")
-    return mpld3.fig_to_html(fig)
-
-
-def get_midnight(form: ImmutableMultiDict[str, str]) -> Time:
-    if form.get("latitude") and form.get("longitude"):
-        # Use custom location, so use custom UTC offset
-        utcoffset = int(form.get("utcoffset", 0))
-    else:
-        utcoffset = Location.get_by_id(int(form.get("location", 0))).utcoffset
-    return Time(form.get("date")) - utcoffset * hour
-
-
-def visibility_plot(form: ImmutableMultiDict[str, str]) -> str:
-    quantity_support()
-    matplotlib.use("agg")
-    earth_location = get_earth_location(form)
-    midnight = get_midnight(form)
-    delta_midnight = np.linspace(-12, 12, 1000) * hour
-    times = midnight + delta_midnight
-    frames = AltAz(obstime=times, location=earth_location)
-    sun_pos = get_sun(times).transform_to(frames)
-    moon_pos = get_body("moon", times).transform_to(frames)
-    fig = plt.figure()
-    plt.plot(delta_midnight, sun_pos.alt, "--y", label="Sun")
-    plt.plot(delta_midnight, moon_pos.alt, "--r", label="Moon")
-    for name in form.get("name", "").split(","):
-        try:
-            obj = SkyCoord.from_name(name)
-        except NameResolveError:
-            flash(f"Could not find object: {name}", category="danger")
-            continue
-        obj_pos = obj.transform_to(frames)
-
-        plt.plot(delta_midnight, obj_pos.alt, label=name, lw=5)
-
-    sun_pos_alt: SkyCoord = cast(SkyCoord, sun_pos.alt)
-    horizon_0: u.UnitBase = cast(u.UnitBase, -0 * degree)
-    horizon_18: u.UnitBase = cast(u.UnitBase, -18 * degree)
-    plt.fill_between(
-        delta_midnight,
-        0 * degree,
-        90 * degree,
-        where=sun_pos_alt < horizon_0,
-        color="0.5",
-        zorder=0,
-    )
-    plt.fill_between(
-        delta_midnight,
-        0 * degree,
-        90 * degree,
-        where=sun_pos.alt < horizon_18,
-        color="k",
-        zorder=0,
-    )
-
-    plt.legend(loc="upper left")
-    plt.xlim(-12, 12)
-    plt.xticks((np.arange(13) * 2 - 12))
-    plt.grid(True, which="both", axis="both")
-    plt.ylim(0, 90)
-    plt.xlabel("Hours from midnight")
-    plt.ylabel("Altitude [deg]")
-    return mpld3.fig_to_html(fig)
-
-
-@app.route("/finding-chart", methods=["GET", "POST"])
-def finding_chart() -> str:
-    if request.method == "POST":
-        fig = finding_chart_plot(request.form)
-        return render_template(
-            "finding_chart.html",
-            radius=request.form.get("radius"),
-            threshold=request.form.get("threshold"),
-            name=request.form.get("name"),
-            fig=fig,
-        )
-    return render_template(
-        "finding_chart.html", radius=0.5, threshold=8, fig=None, name=None
-    )
-
-
-def finding_chart_plot(form: ImmutableMultiDict[str, str]) -> str | None:
-    def filter_table(table, obj, tol=1e-3):
-        diff_ra = abs(table["ra"] - obj.ra)
-        diff_dec = abs(table["dec"] - obj.dec)
-        n = len(table)
-        while (min(diff_ra) < tol) and (min(diff_dec) < tol):
-            table = table[(diff_ra != min(diff_ra)) & (diff_dec != min(diff_dec))]
-            diff_ra = abs(table["ra"] - obj.ra)
-            diff_dec = abs(table["dec"] - obj.dec)
-            if len(table) == n:
-                # RA for object1 is close to obj, while DEC for object2 is close to obj.
-                break
-        return table
-
-    quantity_support()
-    matplotlib.use("agg")
-    name = form.get("name")
-    threshold = float(form.get("threshold", 10))
-    try:
-        obj = SkyCoord.from_name(name)
-    except NameResolveError:
-        flash(f"Could not find object: {name}", category="danger")
-        return None
-    result = ConeSearch.query_region(obj, float(form.get("radius", 1)) * degree)
-    if result is None:
-        return None
-    result = result[result["Mag"] <= float(threshold)]
-    result = filter_table(result, obj)
-    size = abs(result["Mag"] - float(threshold)) * 10
-
-    fig = plt.figure()
-    plt.scatter(result["ra"], result["dec"], s=size, c=result["Mag"], cmap="plasma")
-    plt.scatter(obj.ra, obj.dec, c="C2", marker="*", s=200)
-    plt.xlabel("RA")
-    plt.ylabel("DEC")
-    plt.colorbar().set_label("Magnitude")
-    return mpld3.fig_to_html(fig)
-
-
 @app.route("/gallery", methods=["GET"])
+@conditional(Image, Observation, Object, Session)
 def gallery() -> str:
-    images = Image.select().join(Observation)
-    return render_template("gallery.html", images=images, enumerate=enumerate)
+    page = get_page(get_gallery, size=app.config["GALLERY_PAGE_SIZE"])
+    return render_template("gallery.html", page=page, enumerate=enumerate)
 
 
 @app.route("/report", methods=["GET"])
@@ -788,8 +763,18 @@ if __name__ == "__main__":  # pragma: no cover
     # Setup DB
     DEFAULT_DB = os.path.join(os.path.abspath("."), "AstroLog.db")
     ASTRO_LOG_DB = os.getenv("ASTRO_LOG_DB", DEFAULT_DB)
-    db = SqliteDatabase(ASTRO_LOG_DB)
+    # Readers, including backups, do not hold up writers in WAL mode
+    db = AstroLogDatabase(ASTRO_LOG_DB, pragmas={"journal_mode": "wal"})
     database_proxy.initialize(db)
-    db.create_tables(MODELS)
+    upgrade(progress=print_progress, upload_folder=app.config["UPLOAD_FOLDER"])
+    # With the reloader, only the process serving the requests makes backups
+    if app.config["BACKUP_DIR"] and is_running_from_reloader():
+        BackupScheduler(
+            app.config["BACKUP_DIR"],
+            app.config["BACKUP_INTERVAL"],
+            app.config["BACKUP_KEEP"],
+            database=ASTRO_LOG_DB,
+            uploads=app.config["UPLOAD_FOLDER"],
+        ).start()
 
     app.run(host="0.0.0.0", port=5065, debug=True)
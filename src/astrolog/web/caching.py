@@ -0,0 +1,194 @@
+import datetime
+import hashlib
+import os
+import re
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable
+
+from flask import current_app, make_response, request, session
+from flask.wrappers import Response
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+from markupsafe import Markup
+from peewee import Model
+
+from astrolog.cache import DiskCache, LRUCache, TieredCache, cache_key
+from astrolog.database import DataVersion
+from astrolog.metrics import CACHE
+
+_templates_version: str | None = None
+_fragment_cache: TieredCache | None = None
+_static_versions: dict[str, tuple[int, str]] = {}
+_static_lock = threading.Lock()
+
+# Uploads, and the smaller copies made of them, are named after their hash
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}[.-]")
+
+
+def templates_version() -> str:
+    """Hash of the sizes and modification times of the templates.
+
+    Part of every ETag, so pages are rendered again after the templates change.
+    """
+    global _templates_version
+    if _templates_version is None:
+        stats = []
+        for root, _, files in os.walk(str(current_app.template_folder)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                stats.append((name, stat.st_size, stat.st_mtime_ns))
+        _templates_version = cache_key(sorted(stats))
+    return _templates_version
+
+
+def conditional(*models: type[Model]) -> Callable[[Any], Any]:
+    """Answer GET requests with 304 Not Modified while `models` are unchanged.
+
+    The ETag of a page is derived from the URL and the DataVersion of the
+    tables it shows, and Last-Modified from the last write to them. When the
+    browser already has the current version, the view is not called, so no
+    template is rendered and only the versions are queried. Pages with flashed
+    messages waiting to be shown are always rendered.
+    """
+
+    def decorator(f: Any) -> Any:
+        @wraps(f)
+        def wrap(*args: Any, **kwargs: Any) -> Any:
+            if request.method != "GET" or session.get("_flashes"):
+                return f(*args, **kwargs)
+            versions = DataVersion.of(*models)
+            etag = cache_key(request.full_path, versions, templates_version())
+            modified = int(
+                max((changed for _, changed in versions.values()), default=0)
+            )
+            last_modified = datetime.datetime.fromtimestamp(
+                modified, datetime.timezone.utc
+            )
+            if request.if_none_match:
+                unchanged = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                unchanged = since is not None and since >= last_modified
+            if unchanged:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Last-Modified only has whole seconds, so it is left out until the
+            # second of the last change has passed and no change can share it
+            if modified < int(time.time()):
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+
+        return wrap
+
+    return decorator
+
+
+def get_fragment_cache() -> TieredCache:
+    global _fragment_cache
+    if _fragment_cache is None:
+        config = current_app.config
+        disk = None
+        if directory := config["FRAGMENT_CACHE_DIR"]:
+            disk = DiskCache(directory, max_bytes=config["FRAGMENT_CACHE_MAX_BYTES"])
+        _fragment_cache = TieredCache(LRUCache(config["FRAGMENT_CACHE_SIZE"]), disk)
+    return _fragment_cache
+
+
+def data_version(*models: type[Model] | str) -> str:
+    """Token changing whenever one of `models` (or tables by name) changes"""
+    versions = DataVersion.of(*models)
+    # With the time of the change, as the versions start over in a new database
+    return ",".join(
+        f"{name}:{versions[name][0]}:{versions[name][1]}" for name in sorted(versions)
+    )
+
+
+def cached(name: str, *parts: Any, render: Callable[[], str]) -> Markup:
+    """HTML from `render()`, cached under `name` and the key `parts`.
+
+    The parts should include the data_version() of the tables the fragment is
+    made from, so it is rendered again once they change, as it is once the
+    templates change. Fragments are kept in memory, and in FRAGMENT_CACHE_DIR
+    when set, to share them between processes.
+    """
+    key = cache_key("fragment", name, templates_version(), *parts)
+    cache = get_fragment_cache()
+    if (html := cache.get(key)) is not None:
+        CACHE.labels("fragment", "hit").inc()
+    else:
+        CACHE.labels("fragment", "miss").inc()
+        html = str(render())
+        expires = time.time() + current_app.config["FRAGMENT_CACHE_TIMEOUT"]
+        cache.set(key, html, expires)
+    return Markup(html)
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name, *parts %}...{% endcache %} tag for templates, see cached()"""
+
+    tags = {"cache"}
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_cache", [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cache(self, parts: list[Any], caller: Callable[[], str]) -> Markup:
+        return cached(*parts, render=caller)
+
+
+def static_version(filename: str) -> str | None:
+    """Short hash of the content of a static file, None if it does not exist"""
+    path = os.path.join(str(current_app.static_folder), filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _static_lock:
+        if (item := _static_versions.get(path)) is not None and item[0] == mtime:
+            return item[1]
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024**2):
+            sha256.update(chunk)
+    version = sha256.hexdigest()[:12]
+    with _static_lock:
+        _static_versions[path] = (mtime, version)
+    return version
+
+
+def static_url_defaults(endpoint: str, values: dict[str, Any]) -> None:
+    """Add the version of static files to their URLs, as `v`"""
+    if endpoint == "static" and "v" not in values:
+        if (version := static_version(values["filename"])) is not None:
+            values["v"] = version
+
+
+def static_cache_headers(response: Response) -> Response:
+    """Let browsers keep static files for STATIC_MAX_AGE without asking again.
+
+    Only URLs with the current version of a file, or uploads, which are stored
+    under the hash of their content, are cached like this, as they never change.
+    """
+    if request.endpoint != "static" or response.status_code not in (200, 206, 304):
+        return response
+    filename = str(request.view_args["filename"])
+    if CONTENT_ADDRESSED.match(os.path.basename(filename)) or request.args.get(
+        "v"
+    ) == static_version(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config["STATIC_MAX_AGE"]
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,91 @@
+import gzip
+import os
+import threading
+
+from flask import current_app, request
+from flask.wrappers import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE = {
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+# Compressed static files, by path and encoding, with their modification time
+_static: dict[tuple[str, str], tuple[int, bytes]] = {}
+_static_lock = threading.Lock()
+
+
+def choose_encoding() -> str | None:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    level = current_app.config["COMPRESS_LEVEL"]
+    if encoding == "br":
+        # Brotli levels go up to 11, where gzip stops at 9
+        return brotli.compress(data, quality=min(level + 2, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def static_data(response: Response, encoding: str) -> bytes:
+    """Compressed content of a static file, compressed only once per version"""
+    path = os.path.join(str(current_app.static_folder), request.view_args["filename"])
+    key, mtime = (path, encoding), os.stat(path).st_mtime_ns
+    with _static_lock:
+        if (item := _static.get(key)) is not None and item[0] == mtime:
+            response.close()
+            return item[1]
+    response.direct_passthrough = False
+    data = encode(response.get_data(), encoding)
+    with _static_lock:
+        _static[key] = (mtime, data)
+    return data
+
+
+def compress(response: Response) -> Response:
+    """Compress HTML, JSON and other text responses with brotli or gzip.
+
+    Only complete (200) responses of at least COMPRESS_MIN_SIZE bytes are
+    compressed, when the browser accepts it. Brotli is used when installed
+    (pip install astrolog[brotli]). Static files are compressed once and kept.
+    """
+    if (
+        response.status_code != 200
+        or response.mimetype not in COMPRESSIBLE
+        or "Content-Encoding" in response.headers
+        or (response.content_length or 0) < current_app.config["COMPRESS_MIN_SIZE"]
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    if (encoding := choose_encoding()) is None:
+        return response
+    if response.direct_passthrough:
+        if request.endpoint != "static":
+            return response
+        data = static_data(response, encoding)
+    else:
+        data = encode(response.get_data(), encoding)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    # Ranges would refer to the uncompressed file
+    response.headers.pop("Accept-Ranges", None)
+    # The compressed body is only equivalent to the original, not identical
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,65 @@
+import time
+from typing import Any
+
+from flask import Blueprint, Flask, g, request
+from flask.wrappers import Response
+
+from astrolog.database import AstroLogDatabase
+from astrolog.metrics import (
+    IN_FLIGHT,
+    QUERIES,
+    QUERY_SECONDS,
+    REGISTRY,
+    REQUEST_SECONDS,
+    REQUESTS,
+)
+
+# Counts and times every request and query, for Prometheus to scrape at /metrics.
+# Requests are labelled by endpoint rather than path, so that the number of
+# series stays bounded whatever the URLs asked for.
+bp = Blueprint("monitoring", __name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def record_query(sql: str, params: Any, duration: float) -> None:
+    QUERIES.inc()
+    QUERY_SECONDS.observe(duration)
+
+
+def before_request() -> None:
+    IN_FLIGHT.inc()
+    g.metrics_in_flight = True
+    g.metrics_start = time.perf_counter()
+
+
+def after_request(response: Response) -> Response:
+    if (start := g.pop("metrics_start", None)) is not None:
+        endpoint = request.endpoint or "none"
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
+
+def teardown_request(error: BaseException | None) -> None:
+    if g.pop("metrics_in_flight", False):
+        IN_FLIGHT.dec()
+
+
+def init_app(app: Flask) -> None:
+    """Collect the metrics of `app`.
+
+    Called before the other after_request functions are registered, as the last
+    registered runs first, so the status and time are those of the final response.
+    """
+    if record_query not in AstroLogDatabase.listeners:
+        AstroLogDatabase.listeners.append(record_query)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.register_blueprint(bp)
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics() -> Response:
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,27 @@
+from typing import Any, Callable
+
+from flask import abort, current_app, request
+
+from astrolog.pagination import Page
+
+
+def get_page(
+    function: Callable[..., Page], *args: Any, prefix: str = "", size: int = 0
+) -> Page:
+    """Call one of the paginated listings of astrolog.api for the request.
+
+    The cursor and page size are taken from the `after`, `before` and `size`
+    arguments of the request, with a `prefix` for pages holding several lists.
+    The size is limited to MAX_PAGE_SIZE, and invalid arguments are a 400.
+    """
+    values = request.args
+    try:
+        size = int(values.get(f"{prefix}size", size or current_app.config["PAGE_SIZE"]))
+        return function(
+            *args,
+            min(max(size, 1), current_app.config["MAX_PAGE_SIZE"]),
+            after=values.get(f"{prefix}after"),
+            before=values.get(f"{prefix}before"),
+        )
+    except ValueError:
+        abort(400)
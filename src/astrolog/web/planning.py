@@ -0,0 +1,372 @@
+import array
+import datetime
+import json
+import math
+import multiprocessing
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+    url_for,
+)
+from werkzeug.datastructures import MultiDict
+
+from astrolog.cache import DiskCache, LRUCache, TieredCache, cache_key
+from astrolog.database import Location
+from astrolog.jobs import Job, JobQueue
+from astrolog.metrics import CACHE, FUNCTION_SECONDS
+
+# astrolog.plots pulls in astropy and astroquery, which is slow. It is only
+# imported by the plot workers, so no other page pays for it. The pages only
+# hold the form, and the browser fetches the data to plot from the /data views,
+# which hand the work to a job and let the browser poll for the result.
+bp = Blueprint("planning", __name__)
+
+_executor: Executor | None = None
+_plot_cache: TieredCache | None = None
+_jobs: JobQueue | None = None
+# Held while they are made, so that concurrent first requests share them.
+# Reentrant, as the jobs are made with the executor.
+_lock = threading.RLock()
+
+
+def get_executor() -> Executor:
+    """Bounded pool of processes rendering plots.
+
+    Workers are spawned, as forking a threaded server is not safe, and are
+    replaced after PLOT_MAX_TASKS_PER_WORKER renders to keep memory flat.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            options: dict[str, Any] = {}
+            if sys.version_info >= (3, 11):
+                options["max_tasks_per_child"] = current_app.config[
+                    "PLOT_MAX_TASKS_PER_WORKER"
+                ]
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config["PLOT_WORKERS"],
+                mp_context=multiprocessing.get_context("spawn"),
+                **options,
+            )
+        return _executor
+
+
+def render(function: str, **parameters: Any) -> Any:
+    """Run one of the functions in astrolog.plots and wait for its result.
+
+    With PLOT_WORKERS set to 0 the plot is rendered in the request thread.
+    """
+    if current_app.config["PLOT_WORKERS"] == 0:
+        result, seconds = _timed_render(function, parameters)
+    else:
+        future = get_executor().submit(_timed_render, function, parameters)
+        result, seconds = future.result()
+    FUNCTION_SECONDS.labels(function).observe(seconds)
+    return result
+
+
+def _render(function: str, parameters: dict[str, Any]) -> Any:
+    from astrolog import plots
+
+    plot: Callable[..., Any] = getattr(plots, function)
+    return plot(**parameters)
+
+
+def _timed_render(function: str, parameters: dict[str, Any]) -> tuple[Any, float]:
+    """Result of `_render` and the seconds it took, as workers keep no metrics"""
+    start = time.perf_counter()
+    result = _render(function, parameters)
+    return result, time.perf_counter() - start
+
+
+def get_plot_cache() -> TieredCache:
+    global _plot_cache
+    with _lock:
+        if _plot_cache is None:
+            config = current_app.config
+            disk = None
+            if directory := config["PLOT_CACHE_DIR"]:
+                disk = DiskCache(directory, max_bytes=config["PLOT_CACHE_MAX_BYTES"])
+            _plot_cache = TieredCache(LRUCache(config["PLOT_CACHE_SIZE"]), disk)
+        return _plot_cache
+
+
+def plot_expiry(valid_until: datetime.date | None) -> float:
+    """Time at which a cached plot should be dropped.
+
+    Plots are kept for at most PLOT_CACHE_TIMEOUT seconds, and not much longer
+    than the date they are made for (`valid_until`), unless that has already
+    passed. Then they are only kept for an hour, enough for a few reloads.
+    """
+    now = time.time()
+    expires = now + current_app.config["PLOT_CACHE_TIMEOUT"]
+    if valid_until is not None:
+        end = datetime.datetime.combine(valid_until, datetime.time()).timestamp()
+        expires = min(expires, max(end, now + 3600))
+    return expires
+
+
+def get_jobs() -> JobQueue:
+    global _jobs
+    with _lock:
+        if _jobs is None:
+            _jobs = JobQueue(get_executor())
+        return _jobs
+
+
+def plan(
+    function: str, valid_until: datetime.date | None, **parameters: Any
+) -> Response:
+    """Plot data from the cache, or else from a job computing it.
+
+    Plots are cached by a hash of their parameters, and computing the same plot
+    twice at the same time only runs one job. Until the job has finished, the
+    response is 202 Accepted and points to where the job can be polled. Plots
+    with names that could not be resolved are not cached, as the failure may be
+    temporary.
+    """
+    key = cache_key(function, parameters)
+    cache = get_plot_cache()
+    if (data := cache.get(key)) is not None:
+        CACHE.labels("plot", "hit").inc()
+        return plot_response(data, [])
+    CACHE.labels("plot", "miss").inc()
+    expires = plot_expiry(valid_until)
+    if current_app.config["PLOT_WORKERS"] == 0:
+        data, missing = render(function, **parameters)
+        if data is not None and not missing:
+            cache.set(key, data, expires)
+        return plot_response(data, missing)
+
+    def on_done(job: Job) -> None:
+        if job.status == "done":
+            (data, missing), seconds = job.result
+            FUNCTION_SECONDS.labels(function).observe(seconds)
+            if data is not None and not missing:
+                cache.set(key, data, expires)
+
+    job = get_jobs().submit(key, _timed_render, function, parameters, on_done=on_done)
+    return job_response(job)
+
+
+def job_response(job: Job) -> Response:
+    match job.status:
+        case "done":
+            result, _ = job.result
+            return plot_response(*result)
+        case "failed":
+            return error_response(500, status=job.status, error=job.error)
+    arguments = {"format": request.args["format"]} if "format" in request.args else {}
+    url = url_for("planning.job", job_id=job.id, **arguments)
+    response = jsonify(id=job.id, status=job.status, url=url)
+    response.status_code = 202
+    response.headers["Location"] = url
+    return response
+
+
+def encode_float32(data: dict[str, Any]) -> bytes:
+    """Binary encoding of plot data, with all arrays as little-endian float32.
+
+    The body starts with the length of a JSON header (uint32). The header holds
+    `data` with its "columns" and "targets" replaced by their names, and the
+    `length` of the arrays. It is padded with spaces to a multiple of 4 bytes
+    and followed by the arrays, columns first, in the order of the header.
+    """
+    columns, targets = data["columns"], data.get("targets", {})
+    arrays = [*columns.values(), *targets.values()]
+    header = {
+        **data,
+        "columns": list(columns),
+        "targets": list(targets),
+        "length": len(arrays[0]) if arrays else 0,
+    }
+    raw = json.dumps(header).encode()
+    raw += b" " * (-len(raw) % 4)
+    values = array.array("f", [value for values in arrays for value in values])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return struct.pack("<I", len(raw)) + raw + values.tobytes()
+
+
+def error_response(status: int, **values: Any) -> Response:
+    response = jsonify(**values)
+    response.status_code = status
+    return response
+
+
+def plot_response(data: dict[str, Any] | None, missing: list[str]) -> Response:
+    # Nothing to plot is final too: a 404 with the names that were not found
+    if data is None:
+        return error_response(404, missing=missing)
+    if request.args.get("format") == "float32":
+        return Response(
+            encode_float32({**data, "missing": missing}),
+            mimetype="application/octet-stream",
+        )
+    return jsonify(**data, missing=missing)
+
+
+def get_coordinate(value: str) -> float:
+    try:
+        return Location.coordinate_to_decimal(value)
+    except IndexError:
+        raise ValueError(f"{value!r} is not a coordinate (d:m:s)") from None
+
+
+def get_float(values: MultiDict[str, str], name: str, default: float) -> float:
+    value = float(values.get(name, default))
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+def get_location(values: MultiDict[str, str]) -> dict[str, Any]:
+    """The location to plan for, raising ValueError if it is invalid.
+
+    Location.DoesNotExist is raised for an unknown location id.
+    """
+    latitude, longitude = values.get("latitude"), values.get("longitude")
+    if latitude and longitude:
+        # Use custom location, so use custom UTC offset
+        return dict(
+            latitude=get_coordinate(latitude),
+            longitude=get_coordinate(longitude),
+            altitude=int(values.get("altitude", 0) or 0),
+            utcoffset=int(values.get("utcoffset", 0) or 0),
+        )
+    if not values.get("location"):
+        raise ValueError("Either a location or a latitude and longitude are needed")
+    location = Location.get_by_id(int(values["location"]))
+    return dict(
+        latitude=Location.coordinate_to_decimal(str(location.latitude)),
+        longitude=Location.coordinate_to_decimal(str(location.longitude)),
+        altitude=location.altitude,
+        utcoffset=location.utcoffset,
+    )
+
+
+def get_names(values: MultiDict[str, str]) -> list[str]:
+    names = [name.strip() for name in values.get("name", "").split(",")]
+    return [name for name in names if name]
+
+
+def plan_url(endpoint: str, values: MultiDict[str, str]) -> str:
+    return url_for(endpoint, **{key: value for key, value in values.items() if value})
+
+
+@bp.route("/visibility", methods=["GET", "POST"])
+def visibility() -> str:
+    values = request.values
+    if values.get("name") is not None:
+        return render_template(
+            "visibility_curve.html",
+            locations=Location,
+            data_url=plan_url("planning.visibility_data", values),
+            is_year=values.get("year") is not None,
+            latitude=values.get("latitude"),
+            longitude=values.get("longitude"),
+            utcoffset=values.get("utcoffset"),
+            altitude=values.get("altitude"),
+            date=values.get("date"),
+            name=values.get("name"),
+        )
+    today = datetime.datetime.today().date()
+    return render_template(
+        "visibility_curve.html",
+        locations=Location,
+        date=today,
+        data_url=None,
+        name=None,
+        latitude=None,
+        longitude=None,
+        utcoffset=None,
+        altitude=None,
+        is_year=None,
+    )
+
+
+@bp.route("/visibility/data", methods=["GET"])
+def visibility_data() -> Response:
+    try:
+        location = get_location(request.args)
+        if not request.args.get("year"):
+            date = datetime.date.fromisoformat(request.args.get("date", ""))
+    except Location.DoesNotExist:
+        location_id = request.args["location"]
+        return error_response(404, error=f"Location {location_id} was not found")
+    except ValueError as error:
+        return error_response(400, error=str(error))
+    if request.args.get("year"):
+        year = datetime.date.today().year
+        return plan(
+            "visibility_plot_year",
+            valid_until=datetime.date(year + 1, 1, 1),
+            latitude=location["latitude"],
+            longitude=location["longitude"],
+            altitude=location["altitude"],
+            year=year,
+            names=get_names(request.args),
+        )
+    else:
+        return plan(
+            "visibility_plot",
+            # The night continues into the next day, in any time zone
+            valid_until=date + datetime.timedelta(days=2),
+            **location,
+            date=date.isoformat(),
+            names=get_names(request.args),
+        )
+
+
+@bp.route("/finding-chart", methods=["GET", "POST"])
+def finding_chart() -> str:
+    values = request.values
+    if values.get("name") is not None:
+        return render_template(
+            "finding_chart.html",
+            radius=values.get("radius"),
+            threshold=values.get("threshold"),
+            name=values.get("name"),
+            data_url=plan_url("planning.finding_chart_data", values),
+        )
+    return render_template(
+        "finding_chart.html", radius=0.5, threshold=8, data_url=None, name=None
+    )
+
+
+@bp.route("/finding-chart/data", methods=["GET"])
+def finding_chart_data() -> Response:
+    try:
+        radius = get_float(request.args, "radius", 1)
+        threshold = get_float(request.args, "threshold", 10)
+        if radius <= 0:
+            raise ValueError("radius must be positive")
+    except ValueError as error:
+        return error_response(400, error=str(error))
+    return plan(
+        "finding_chart_plot",
+        valid_until=None,
+        name=request.args.get("name", "").strip(),
+        radius=radius,
+        threshold=threshold,
+    )
+
+
+@bp.route("/planning/jobs/<job_id>", methods=["GET"])
+def job(job_id: str) -> Response:
+    # Asking for a job does not start the workers, which only a plot does
+    if _jobs is None or (job := _jobs.get(job_id)) is None:
+        # Kept by another process, or dropped since: the plot must be asked again
+        return error_response(410, error=f"Job {job_id} is not kept here")
+    return job_response(job)
@@ -0,0 +1,144 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from flask import (
+    Blueprint,
+    Flask,
+    abort,
+    current_app,
+    g,
+    has_request_context,
+    render_template,
+    request,
+    template_rendered,
+)
+from flask.signals import before_render_template
+from flask.wrappers import Response
+
+from astrolog.database import AstroLogDatabase
+
+# Every request counts its queries and the time spent running them and rendering
+# templates, and reports them in the Server-Timing header. In debug mode, the
+# last requests can be inspected at /debug/profile, and a request made with
+# ?profile=1 is run under cProfile as well.
+bp = Blueprint("profiling", __name__)
+
+_profiles: deque["RequestProfile"] = deque()
+_lock = threading.Lock()
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    endpoint: str | None
+    started: float = field(default_factory=time.time)
+    queries: int = 0
+    sql_time: float = 0
+    # The slowest statements as (seconds, SQL), slowest first
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    template_time: float = 0
+    total_time: float = 0
+    status: int = 0
+    stats: str | None = None
+
+    def add_query(self, sql: str, duration: float) -> None:
+        self.queries += 1
+        self.sql_time += duration
+        keep = current_app.config["PROFILE_SLOWEST"]
+        if len(self.slowest) < keep or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, sql))
+            self.slowest.sort(reverse=True)
+            del self.slowest[keep:]
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            [
+                f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_time * 1000:.1f}",
+                f"total;dur={self.total_time * 1000:.1f}",
+            ]
+        )
+
+
+def current_profile() -> RequestProfile | None:
+    if not has_request_context():
+        return None
+    return g.get("profile")
+
+
+def record_query(sql: str, params: Any, duration: float) -> None:
+    if (profile := current_profile()) is not None:
+        profile.add_query(sql, duration)
+
+
+def start_template(*args: Any, **kwargs: Any) -> None:
+    if current_profile() is not None:
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+
+def end_template(*args: Any, **kwargs: Any) -> None:
+    profile = current_profile()
+    if profile is not None and (starts := g.get("template_starts")):
+        duration = time.perf_counter() - starts.pop()
+        # Templates rendered while rendering another are counted once
+        if not starts:
+            profile.template_time += duration
+
+
+def profiling_allowed() -> bool:
+    return current_app.debug or current_app.config["DEBUG_PROFILE"]
+
+
+def before_request() -> None:
+    g.profile = RequestProfile(request.method, request.full_path, request.endpoint)
+    g.profile_start = time.perf_counter()
+    if request.args.get("profile") == "1" and profiling_allowed():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def after_request(response: Response) -> Response:
+    if (profile := current_profile()) is None:
+        return response
+    if (profiler := g.pop("profiler", None)) is not None:
+        profiler.disable()
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(40)
+        profile.stats = output.getvalue()
+    profile.total_time = time.perf_counter() - g.profile_start
+    profile.status = response.status_code
+    response.headers["Server-Timing"] = profile.server_timing()
+    if profiling_allowed() and request.blueprint != bp.name:
+        with _lock:
+            _profiles.appendleft(profile)
+            while len(_profiles) > current_app.config["PROFILE_HISTORY"]:
+                _profiles.pop()
+    return response
+
+
+def init_app(app: Flask) -> None:
+    """Profile every request of `app`, using the queries of AstroLogDatabase"""
+    if record_query not in AstroLogDatabase.listeners:
+        AstroLogDatabase.listeners.append(record_query)
+    before_render_template.connect(start_template, app)
+    template_rendered.connect(end_template, app)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.register_blueprint(bp)
+
+
+@bp.route("/debug/profile", methods=["GET"])
+def profiles() -> str:
+    if not profiling_allowed():
+        abort(404)
+    with _lock:
+        recent = list(_profiles)
+    return render_template("debug_profile.html", profiles=recent)
@@ -0,0 +1,166 @@
+import datetime
+import logging
+import logging.handlers
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from flask import (
+    Blueprint,
+    Flask,
+    abort,
+    current_app,
+    has_request_context,
+    render_template,
+    request,
+)
+from peewee import SqliteDatabase
+
+from astrolog.database import AstroLogDatabase, database_proxy
+from astrolog.web.profiling import profiling_allowed
+
+# Statements slower than SLOW_QUERY_THRESHOLD seconds are logged with their
+# parameters, where they were run from and how SQLite runs them, to the rotating
+# file SLOW_QUERY_LOG and, in debug mode, to the page /debug/slow-queries.
+bp = Blueprint("slow_queries", __name__)
+
+logger = logging.getLogger("astrolog.slow_queries")
+
+# Only statements reading or writing rows have a query plan
+EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@dataclass
+class SlowQuery:
+    sql: str
+    params: Any
+    duration: float
+    # The endpoint of the request, and the function of this package that ran it
+    endpoint: str | None
+    caller: str | None
+    plan: list[str]
+    time: float = field(default_factory=time.time)
+
+    @property
+    def when(self) -> str:
+        return datetime.datetime.fromtimestamp(self.time).strftime("%Y-%m-%d %H:%M:%S")
+
+    def format(self) -> str:
+        lines = [
+            f"{self.duration * 1000:.1f}ms endpoint={self.endpoint} caller={self.caller}",
+            f"  {self.sql}",
+            f"  params={self.params!r}",
+            *(f"  plan: {step}" for step in self.plan),
+        ]
+        return "\n".join(lines)
+
+
+def find_caller() -> str | None:
+    """The innermost function running a query, outside of peewee and this module"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        # Templates have no module name, but their file is as telling
+        module = frame.f_globals.get("__name__") or code.co_filename
+        if module not in ("peewee", __name__) and code.co_name != "execute_sql":
+            return f"{module}.{code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+def query_plan(database: SqliteDatabase, sql: str, params: Any) -> list[str]:
+    """The steps of EXPLAIN QUERY PLAN, run without telling the listeners"""
+    if not sql.lstrip().upper().startswith(EXPLAINED):
+        return []
+    try:
+        cursor = database.connection().execute(
+            f"EXPLAIN QUERY PLAN {sql}", params or ()
+        )
+        return [row[-1] for row in cursor.fetchall()]
+    except sqlite3.Error as error:
+        return [f"not available: {error}"]
+
+
+class SlowQueryLog:
+    """Listener of AstroLogDatabase keeping the statements slower than `threshold`.
+
+    The last `history` slow statements are kept in memory, and every one is
+    logged, to a file rotated at `max_bytes` when `path` is given.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        path: str | None = None,
+        max_bytes: int = 10 * 1024**2,
+        backups: int = 5,
+        history: int = 100,
+    ) -> None:
+        self.threshold = threshold
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queries: deque[SlowQuery] = deque(maxlen=history)
+        self._handler: logging.Handler | None = None
+        self._lock = threading.Lock()
+
+    def __call__(self, sql: str, params: Any, duration: float) -> None:
+        if duration < self.threshold:
+            return
+        endpoint = request.endpoint if has_request_context() else None
+        database = database_proxy.obj
+        plan = query_plan(database, sql, params) if database is not None else []
+        query = SlowQuery(sql, params, duration, endpoint, find_caller(), plan)
+        with self._lock:
+            self.queries.appendleft(query)
+            if self.path is not None and self._handler is None:
+                # Only create the file once there is something to write
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._handler = logging.handlers.RotatingFileHandler(
+                    self.path, maxBytes=self.max_bytes, backupCount=self.backups
+                )
+                self._handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(self._handler)
+        logger.warning("Slow query: %s", query.format())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handler is not None:
+                logger.removeHandler(self._handler)
+                self._handler.close()
+                self._handler = None
+
+
+def init_app(app: Flask) -> SlowQueryLog | None:
+    """Log the slow queries of `app`, unless SLOW_QUERY_THRESHOLD is None"""
+    config = app.config
+    if config["SLOW_QUERY_THRESHOLD"] is None:
+        return None
+    slow_queries = SlowQueryLog(
+        config["SLOW_QUERY_THRESHOLD"],
+        config["SLOW_QUERY_LOG"],
+        max_bytes=config["SLOW_QUERY_LOG_MAX_BYTES"],
+        backups=config["SLOW_QUERY_LOG_BACKUPS"],
+        history=config["SLOW_QUERY_HISTORY"],
+    )
+    AstroLogDatabase.listeners.append(slow_queries)
+    app.extensions["slow_queries"] = slow_queries
+    app.register_blueprint(bp)
+    return slow_queries
+
+
+@bp.route("/debug/slow-queries", methods=["GET"])
+def queries() -> str:
+    if not profiling_allowed():
+        abort(404)
+    slow_queries: SlowQueryLog = current_app.extensions["slow_queries"]
+    return render_template(
+        "debug_slow_queries.html",
+        threshold=slow_queries.threshold,
+        queries=list(slow_queries.queries),
+    )
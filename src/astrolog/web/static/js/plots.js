@@ -0,0 +1,208 @@
+// Draws the plots of the planning pages as SVG, from the data returned by the
+// /visibility/data and /finding-chart/data views (astrolog/web/planning.py).
+// Elements with the class "plot" are drawn once the page is loaded, based on
+// their data-url and data-kind attributes.
+
+const SVG = "http://www.w3.org/2000/svg";
+const COLOURS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#17becf"];
+const PLASMA = ["#0d0887", "#7e03a8", "#cc4778", "#f89540", "#f0f921"];
+
+function svgElement(name, attributes, parent) {
+  const element = document.createElementNS(SVG, name);
+  for (const [key, value] of Object.entries(attributes)) {
+    element.setAttribute(key, value);
+  }
+  if (parent !== undefined) {
+    parent.appendChild(element);
+  }
+  return element;
+}
+
+function range(lim, n) {
+  const step = (lim[1] - lim[0]) / n;
+  return Array.from({length: n + 1}, (_, i) => lim[0] + i * step);
+}
+
+function chart(container, {width, height, xlim, ylim, xticks, yticks, xlabel, ylabel}) {
+  const margin = {left: 60, right: 20, top: 20, bottom: 50};
+  const svg = svgElement("svg", {viewBox: `0 0 ${width} ${height}`, width: width, height: height});
+  const x = value => margin.left + (value - xlim[0]) / (xlim[1] - xlim[0]) * (width - margin.left - margin.right);
+  const y = value => height - margin.bottom - (value - ylim[0]) / (ylim[1] - ylim[0]) * (height - margin.top - margin.bottom);
+  const plotArea = svgElement("g", {}, svg);
+  const axes = svgElement("g", {"font-size": 12, fill: "black"}, svg);
+
+  for (const tick of xticks) {
+    svgElement("line", {x1: x(tick), x2: x(tick), y1: y(ylim[0]), y2: y(ylim[1]), stroke: "#ccc"}, axes);
+    svgElement("text", {x: x(tick), y: y(ylim[0]) + 16, "text-anchor": "middle"}, axes).textContent = +tick.toFixed(2);
+  }
+  for (const tick of yticks) {
+    svgElement("line", {x1: x(xlim[0]), x2: x(xlim[1]), y1: y(tick), y2: y(tick), stroke: "#ccc"}, axes);
+    svgElement("text", {x: x(xlim[0]) - 6, y: y(tick) + 4, "text-anchor": "end"}, axes).textContent = +tick.toFixed(2);
+  }
+  svgElement("rect", {
+    x: x(xlim[0]), y: y(ylim[1]), width: x(xlim[1]) - x(xlim[0]), height: y(ylim[0]) - y(ylim[1]),
+    fill: "none", stroke: "black",
+  }, axes);
+  svgElement("text", {x: (x(xlim[0]) + x(xlim[1])) / 2, y: height - 10, "text-anchor": "middle"}, axes).textContent = xlabel;
+  svgElement("text", {
+    x: 0, y: 0, "text-anchor": "middle", transform: `translate(16, ${(y(ylim[0]) + y(ylim[1])) / 2}) rotate(-90)`,
+  }, axes).textContent = ylabel;
+
+  const clip = `clip-${Math.random().toString(36).slice(2)}`;
+  const clipPath = svgElement("clipPath", {id: clip}, svg);
+  svgElement("rect", {x: x(xlim[0]), y: y(ylim[1]), width: x(xlim[1]) - x(xlim[0]), height: y(ylim[0]) - y(ylim[1])}, clipPath);
+  plotArea.setAttribute("clip-path", `url(#${clip})`);
+  container.replaceChildren(svg);
+
+  let legendRow = 0;
+  return {
+    line(xs, ys, {colour, width = 2, dash = "", label}) {
+      const points = xs.map((value, i) => `${x(value)},${y(ys[i])}`).join(" ");
+      svgElement("polyline", {points: points, fill: "none", stroke: colour, "stroke-width": width, "stroke-dasharray": dash}, plotArea);
+      if (label !== undefined) {
+        const top = y(ylim[1]) + 10 + 18 * legendRow++;
+        svgElement("line", {x1: x(xlim[0]) + 10, x2: x(xlim[0]) + 30, y1: top, y2: top, stroke: colour, "stroke-width": width, "stroke-dasharray": dash}, axes);
+        svgElement("text", {x: x(xlim[0]) + 36, y: top + 4}, axes).textContent = label;
+      }
+    },
+    shade(xs, mask, colour) {
+      // Fill the full height of the plot wherever mask is true
+      const step = xs.length > 1 ? (xs[1] - xs[0]) / 2 : 0;
+      xs.forEach((value, i) => {
+        if (mask[i]) {
+          svgElement("rect", {
+            x: x(value - step), y: y(ylim[1]), width: x(value + step) - x(value - step) + 0.5,
+            height: y(ylim[0]) - y(ylim[1]), fill: colour,
+          }, plotArea);
+        }
+      });
+    },
+    dot(xValue, yValue, {radius, colour}) {
+      svgElement("circle", {cx: x(xValue), cy: y(yValue), r: radius, fill: colour}, plotArea);
+    },
+    marker(xValue, yValue, {symbol, size, colour}) {
+      svgElement("text", {
+        x: x(xValue), y: y(yValue) + size / 3, "font-size": size, fill: colour, "text-anchor": "middle",
+      }, plotArea).textContent = symbol;
+    },
+  };
+}
+
+function plasma(fraction) {
+  const position = Math.min(Math.max(fraction, 0), 1) * (PLASMA.length - 1);
+  return PLASMA[Math.round(position)];
+}
+
+function limits(values, padding) {
+  const min = Math.min(...values), max = Math.max(...values);
+  const pad = (max - min) * padding || 0.01;
+  return [min - pad, max + pad];
+}
+
+function drawVisibility(container, data) {
+  const hours = data.columns.hours;
+  const plot = chart(container, {
+    width: 640, height: 480, xlim: [-12, 12], ylim: [0, 90],
+    xticks: range([-12, 12], 12), yticks: range([0, 90], 9),
+    xlabel: "Hours from midnight", ylabel: "Altitude [deg]",
+  });
+  plot.shade(hours, data.columns.sun.map(alt => alt < 0), "#808080");
+  plot.shade(hours, data.columns.sun.map(alt => alt < -18), "black");
+  plot.line(hours, data.columns.sun, {colour: "#bfbf00", dash: "6 4", label: "Sun"});
+  plot.line(hours, data.columns.moon, {colour: "red", dash: "6 4", label: "Moon"});
+  Object.entries(data.targets).forEach(([name, alt], i) => {
+    plot.line(hours, alt, {colour: COLOURS[i % COLOURS.length], width: 5, label: name});
+  });
+}
+
+function drawVisibilityYear(container, data) {
+  const days = data.columns.day;
+  const plot = chart(container, {
+    width: 1200, height: 600, xlim: [0, 366], ylim: [0, 90],
+    xticks: range([0, 360], 12), yticks: range([0, 90], 9),
+    xlabel: `Day of year (${data.year})`, ylabel: "Altitude [deg]",
+  });
+  Object.entries(data.targets).forEach(([name, alt], i) => {
+    plot.line(days, alt, {colour: COLOURS[i % COLOURS.length], width: 5, label: name});
+  });
+}
+
+function drawFindingChart(container, data) {
+  const {ra, dec, mag} = data.columns;
+  const xlim = limits([...ra, data.target.ra], 0.05);
+  const ylim = limits([...dec, data.target.dec], 0.05);
+  const plot = chart(container, {
+    width: 640, height: 480, xlim: xlim, ylim: ylim,
+    xticks: range(xlim, 5), yticks: range(ylim, 5), xlabel: "RA", ylabel: "DEC",
+  });
+  const [faintest, brightest] = [Math.max(...mag), Math.min(...mag)];
+  ra.forEach((value, i) => {
+    plot.dot(value, dec[i], {
+      radius: Math.sqrt(Math.abs(mag[i] - data.threshold) * 10) / 1.5,
+      colour: plasma((mag[i] - brightest) / (faintest - brightest || 1)),
+    });
+  });
+  plot.marker(data.target.ra, data.target.dec, {symbol: "★", size: 28, colour: "#2ca02c"});
+}
+
+function showError(message) {
+  const alert = document.createElement("div");
+  alert.className = "alert alert-danger";
+  alert.textContent = message;
+  document.getElementById("flash_messages").appendChild(alert);
+}
+
+function showMissing(names) {
+  for (const name of names || []) {
+    showError(`Could not find object: ${name}`);
+  }
+}
+
+async function fetchPlotData(url) {
+  // Plots that are not cached are computed by a job, which is polled until done
+  let response = await fetch(url);
+  while (response.status === 202) {
+    const job = await response.json();
+    await new Promise(resolve => setTimeout(resolve, 500));
+    response = await fetch(job.url);
+    if (response.status === 410) {
+      // The job is kept by another server process, or gone, so ask again
+      response = await fetch(url);
+    }
+  }
+  return response;
+}
+
+async function loadPlot(container) {
+  let response, data;
+  try {
+    response = await fetchPlotData(container.dataset.url);
+    // Errors from the server or a proxy need not be JSON
+    data = response.headers.get("Content-Type") === "application/json" ? await response.json() : {};
+  } catch (error) {
+    response = {ok: false};
+    data = {error: `Could not load the plot: ${error.message}`};
+  }
+  showMissing(data.missing);
+  if (!response.ok) {
+    if (data.missing === undefined) {
+      showError(data.error || `Could not load the plot (${response.status})`);
+    }
+    container.textContent = "No plot";
+    return;
+  }
+  switch (container.dataset.kind) {
+    case "visibility":
+      data.year === undefined ? drawVisibility(container, data) : drawVisibilityYear(container, data);
+      break;
+    case "finding-chart":
+      drawFindingChart(container, data);
+      break;
+  }
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  for (const container of document.getElementsByClassName("plot")) {
+    loadPlot(container);
+  }
+});
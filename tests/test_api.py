@@ -13,6 +13,7 @@ from astrolog.database import (
     EyePiece,
     Filter,
     FrontFilter,
+    Image,
     Location,
     Object,
     Observation,
@@ -190,6 +191,23 @@ class TestAPI(TestCase):
         with self.assertRaises(ValueError):
             api.create_observation(session, betelgeuse, telescope=telescope)
 
+    def test_get_gallery_shared_image(self) -> None:
+        session = get_and_create_session_with_n_observations(
+            datetime.date(2013, 12, 1), n=3
+        )
+        shared, single = Image.create(fname="shared.png"), Image.create(fname="b.png")
+        for observation, image in zip(
+            session.observation_set, (shared, shared, single)
+        ):
+            observation.image = image
+            observation.save()
+        pages = [api.get_gallery(1)]
+        while pages[-1].next is not None:
+            pages.append(api.get_gallery(1, after=pages[-1].next))
+        self.assertEqual([o.id for page in pages for o in page.items], [3, 2, 1])
+        back = api.get_gallery(1, before=pages[2].prev)
+        self.assertEqual([o.id for o in back.items], [2])
+
     def test_delete_location_without_session(self) -> None:
         location = Location.create(
             name="Horsens",
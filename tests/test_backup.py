@@ -0,0 +1,151 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+from astrolog import backup
+from astrolog.backup import (
+    BackupScheduler,
+    create_snapshot,
+    restore_snapshot,
+    rotate,
+    snapshots,
+    verify_snapshot,
+)
+
+
+class TestBackup(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, "AstroLog.db")
+        self.uploads = os.path.join(self.tmp.name, "uploads")
+        self.backups = os.path.join(self.tmp.name, "backups")
+        with sqlite3.connect(self.database) as connection:
+            connection.execute("CREATE TABLE note (id INTEGER PRIMARY KEY, text TEXT)")
+            connection.executemany(
+                "INSERT INTO note (text) VALUES (?)", [("x" * 500,)] * 200
+            )
+        connection.close()
+        self.write_upload("ab/first.png", b"first")
+        self.write_upload("second.png", b"second")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write_upload(self, name: str, content: bytes) -> None:
+        path = os.path.join(self.uploads, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def notes(self, database: str) -> int:
+        connection = sqlite3.connect(database)
+        try:
+            return connection.execute("SELECT count(*) FROM note").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_incremental(self) -> None:
+        with mock.patch.object(
+            backup.shutil, "copyfile", wraps=shutil.copyfile
+        ) as copyfile:
+            first = create_snapshot(self.backups, self.database, self.uploads, pages=4)
+            self.assertEqual(copyfile.call_count, 2)
+            self.write_upload("third.png", b"third")
+            self.write_upload("copy.png", b"first")
+            second = create_snapshot(self.backups, self.database, self.uploads)
+            self.assertEqual(copyfile.call_count, 3)
+        self.assertEqual(set(first.uploads), {"ab/first.png", "second.png"})
+        self.assertEqual(len(second.uploads), 4)
+        self.assertEqual(snapshots(self.backups), [first, second])
+        self.assertEqual(verify_snapshot(first.path), [])
+        self.assertEqual(self.notes(os.path.join(second.path, "AstroLog.db")), 200)
+
+    def backup_while_writing(self, pause: float) -> None:
+        stop = threading.Event()
+        writes = 0
+
+        def write() -> None:
+            nonlocal writes
+            connection = sqlite3.connect(self.database, timeout=10)
+            while not stop.is_set():
+                with connection:
+                    connection.execute("INSERT INTO note (text) VALUES ('y')")
+                writes += 1
+                time.sleep(pause)
+            connection.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            while not writes:
+                time.sleep(0.001)
+            snapshot = create_snapshot(
+                self.backups, self.database, self.uploads, pages=2, pause=0.002
+            )
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(verify_snapshot(snapshot.path), [])
+        copied = self.notes(os.path.join(snapshot.path, "AstroLog.db"))
+        self.assertGreater(copied, 200)
+        self.assertLessEqual(copied, self.notes(self.database))
+
+    def test_backup_while_writing(self) -> None:
+        self.backup_while_writing(pause=0.05)
+
+    def test_backup_while_writing_wal(self) -> None:
+        connection = sqlite3.connect(self.database)
+        connection.execute("PRAGMA journal_mode=wal")
+        connection.close()
+        # Writers are never held up, and do not restart the copy
+        self.backup_while_writing(pause=0)
+
+    def test_restore(self) -> None:
+        snapshot = create_snapshot(self.backups, self.database, self.uploads)
+        os.remove(self.database)
+        shutil.rmtree(self.uploads)
+        restore_snapshot(snapshot.path, self.database, self.uploads)
+        self.assertEqual(self.notes(self.database), 200)
+        with open(os.path.join(self.uploads, "ab", "first.png"), "rb") as f:
+            self.assertEqual(f.read(), b"first")
+
+    def test_restore_damaged(self) -> None:
+        snapshot = create_snapshot(self.backups, self.database, self.uploads)
+        sha256 = snapshot.uploads["second.png"]["sha256"]
+        with open(backup.object_path(self.backups, sha256), "wb") as f:
+            f.write(b"changed")
+        self.assertEqual(
+            verify_snapshot(snapshot.path),
+            [f"The upload {sha256} does not match its hash"],
+        )
+        with self.assertRaises(ValueError):
+            restore_snapshot(snapshot.path, self.database, self.uploads)
+
+    def test_rotate(self) -> None:
+        first = create_snapshot(self.backups, self.database, self.uploads)
+        os.remove(os.path.join(self.uploads, "second.png"))
+        second = create_snapshot(self.backups, self.database, self.uploads)
+        self.assertEqual(rotate(self.backups, keep=1), [first.path])
+        self.assertEqual(snapshots(self.backups), [second])
+        self.assertEqual(verify_snapshot(second.path), [])
+        objects = [n for _, _, names in os.walk(self.backups) for n in names]
+        self.assertEqual(len([n for n in objects if len(n) == 64]), 1)
+
+    def test_scheduler(self) -> None:
+        scheduler = BackupScheduler(
+            self.backups, 60, keep=2, database=self.database, uploads=self.uploads
+        )
+        self.assertEqual(scheduler.delay(), 0)
+        scheduler.start()
+        for _ in range(100):
+            if snapshots(self.backups):
+                break
+            time.sleep(0.05)
+        scheduler.stop()
+        scheduler.join()
+        self.assertEqual(len(snapshots(self.backups)), 1)
+        self.assertGreater(scheduler.delay(), 50)
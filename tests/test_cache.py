@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from astrolog.cache import DiskCache, LRUCache, TieredCache, cache_key
+
+
+class TestCache(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_cache_key(self) -> None:
+        self.assertEqual(
+            cache_key("plot", {"a": 1, "b": [1, 2]}),
+            cache_key("plot", {"b": [1, 2], "a": 1}),
+        )
+        self.assertNotEqual(cache_key("plot", {"a": 1}), cache_key("plot", {"a": 2}))
+
+    def test_lru_cache(self) -> None:
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        # "b" was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        cache.set("d", 4, expires=time.time() - 1)
+        self.assertIsNone(cache.get("d"))
+
+    def test_disk_cache(self) -> None:
+        cache = DiskCache(self.tmp.name, max_bytes=1000)
+        cache.set("a", {"html": "a" * 400})
+        self.assertEqual(cache.get("a"), {"html": "a" * 400})
+        self.assertIsNone(cache.get("missing"))
+        cache.set("expired", "value", expires=time.time() - 1)
+        self.assertIsNone(cache.get("expired"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "expired.json")))
+
+        # Going over the size limit removes the least recently used files
+        os.utime(os.path.join(self.tmp.name, "a.json"), (0, 0))
+        cache.set("b", "b" * 400)
+        cache.set("c", "c" * 400)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "b" * 400)
+        self.assertEqual(cache.get("c"), "c" * 400)
+
+    def test_tiered_cache(self) -> None:
+        disk = DiskCache(self.tmp.name)
+        cache = TieredCache(LRUCache(), disk)
+        expires = time.time() + 60
+        cache.set("a", "value", expires)
+        self.assertEqual(disk.get("a"), "value")
+
+        # A new process only has the disk tier
+        cache = TieredCache(LRUCache(), disk)
+        self.assertEqual(cache.get("a"), "value")
+        self.assertEqual(cache.memory._items["a"], (expires, "value"))
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(disk.get("a"))
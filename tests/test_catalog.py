@@ -0,0 +1,49 @@
+from unittest import TestCase, mock
+
+from peewee import SqliteDatabase
+
+from astrolog.catalog import EquipmentCatalog
+from astrolog.database import MODELS, EyePiece, Telescope, database_proxy
+
+db = SqliteDatabase(":memory:")
+
+
+class TestCatalog(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.telescope = Telescope.create(
+            name="Dobson", aperture=200, focal_length=1200
+        )
+        self.catalog = EquipmentCatalog()
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+
+    def test_current(self) -> None:
+        equipment = self.catalog.current()
+        self.assertEqual(equipment.all(Telescope), [self.telescope])
+        self.assertEqual(equipment.all(EyePiece), [])
+        # Unchanged equipment is not loaded again
+        with mock.patch.object(Telescope, "select", side_effect=AssertionError):
+            self.assertIs(self.catalog.current(), equipment)
+
+        telescope = equipment.get(Telescope, str(self.telescope.id))
+        self.assertEqual(telescope, self.telescope)
+        assert telescope is not None
+        telescope.use_eyepiece(EyePiece(type="Plössl", focal_length=10, width=1.25))
+        self.assertEqual(telescope.magnification, 120)
+        self.assertIsNone(equipment.get(Telescope, self.telescope.id).magnification)
+        for id in (None, "", "x", 1000):
+            with self.subTest(id=id):
+                self.assertIsNone(equipment.get(Telescope, id))
+
+    def test_changes(self) -> None:
+        equipment = self.catalog.current()
+        # Also changes made elsewhere, e.g. in another process
+        EyePiece.create(type="Plössl", focal_length=10, width=1.25)
+        self.assertEqual(len(self.catalog.current().all(EyePiece)), 1)
+
+        equipment = self.catalog.current()
+        self.catalog.invalidate()
+        self.assertIsNot(self.catalog.current(), equipment)
@@ -10,7 +10,9 @@ from astrolog.database import (
     Barlow,
     Binocular,
     Camera,
+    ChangeEvent,
     Condition,
+    DataVersion,
     EyePiece,
     Filter,
     FrontFilter,
@@ -196,6 +198,7 @@ class TestDB(TestCase):
         )
         self.assertEqual(telescope.barlow, barlow)
         self.assertEqual(telescope.magnification, magnification2)
+        self.assertEqual(telescope.fov, round(plossl.afov / magnification2, 2))
         # Change eyepiece
         kellner = get_eyepiece(type="Kellner", focal_length=15, width=1.25)
         magnification3 = (
@@ -532,3 +535,48 @@ class TestDB(TestCase):
         )
         earth_location = horsens.earth_location
         self.assertIsInstance(earth_location, EarthLocation)
+
+    def test_data_version(self) -> None:
+        versions = DataVersion.of(Object, Session)
+        self.assertEqual(versions.keys(), {"object", "session"})
+        self.assertEqual(versions["object"][0], 0)
+
+        m42 = Object.create(name="M42")
+        m42.toggle_favourite()
+        Object.delete().where(Object.id == m42.id).execute()
+        self.assertEqual(DataVersion.of(Object)["object"][0], 3)
+        self.assertEqual(DataVersion.of(Session)["session"][0], 0)
+        self.assertGreaterEqual(
+            DataVersion.of(Object)["object"][1], versions["object"][1]
+        )
+
+        # Creating the tables again keeps the versions
+        db.create_tables(MODELS)
+        self.assertEqual(DataVersion.of(Object)["object"][0], 3)
+
+    def test_change_events(self) -> None:
+        self.assertEqual(ChangeEvent.latest(), 0)
+        m42 = Object.create(name="M42")
+        m42.toggle_favourite()
+        Kind.create(name="Nebula")
+        Object.delete().where(Object.id == m42.id).execute()
+        changes = [(c.name, c.row_id, c.action) for c in ChangeEvent.since(0)]
+        self.assertEqual(
+            changes,
+            [
+                ("object", m42.id, "INSERT"),
+                ("object", m42.id, "UPDATE"),
+                ("kind", 1, "INSERT"),
+                ("object", m42.id, "DELETE"),
+            ],
+        )
+        self.assertEqual(ChangeEvent.latest(), 4)
+        self.assertEqual([c.id for c in ChangeEvent.since(2, limit=1)], [3])
+
+        # Writes rolled back leave no change behind
+        with database_proxy.atomic() as transaction:
+            Object.create(name="M1")
+            transaction.rollback()
+        self.assertEqual(ChangeEvent.since(4), [])
+        Object.create(name="M1")
+        self.assertEqual([c.id for c in ChangeEvent.since(4)], [5])
@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+from PIL import Image as PILImage
+
+from astrolog import images
+from astrolog.database import MODELS, Image, database_proxy
+
+db = SqliteDatabase(":memory:")
+
+
+class TestImages(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.tmp = tempfile.TemporaryDirectory()
+        shutil.copy("resources/test/M42.png", self.tmp.name)
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+        self.tmp.cleanup()
+
+    def test_store_upload(self) -> None:
+        with open("resources/test/M42.png", "rb") as f:
+            content = f.read()
+        sha256 = hashlib.sha256(content).hexdigest()
+        uploads = os.path.join(self.tmp.name, "uploads")
+
+        image, created = images.store_upload(io.BytesIO(content), "PNG", uploads)
+        self.assertTrue(created)
+        self.assertEqual(image.sha256, sha256)
+        self.assertEqual(image.fname, os.path.join(sha256[:2], f"{sha256}.png"))
+        self.assertEqual(image.image_loc, f"/static/uploads/{sha256[:2]}/{sha256}.png")
+        self.assertTrue(images.verify(image, uploads))
+
+        # The same content is stored once, whatever the name
+        path = os.path.join(uploads, str(image.fname))
+        mtime = os.stat(path).st_mtime_ns
+        again, created = images.store_upload(io.BytesIO(content), "jpg", uploads)
+        self.assertFalse(created)
+        self.assertEqual(again, image)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        self.assertEqual(Image.select().count(), 1)
+        # No temporary files are left behind
+        self.assertEqual(os.listdir(uploads), [sha256[:2]])
+
+        other, created = images.store_upload(io.BytesIO(b"other"), "png", uploads)
+        self.assertTrue(created)
+        self.assertNotEqual(other, image)
+
+        with open(path, "ab") as f:
+            f.write(b"corrupted")
+        self.assertFalse(images.verify(image, uploads))
+
+    def test_make_derivatives(self) -> None:
+        fnames = images.make_derivatives(os.path.join(self.tmp.name, "M42.png"))
+        self.assertEqual(
+            fnames, {"thumbnail": "M42-thumbnail.jpg", "preview": "M42-preview.jpg"}
+        )
+        with PILImage.open(os.path.join(self.tmp.name, fnames["thumbnail"])) as image:
+            self.assertEqual(max(image.size), images.SIZES["thumbnail"])
+            self.assertEqual(image.format, "JPEG")
+        # Never scaled up
+        with PILImage.open(os.path.join(self.tmp.name, fnames["preview"])) as image:
+            self.assertEqual(image.size, (789, 882))
+
+    def test_add_derivatives(self) -> None:
+        image = Image.create(fname="M42.png")
+        self.assertEqual(image.thumbnail_loc, "/static/uploads/M42.png")
+        self.assertEqual(image.preview_loc, "/static/uploads/M42.png")
+        images.add_derivatives(image.id, self.tmp.name)
+        image = Image.get_by_id(image.id)
+        self.assertEqual(image.thumbnail_loc, "/static/uploads/M42-thumbnail.jpg")
+        self.assertEqual(image.preview_loc, "/static/uploads/M42-preview.jpg")
+
+    def test_add_derivatives_not_an_image(self) -> None:
+        with open(os.path.join(self.tmp.name, "chart.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4")
+        image = Image.create(fname="chart.pdf")
+        images.add_derivatives(image.id, self.tmp.name)
+        image = Image.get_by_id(image.id)
+        self.assertIsNone(image.thumbnail)
+        self.assertEqual(image.preview_loc, "/static/uploads/chart.pdf")
+
+    def test_fits(self) -> None:
+        import numpy as np
+        from astropy.io import fits
+
+        # A bright star in the lower left corner of a noisy frame
+        data = np.random.default_rng(1).normal(1000, 10, (2000, 3300))
+        data[100:110, 100:110] = 30000
+        header = fits.Header()
+        header["EXPTIME"] = 120.0
+        header["FILTER"] = "Ha"
+        header["GAIN"] = 139
+        header["DATE-OBS"] = "2024-02-10T21:30:00"
+        path = os.path.join(self.tmp.name, "M42.fits")
+        fits.PrimaryHDU(data.astype(np.int16), header=header).writeto(path)
+
+        image = Image.create(fname="M42.fits")
+        images.add_derivatives(image.id, self.tmp.name)
+        image = Image.get_by_id(image.id)
+        self.assertEqual(image.preview_loc, "/static/uploads/M42-preview.jpg")
+        self.assertEqual(image.exposure, 120.0)
+        self.assertEqual(image.filter, "Ha")
+        self.assertEqual(image.gain, 139)
+        self.assertEqual(image.date_obs.isoformat(), "2024-02-10T21:30:00")
+        with PILImage.open(os.path.join(self.tmp.name, "M42-preview.jpg")) as preview:
+            # Averaged over blocks of 3 x 3 pixels
+            self.assertEqual(preview.size, (1100, 666))
+            # The first row of a FITS image is the bottom one
+            self.assertGreater(preview.getpixel((35, 666 - 35)), 200)
+            self.assertLess(preview.getpixel((500, 300)), 200)
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from astrolog.jobs import Job, JobQueue
+
+
+class TestJobs(TestCase):
+    def setUp(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.jobs = JobQueue(self.executor)
+
+    def tearDown(self) -> None:
+        self.executor.shutdown()
+
+    def test_job(self) -> None:
+        started, release = threading.Event(), threading.Event()
+
+        def work(x: int) -> int:
+            started.set()
+            release.wait()
+            return x * 2
+
+        done: list[Job] = []
+        job = self.jobs.submit("key", work, 21, on_done=done.append)
+        started.wait()
+        self.assertEqual(job.status, "running")
+        self.assertIs(self.jobs.get(job.id), job)
+        self.assertIsNone(job.error)
+
+        # The same key in flight is coalesced into the running job
+        self.assertIs(self.jobs.submit("key", work, 21), job)
+        self.assertEqual(len(self.jobs), 1)
+
+        release.set()
+        job.future.result()
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.result, 42)
+        self.assertEqual(done, [job])
+        self.assertIsNotNone(job.finished)
+
+        # A finished job is not reused
+        self.assertIsNot(self.jobs.submit("key", work, 21), job)
+
+    def test_failed_job(self) -> None:
+        def fail() -> None:
+            raise ValueError("No stars")
+
+        job = self.jobs.submit("key", fail)
+        with self.assertRaises(ValueError):
+            job.future.result()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error, "ValueError('No stars')")
+
+    def test_finished_jobs_are_pruned(self) -> None:
+        self.jobs.keep = 0
+        job = self.jobs.submit("key", int)
+        job.future.result()
+        self.jobs.submit("other", int).future.result()
+        self.assertIsNone(self.jobs.get(job.id))
@@ -0,0 +1,145 @@
+import datetime
+import os
+from unittest import TestCase
+
+from astrolog import metrics
+from astrolog.api import create_user, valid_login
+from astrolog.database import (
+    MODELS,
+    AstroLogDatabase,
+    Location,
+    Object,
+    Observation,
+    Session,
+    database_proxy,
+)
+from astrolog.report import Report
+from astrolog.web.app import app
+
+db = AstroLogDatabase(":memory:")
+
+
+def sample(text: str, name: str) -> float:
+    """Value of the sample `name` (with its labels) in a /metrics page"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+class TestRegistry(TestCase):
+    def setUp(self) -> None:
+        self.registry = metrics.Registry()
+
+    def test_counter(self) -> None:
+        counter = metrics.Counter(
+            "things", "Things seen", ("kind",), registry=self.registry
+        )
+        counter.labels("star").inc()
+        counter.labels("star").inc(2)
+        counter.labels('say "hi"').inc()
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP things Things seen\n"
+            "# TYPE things counter\n"
+            'things_total{kind="say \\"hi\\""} 1\n'
+            'things_total{kind="star"} 3\n',
+        )
+        with self.assertRaises(ValueError):
+            counter.labels("star", "galaxy")
+        with self.assertRaises(ValueError):
+            metrics.Counter("things", "Again", registry=self.registry)
+        # Only its kinds can be made, as it has no values of its own
+        with self.assertRaises(TypeError):
+            metrics.Metric("thing", "Thing", registry=self.registry)  # type: ignore[abstract]
+
+    def test_gauge(self) -> None:
+        gauge = metrics.Gauge("level", "Level", registry=self.registry)
+        gauge.inc(3)
+        gauge.dec()
+        self.assertIn("\nlevel 2\n", self.registry.render())
+        gauge.set(0.5)
+        self.assertIn("\nlevel 0.5\n", self.registry.render())
+
+    def test_histogram(self) -> None:
+        histogram = metrics.Histogram(
+            "wait", "Wait", ("queue",), buckets=(1, 0.1), registry=self.registry
+        )
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.labels("a").observe(value)
+
+        @histogram.time("b")
+        def function() -> int:
+            return 42
+
+        self.assertEqual(function(), 42)
+        text = self.registry.render()
+        self.assertEqual(sample(text, 'wait_bucket{queue="a",le="0.1"}'), 2)
+        self.assertEqual(sample(text, 'wait_bucket{queue="a",le="1"}'), 3)
+        self.assertEqual(sample(text, 'wait_bucket{queue="a",le="+Inf"}'), 4)
+        self.assertEqual(sample(text, 'wait_sum{queue="a"}'), 2.65)
+        self.assertEqual(sample(text, 'wait_count{queue="a"}'), 4)
+        self.assertEqual(sample(text, 'wait_count{queue="b"}'), 1)
+
+
+class TestMetrics(TestCase):
+    def setUp(self) -> None:
+        os.environ["TEST_FLASK"] = "1"
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.client = app.test_client()
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        self.session = Session.create(
+            date=datetime.date(2013, 12, 1), location=location
+        )
+        Observation.create(object=Object.create(name="M31"), session=self.session)
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+        del os.environ["TEST_FLASK"]
+
+    def metrics(self) -> str:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        return response.get_data(as_text=True)
+
+    def test_requests(self) -> None:
+        requests = 'astrolog_http_requests_total{endpoint="session_page",method="GET",status="200"}'
+        duration = (
+            'astrolog_http_request_duration_seconds_count{endpoint="session_page"}'
+        )
+        redirected = 'astrolog_http_requests_total{endpoint="session_page",method="GET",status="302"}'
+        before = self.metrics()
+        self.client.get(f"/session/{self.session.id}")
+        self.client.get(f"/session/{self.session.id}")
+        self.client.get("/session/12345")
+        after = self.metrics()
+        self.assertEqual(sample(after, requests) - sample(before, requests), 2)
+        self.assertEqual(sample(after, redirected) - sample(before, redirected), 1)
+        self.assertEqual(sample(after, duration) - sample(before, duration), 3)
+        self.assertGreater(
+            sample(after, "astrolog_db_queries_total"),
+            sample(before, "astrolog_db_queries_total"),
+        )
+        # Only the request for /metrics itself is in flight
+        self.assertEqual(sample(after, "astrolog_http_requests_in_flight"), 1)
+
+    def test_functions(self) -> None:
+        report = (
+            'astrolog_function_duration_seconds_count{function="Report.from_query"}'
+        )
+        bcrypt = 'astrolog_function_duration_seconds_count{function="bcrypt.checkpw"}'
+        before = self.metrics()
+        Report.from_query(Session.select())
+        create_user("user", "password")
+        self.assertTrue(valid_login("user", "password"))
+        after = self.metrics()
+        self.assertEqual(sample(after, report) - sample(before, report), 1)
+        self.assertEqual(sample(after, bcrypt) - sample(before, bcrypt), 1)
@@ -0,0 +1,166 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+from playhouse.migrate import SqliteMigrator, migrate
+
+from astrolog.database import MODELS, Image, Location, database_proxy
+from astrolog.migrate import MIGRATIONS, Migrator, SchemaVersion, pending, upgrade
+
+db = SqliteDatabase(":memory:")
+
+# The columns added by the migrations, which an old database lacks
+MIGRATED = {
+    "object": ["kind_id", "structure_id"],
+    "session": ["note"],
+    "location": ["utcoffset"],
+    "eyepiece": ["afov"],
+    "observation": ["barlow_id", "front_filter_id", "camera_id", "image_id"],
+    "image": [
+        "thumbnail",
+        "preview",
+        "sha256",
+        "exposure",
+        "filter",
+        "gain",
+        "date_obs",
+    ],
+}
+
+
+def columns(table: str) -> set[str]:
+    return {column.name for column in db.get_columns(table)}
+
+
+class TestMigrate(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        self.uploads = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        db.drop_tables([SchemaVersion, *MODELS])
+        self.uploads.cleanup()
+
+    def make_old_database(self) -> None:
+        db.create_tables(MODELS)
+        migrator = SqliteMigrator(db)
+        migrate(
+            *(
+                migrator.drop_column(table, column, legacy=True)
+                for table, names in MIGRATED.items()
+                for column in names
+            )
+        )
+        db.execute_sql(
+            "INSERT INTO location (name, country, latitude, longitude, altitude) "
+            "VALUES ('Home', 'Denmark', '55:40:00', '12:34:00', 10)"
+        )
+        with open("resources/test/M42.png", "rb") as f:
+            png = f.read()
+        for name, content in [("a.png", b"a"), ("b.png", png), ("c.png", b"a")]:
+            with open(os.path.join(self.uploads.name, name), "wb") as f:
+                f.write(content)
+        for name in ("a.png", "missing.png", "b.png", "c.png"):
+            db.execute_sql("INSERT INTO image (fname) VALUES (?)", (name,))
+
+    def test_new_database(self) -> None:
+        steps = upgrade()
+        self.assertIn(("", "create table schemaversion"), steps)
+        self.assertTrue(all(migration == "" for migration, _ in steps))
+        self.assertEqual(SchemaVersion.select().count(), len(MIGRATIONS))
+        self.assertEqual(pending(), [])
+        self.assertEqual(upgrade(), [])
+
+    def test_dry_run(self) -> None:
+        self.make_old_database()
+        steps = upgrade(dry_run=True)
+        self.assertIn(
+            ("0004 location-utcoffset", "add column location.utcoffset"), steps
+        )
+        self.assertIn(("0011 image-sha256", "backfill image.sha256"), steps)
+        self.assertFalse(SchemaVersion.table_exists())
+        self.assertNotIn("utcoffset", columns("location"))
+        self.assertEqual(len(pending()), len(MIGRATIONS))
+
+    def test_upgrade(self) -> None:
+        self.make_old_database()
+        progress: list[tuple[str, int, int]] = []
+        upgrade(
+            chunk_size=3,
+            upload_folder=self.uploads.name,
+            progress=lambda *p: progress.append(p),
+        )
+        for table, names in MIGRATED.items():
+            self.assertLessEqual(set(names), columns(table))
+        self.assertEqual(Location.get().utcoffset, 0)
+        hashes = [image.sha256 for image in Image.select().order_by(Image.id)]
+        self.assertEqual(hashes[1:], [None, hashes[2], None])
+        self.assertEqual(len(set(hashes)), 3)
+        self.assertEqual(
+            progress,
+            [
+                ("image.sha256", 3, 4),
+                ("image.sha256", 4, 4),
+                ("image derivatives", 3, 4),
+                ("image derivatives", 4, 4),
+            ],
+        )
+        # Only the one that is an image has derivatives
+        thumbnails = [image.thumbnail for image in Image.select().order_by(Image.id)]
+        self.assertEqual(thumbnails, [None, None, "b-thumbnail.jpg", None])
+        self.assertTrue(
+            os.path.exists(os.path.join(self.uploads.name, "b-thumbnail.jpg"))
+        )
+        self.assertEqual(pending(), [])
+        # The triggers of the old tables are in place
+        Location.update(name="Away").execute()
+        self.assertEqual(upgrade(), [])
+
+    def test_derivative_folders(self) -> None:
+        db.create_tables(MODELS)
+        Image.create(
+            fname="ab/ab.png", thumbnail="ab-thumbnail.jpg", preview="ab-preview.jpg"
+        )
+        Image.create(
+            fname="old.png", thumbnail="old-thumbnail.jpg", preview="old-preview.jpg"
+        )
+        SchemaVersion.create_table()
+        SchemaVersion.insert_many(
+            [
+                {"version": m.version, "name": m.name}
+                for m in MIGRATIONS
+                if m.version < 13
+            ]
+        ).execute()
+        upgrade()
+        images = Image.select().order_by(Image.id)
+        self.assertEqual(
+            [(image.thumbnail, image.preview) for image in images],
+            [
+                ("ab/ab-thumbnail.jpg", "ab/ab-preview.jpg"),
+                ("old-thumbnail.jpg", "old-preview.jpg"),
+            ],
+        )
+
+    def test_resume_backfill(self) -> None:
+        db.create_tables(MODELS)
+        Image.insert_many([{"fname": str(i)} for i in range(5)]).execute()
+
+        def interrupt(name: str, done: int, total: int) -> None:
+            if done == 2:
+                raise KeyboardInterrupt
+
+        def fill(image: Image) -> None:
+            filled.append(image.id)
+            Image.update(sha256=image.fname).where(Image.id == image.id).execute()
+
+        filled: list[int] = []
+        query = Image.select().where(Image.sha256.is_null())
+        with self.assertRaises(KeyboardInterrupt):
+            Migrator(db, chunk_size=2, progress=interrupt).backfill(
+                "sha256", query, fill
+            )
+        Migrator(db, chunk_size=2).backfill("sha256", query, fill)
+        self.assertEqual(filled, [1, 2, 3, 4, 5])
+        self.assertEqual(Image.select().where(Image.sha256.is_null()).count(), 0)
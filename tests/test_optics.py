@@ -0,0 +1,53 @@
+import math
+from unittest import TestCase
+
+from astrolog import optics
+from astrolog.database import Barlow, EyePiece, Telescope
+
+
+class TestOptics(TestCase):
+    def test_optics_matrix(self) -> None:
+        telescopes = [
+            Telescope(id=1, name="Dobson", aperture=200, focal_length=1200),
+            Telescope(id=2, name="Refractor", aperture=80, focal_length=400),
+        ]
+        eyepieces = [
+            EyePiece(id=1, type="Plössl", focal_length=32, width=1.25, afov=52),
+            EyePiece(id=2, type="Kellner", focal_length=4, width=1.25),
+        ]
+        barlows = [Barlow(id=1, name="Barlow", multiplier=2)]
+        matrix = optics.optics_matrix(telescopes, eyepieces, barlows)
+        self.assertEqual(matrix.magnification.shape, (2, 2, 2))
+        self.assertEqual(matrix.barlows, [None, barlows[0]])
+
+        # The same as for a single combination
+        for t, telescope in enumerate(telescopes):
+            for e, eyepiece in enumerate(eyepieces):
+                for b, barlow in enumerate(matrix.barlows):
+                    magnification = telescope.magnification_with(eyepiece, barlow)
+                    fov = telescope.fov_with(eyepiece, barlow)
+                    self.assertEqual(int(matrix.magnification[t, e, b]), magnification)
+                    if fov is None:
+                        self.assertTrue(math.isnan(matrix.fov[t, e, b]))
+                    else:
+                        self.assertAlmostEqual(matrix.fov[t, e, b], fov, places=2)
+
+        # 80mm at 400X is more than twice the aperture
+        self.assertTrue(matrix.too_high[1, 1, 1])
+        self.assertFalse(matrix.too_high[0, 1, 0])
+        # 80mm at 12.5X gives an exit pupil of 6.4mm
+        self.assertFalse(matrix.too_low[1, 0, 0])
+        self.assertAlmostEqual(matrix.exit_pupil[1, 0, 0], 6.4)
+
+        configurations = list(matrix.configurations(0))
+        self.assertEqual(
+            [c["magnification"] for c in configurations], [37, 75, 300, 600]
+        )
+        self.assertEqual(configurations[0]["fov"], 1.39)
+        self.assertIsNone(configurations[0]["barlow"])
+        self.assertIsNone(configurations[-1]["fov"])
+        self.assertTrue(configurations[-1]["too_high"])
+
+    def test_empty(self) -> None:
+        matrix = optics.optics_matrix([], [], [])
+        self.assertEqual(matrix.magnification.shape, (0, 0, 1))
@@ -0,0 +1,78 @@
+import datetime
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from astrolog.database import MODELS, Location, Session, database_proxy
+from astrolog.pagination import decode_cursor, encode_cursor, paginate
+
+db = SqliteDatabase(":memory:")
+
+
+class TestPagination(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        # Two sessions on each day, so the id breaks the ties
+        for day in range(1, 6):
+            for _ in range(2):
+                Session.create(date=datetime.date(2023, 1, day), location=location)
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+
+    def test_cursor(self) -> None:
+        cursor = encode_cursor([datetime.date(2023, 1, 1), 3])
+        self.assertEqual(decode_cursor(cursor), ["2023-01-01", 3])
+        for invalid in ("%%%", encode_cursor([1])[:-1], "eyJhIjoxfQ"):
+            with self.subTest(cursor=invalid), self.assertRaises(ValueError):
+                decode_cursor(invalid)
+
+    def test_cursor_shape(self) -> None:
+        keys = [Session.date, Session.id]
+        for values in ([1], [1, 2, 3], [{"a": 1}, 1], [[1], 1], [None, 1]):
+            cursor = encode_cursor(values)
+            with self.subTest(values=values), self.assertRaises(ValueError):
+                paginate(Session.select(), keys, 4, after=cursor)
+            with self.subTest(values=values), self.assertRaises(ValueError):
+                paginate(Session.select(), keys, 4, before=cursor)
+
+    def test_paginate(self) -> None:
+        keys = [Session.date, Session.id]
+        expected = list(
+            Session.select().order_by(Session.date.desc(), Session.id.desc())
+        )
+
+        pages = [paginate(Session.select(), keys, 4, descending=True)]
+        while pages[-1].next is not None:
+            pages.append(
+                paginate(
+                    Session.select(), keys, 4, after=pages[-1].next, descending=True
+                )
+            )
+        self.assertEqual([len(page.items) for page in pages], [4, 4, 2])
+        self.assertEqual([item for page in pages for item in page.items], expected)
+        self.assertIsNone(pages[0].prev)
+
+        # And back again
+        for page, previous in zip(pages[1:], pages):
+            assert page.prev is not None
+            back = paginate(
+                Session.select(), keys, 4, before=page.prev, descending=True
+            )
+            self.assertEqual(back.items, previous.items)
+            self.assertEqual(back.next, previous.next)
+            self.assertEqual(back.prev, previous.prev)
+
+    def test_paginate_ascending(self) -> None:
+        page = paginate(Session.select(), [Session.id], 3)
+        self.assertEqual([session.id for session in page.items], [1, 2, 3])
+        page = paginate(Session.select(), [Session.id], 3, after=page.next)
+        self.assertEqual([session.id for session in page.items], [4, 5, 6])
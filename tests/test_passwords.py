@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest import TestCase, mock
+
+from peewee import SqliteDatabase
+
+from astrolog import passwords
+from astrolog.api import create_user, valid_login
+from astrolog.database import MODELS, User, database_proxy
+from astrolog.passwords import HasherBusy, LoginThrottle, PasswordHasher
+from astrolog.web import app as web
+
+db = SqliteDatabase(":memory:")
+
+
+class TestPasswords(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.hasher = PasswordHasher(rounds=4)
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+
+    def test_hash(self) -> None:
+        hashed = self.hasher.hash("password")
+        self.assertTrue(hashed.startswith(b"$2b$04$"))
+        self.assertTrue(self.hasher.verify("password", hashed))
+        self.assertFalse(self.hasher.verify("passw0rd", hashed))
+        self.assertFalse(self.hasher.needs_rehash(hashed))
+        self.assertTrue(PasswordHasher(rounds=5).needs_rehash(hashed))
+
+    def test_busy(self) -> None:
+        hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+        started, release = threading.Event(), threading.Event()
+
+        def checkpw(password: bytes, hashed: bytes) -> bool:
+            started.set()
+            release.wait()
+            return True
+
+        with mock.patch("bcrypt.checkpw", checkpw):
+            thread = threading.Thread(target=hasher.verify, args=("a", b"b"))
+            thread.start()
+            started.wait()
+            with self.assertRaises(HasherBusy):
+                hasher.verify("a", b"b")
+            release.set()
+            thread.join()
+        hashed = hasher.hash("password")
+        self.assertTrue(hasher.verify("password", hashed))
+
+    def test_rehash_on_login(self) -> None:
+        create_user("user", "password", hasher=self.hasher)
+        stronger = PasswordHasher(rounds=5)
+        self.assertFalse(valid_login("user", "wrong-password", hasher=stronger))
+        self.assertTrue(User.get().hashed_password.startswith(b"$2b$04$"))
+        self.assertTrue(valid_login("user", "password", hasher=stronger))
+        self.assertTrue(User.get().hashed_password.startswith(b"$2b$05$"))
+        self.assertTrue(valid_login("user", "password", hasher=stronger))
+
+    def test_throttle(self) -> None:
+        throttle = LoginThrottle(attempts=2, window=60)
+        with mock.patch("time.monotonic", return_value=1000):
+            throttle.failed("a")
+            self.assertEqual(throttle.retry_after("a"), 0)
+            throttle.failed("a", "b")
+            self.assertEqual(throttle.retry_after("a"), 60)
+            self.assertEqual(throttle.retry_after("b"), 0)
+        with mock.patch("time.monotonic", return_value=1030):
+            self.assertEqual(throttle.retry_after("b", "a"), 30)
+        with mock.patch("time.monotonic", return_value=1060):
+            self.assertEqual(throttle.retry_after("a"), 0)
+        throttle.failed("b")
+        throttle.succeeded("b")
+        self.assertEqual(throttle.retry_after("b"), 0)
+
+    def test_login_throttled(self) -> None:
+        create_user("user", "password", hasher=self.hasher)
+        client = web.app.test_client()
+        with (
+            mock.patch.dict(web.app.config, LOGIN_ATTEMPTS_PER_USER=2),
+            mock.patch.object(web, "_throttles", None),
+            mock.patch.object(passwords, "_hasher", self.hasher),
+            mock.patch.object(
+                passwords.bcrypt, "checkpw", wraps=passwords.bcrypt.checkpw
+            ) as checkpw,
+        ):
+            form = {"username": "user", "password": "wrong-password"}
+            for _ in range(2):
+                self.assertEqual(client.post("/login", data=form).status_code, 200)
+            response = client.post("/login", data={**form, "password": "password"})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn(b"Too many failed logins", response.data)
+            self.assertEqual(checkpw.call_count, 2)
+            # Other users are not affected
+            create_user("other", "password", hasher=self.hasher)
+            form = {"username": "other", "password": "password"}
+            self.assertEqual(client.post("/login", data=form).status_code, 302)
+
+    def test_one_pair_of_throttles(self) -> None:
+        def make_throttle(*args: Any) -> LoginThrottle:
+            time.sleep(0.01)
+            return LoginThrottle(*args)
+
+        def get_throttles() -> Any:
+            with web.app.app_context():
+                return web.get_throttles()
+
+        with (
+            mock.patch.object(web, "_throttles", None),
+            mock.patch.object(web, "LoginThrottle", side_effect=make_throttle),
+            ThreadPoolExecutor(max_workers=4) as logins,
+        ):
+            pairs = [logins.submit(get_throttles) for _ in range(4)]
+            self.assertEqual(len({id(pair.result()) for pair in pairs}), 1)
+
+    def test_hasher_from_config(self) -> None:
+        client = web.app.test_client()
+        with (
+            mock.patch.dict(web.app.config, BCRYPT_ROUNDS=5),
+            mock.patch.object(passwords, "_hasher", None),
+        ):
+            form = {"username": "user", "password": "password"}
+            self.assertEqual(client.post("/create_user", data=form).status_code, 302)
+            hasher = passwords.get_hasher()
+            self.assertEqual(hasher.rounds, 5)
+            # The same for the web application and the rest
+            self.assertTrue(valid_login("user", "password"))
+            self.assertIs(passwords.get_hasher(), hasher)
+        self.assertTrue(User.get().hashed_password.startswith(b"$2b$05$"))
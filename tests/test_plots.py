@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from astrolog import plots
+
+
+class TestPlots(TestCase):
+    def test_visibility_plot(self) -> None:
+        data, missing = plots.visibility_plot(
+            latitude=55.86,
+            longitude=-9.85,
+            altitude=0,
+            utcoffset=1,
+            date="2023-01-01",
+            names=[],
+        )
+        self.assertEqual(missing, [])
+        self.assertEqual(data["date"], "2023-01-01")
+        self.assertEqual(data["targets"], {})
+        columns = data["columns"]
+        self.assertEqual(set(columns), {"hours", "sun", "moon"})
+        for column in columns.values():
+            self.assertEqual(len(column), plots.NIGHT_POINTS)
+        self.assertEqual(columns["hours"][0], -12)
+        self.assertEqual(columns["hours"][-1], 12)
+        # Around midnight in Denmark in January the sun is well below the horizon
+        self.assertLess(columns["sun"][plots.NIGHT_POINTS // 2], -18)
+
+    def test_visibility_plot_year(self) -> None:
+        data, missing = plots.visibility_plot_year(
+            latitude=55.86, longitude=-9.85, altitude=0, year=2023, names=[]
+        )
+        self.assertEqual(missing, [])
+        self.assertEqual(data["year"], 2023)
+        self.assertEqual(data["columns"]["day"][:2], [1, 1 + plots.YEAR_STEP])
@@ -0,0 +1,83 @@
+import datetime
+import os
+from unittest import TestCase, mock
+
+from astrolog.database import (
+    MODELS,
+    AstroLogDatabase,
+    Location,
+    Object,
+    Observation,
+    Session,
+    database_proxy,
+)
+from astrolog.web import profiling
+from astrolog.web.app import app
+
+db = AstroLogDatabase(":memory:")
+
+
+class TestProfiling(TestCase):
+    def setUp(self) -> None:
+        os.environ["TEST_FLASK"] = "1"
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.client = app.test_client()
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        self.session = Session.create(
+            date=datetime.date(2013, 12, 1), location=location
+        )
+        for name in ("M31", "M42"):
+            Observation.create(object=Object.create(name=name), session=self.session)
+        profiling._profiles.clear()
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+        del os.environ["TEST_FLASK"]
+
+    def test_listeners(self) -> None:
+        queries = []
+        with mock.patch.object(
+            AstroLogDatabase, "listeners", [lambda *query: queries.append(query)]
+        ):
+            Object.get(name="M42")
+        [(sql, params, duration)] = queries
+        self.assertIn('FROM "object"', sql)
+        self.assertEqual(params[0], "M42")
+        self.assertGreater(duration, 0)
+
+    def test_server_timing(self) -> None:
+        response = self.client.get(f"/session/{self.session.id}")
+        timing = dict(
+            part.strip().split(";", 1)
+            for part in response.headers["Server-Timing"].split(",")
+        )
+        self.assertEqual(timing.keys(), {"db", "tpl", "total"})
+        self.assertRegex(timing["db"], r'^dur=[\d.]+;desc="\d+ queries"$')
+        # Only kept for the debug page in debug mode
+        self.assertEqual(len(profiling._profiles), 0)
+        self.assertEqual(self.client.get("/debug/profile").status_code, 404)
+
+    def test_debug_profile(self) -> None:
+        with mock.patch.dict(app.config, DEBUG_PROFILE=True, PROFILE_SLOWEST=2):
+            self.client.get("/objects")
+            self.client.get("/session/all?profile=1")
+            [session, objects] = profiling._profiles
+            self.assertEqual(objects.endpoint, "objects")
+            self.assertGreater(objects.queries, 2)
+            self.assertEqual(len(objects.slowest), 2)
+            self.assertGreater(objects.template_time, 0)
+            self.assertIsNone(objects.stats)
+            self.assertIn("cumulative", session.stats)
+
+            page = self.client.get("/debug/profile")
+            self.assertEqual(page.status_code, 200)
+            self.assertIn(b"GET /objects", page.data)
+            # The debug page itself is not listed
+            self.assertEqual(len(profiling._profiles), 2)
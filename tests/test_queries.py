@@ -0,0 +1,202 @@
+import io
+import os
+import tempfile
+from typing import Any
+from unittest import TestCase, mock
+from urllib.parse import urlsplit
+
+from peewee import SqliteDatabase
+
+from astrolog.database import MODELS, Object, count_queries, database_proxy
+from astrolog.synthetic import LAST_DATE, generate
+from astrolog.web.app import app
+
+db = SqliteDatabase(":memory:")
+
+# The most queries each page may run, however many rows there are
+BUDGETS = {
+    ("GET", "/"): 1,
+    ("GET", "/report"): 0,
+    ("GET", "/create_user"): 0,
+    ("POST", "/create_user"): 1,
+    ("GET", "/login"): 0,
+    ("POST", "/login"): 1,
+    ("GET", "/session/new"): 1,
+    ("POST", "/session/new"): 3,
+    ("GET", "/session/all"): 3,
+    ("GET", "/session/1"): 6,
+    ("GET", "/observation/new/session/1"): 10,
+    ("GET", "/search?search=M1"): 5,
+    ("GET", "/structures"): 4,
+    ("GET", "/objects"): 8,
+    ("GET", "/equipments"): 8,
+    ("GET", "/equipments/planner"): 2,
+    ("GET", "/locations"): 1,
+    ("GET", "/gallery"): 2,
+    ("GET", f"/ajax/get_report?date={LAST_DATE.year}-01-01"): 12,
+    ("GET", "/ajax/sessions"): 1,
+    ("GET", "/ajax/objects"): 2,
+    ("GET", "/ajax/search/objects?search=M"): 2,
+    ("GET", "/ajax/search/sessions?search=clear"): 1,
+    ("GET", "/ajax/search/observations?search=M1"): 1,
+    ("GET", "/ajax/changes?since=100"): 1,
+    ("POST", "/observation/new/session/1"): 10,
+    ("POST", "/observation/new/image/1"): 7,
+    ("POST", "/objects"): 12,
+    ("POST", "/objects/alt_name"): 2,
+    ("POST", "/structures/add"): 2,
+    ("POST", "/structures/add_object"): 4,
+    ("POST", "/equipments/new/telescope"): 2,
+    ("POST", "/equipments/new/binocular"): 2,
+    ("POST", "/equipments/new/eyepiece"): 2,
+    ("POST", "/equipments/new/barlow"): 2,
+    ("POST", "/equipments/new/camera"): 2,
+    ("POST", "/equipments/new/filter"): 1,
+    ("POST", "/equipments/new/front_filter"): 1,
+    ("POST", "/locations/new"): 2,
+    ("POST", "/locations/alter"): 2,
+    ("POST", "/ajax/update/observation/note"): 3,
+    ("POST", "/ajax/update/kind"): 4,
+    ("POST", "/ajax/add/kind"): 3,
+    ("GET", "/visibility"): 1,
+    ("POST", "/visibility"): 1,
+    ("GET", "/finding-chart"): 0,
+    ("POST", "/finding-chart"): 0,
+    ("GET", "/metrics"): 0,
+    ("GET", "/static/css/bootstrap.min.css"): 0,
+}
+# Routes without a budget, by method and endpoint, and why
+EXEMPT = {
+    ("GET", "planning.visibility_data"): "Computed by astropy in the plot workers",
+    ("GET", "planning.finding_chart_data"): "Computed by astropy in the plot workers",
+    ("GET", "planning.job"): "Polls a plot job, which runs no queries",
+    ("GET", "profiling.profiles"): "Only in debug mode",
+    ("GET", "slow_queries.queries"): "Only in debug mode",
+}
+
+
+def upload() -> dict[str, Any]:
+    with open("resources/test/M42.png", "rb") as f:
+        return {"file": (io.BytesIO(f.read()), "M42.png")}
+
+
+# The forms to post, or functions making them from the log before the queries
+# are counted
+FORMS: dict[str, Any] = {
+    "/create_user": {"username": "astronomer", "password": "password"},
+    "/login": {"username": "astronomer", "password": "password"},
+    "/session/new": {"location_id": "1", "date": "2000-01-01", "note": "Clear"},
+    "/observation/new/session/1": {
+        "object": "M31",
+        "observation-type": "telescope",
+        "telescope_id": "1",
+        "eyepiece_id": "2",
+    },
+    "/ajax/update/observation/note": {
+        "observation-id": "1",
+        "observation-note": "Seen",
+    },
+    "/observation/new/image/1": upload,
+    "/objects": {"object": "C/2023 A3", "structure_id": ""},
+    "/objects/alt_name": {"object": "C/2023 A3", "alt-name": "Tsuchinshan-ATLAS"},
+    "/structures/add": {"structure": "Comets"},
+    "/structures/add_object": lambda: {
+        "structure": "1",
+        "object_id": str(Object.get(name="C/2023 A3").id),
+    },
+    "/equipments/new/telescope": {
+        "name": "Newton",
+        "aperture": "150",
+        "focal_length": "750",
+    },
+    "/equipments/new/binocular": {
+        "name": "15x70",
+        "aperture": "70",
+        "magnification": "15",
+    },
+    "/equipments/new/eyepiece": {
+        "type": "Nagler",
+        "focal_length": "13",
+        "width": "1.25",
+    },
+    "/equipments/new/barlow": {"name": "3x", "multiplier": "3"},
+    "/equipments/new/camera": {
+        "manufacture": "ZWO",
+        "model": "ASI533MC",
+        "megapixel": "9",
+    },
+    "/equipments/new/filter": {"name": "UHC"},
+    "/equipments/new/front_filter": {"name": "Solar"},
+    "/locations/new": {
+        "name": "Away",
+        "country": "Denmark",
+        "latitude": "55:00:00",
+        "longitude": "10:00:00",
+        "utcoffset": "1",
+        "altitude": "10",
+    },
+    # Observed there, so it is kept
+    "/locations/alter": {"delete": "1"},
+    "/ajax/add/kind": {"kind": "Comet"},
+}
+JSON = {"/ajax/update/kind": {"object_id": 1, "kind_id": 2}}
+
+
+class TestQueryBudgets(TestCase):
+    def setUp(self) -> None:
+        os.environ["TEST_FLASK"] = "1"
+        database_proxy.initialize(db)
+        self.client = app.test_client()
+
+    def tearDown(self) -> None:
+        del os.environ["TEST_FLASK"]
+
+    def count(self, method: str, url: str) -> int:
+        form = FORMS.get(url) if method == "POST" else None
+        with count_queries() as queries:
+            response = self.client.open(
+                url,
+                method=method,
+                data=form() if callable(form) else form,
+                json=JSON.get(url),
+            )
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def test_count_queries(self) -> None:
+        db.create_tables(MODELS)
+        generate(10)
+        with count_queries() as queries:
+            list(MODELS[0].select())
+        db.drop_tables(MODELS)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("SELECT", queries[0])
+
+    def test_budgets(self) -> None:
+        counts: dict[tuple[str, str], list[int]] = {url: [] for url in BUDGETS}
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            mock.patch.dict(app.config, UPLOAD_FOLDER=directory, IMAGE_WORKERS=0),
+        ):
+            for size in (100, 1000):
+                db.create_tables(MODELS)
+                generate(size)
+                for (method, url), count in counts.items():
+                    count.append(self.count(method, url))
+                db.drop_tables(MODELS)
+        for (method, url), count in counts.items():
+            with self.subTest(method=method, url=url):
+                self.assertLessEqual(max(count), BUDGETS[method, url])
+                # The same queries for ten times the rows
+                self.assertEqual(count[0], count[-1])
+
+    def test_every_route_has_a_budget(self) -> None:
+        adapter = app.url_map.bind("localhost")
+        covered = set(EXEMPT)
+        for method, url in BUDGETS:
+            endpoint, _ = adapter.match(urlsplit(url).path, method=method)
+            covered.add((method, endpoint))
+        for rule in app.url_map.iter_rules():
+            for method in sorted(set(rule.methods or ()) - {"HEAD", "OPTIONS"}):
+                with self.subTest(method=method, rule=rule.rule):
+                    self.assertIn((method, rule.endpoint), covered)
@@ -0,0 +1,59 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from astrolog.api import search_objects
+from astrolog.database import MODELS, AstroLogDatabase, Object, database_proxy
+from astrolog.web import slow_queries
+from astrolog.web.app import app
+
+db = AstroLogDatabase(":memory:")
+
+
+class TestSlowQueries(TestCase):
+    def setUp(self) -> None:
+        os.environ["TEST_FLASK"] = "1"
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        Object.create(name="M31")
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "logs", "slow.log")
+        self.log = slow_queries.SlowQueryLog(threshold=0, path=self.path, history=3)
+        self.listeners = mock.patch.object(AstroLogDatabase, "listeners", [self.log])
+        self.listeners.start()
+
+    def tearDown(self) -> None:
+        self.listeners.stop()
+        self.log.close()
+        self.directory.cleanup()
+        db.drop_tables(MODELS)
+        del os.environ["TEST_FLASK"]
+
+    def test_slow_query(self) -> None:
+        search_objects("M3", size=10)
+        [query] = [query for query in self.log.queries if "LIKE" in query.sql]
+        self.assertIn("LIKE", query.sql)
+        self.assertIn("%M3%", query.params)
+        self.assertIsNone(query.endpoint)
+        self.assertTrue(query.caller.startswith("astrolog.pagination.paginate:"))
+        self.assertTrue(any(step.startswith("SCAN") for step in query.plan))
+        with open(self.path) as log:
+            self.assertIn("plan: SCAN", log.read())
+
+    def test_threshold(self) -> None:
+        self.log.threshold = 60
+        Object.get(name="M31")
+        self.assertEqual(len(self.log.queries), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_debug_page(self) -> None:
+        client = app.test_client()
+        with mock.patch.dict(app.extensions, slow_queries=self.log):
+            self.assertEqual(client.get("/debug/slow-queries").status_code, 404)
+            client.get("/objects")
+            self.assertEqual(len(self.log.queries), 3)
+            self.assertEqual(self.log.queries[0].endpoint, "objects")
+            with mock.patch.dict(app.config, DEBUG_PROFILE=True):
+                page = client.get("/debug/slow-queries")
+            self.assertEqual(page.status_code, 200)
+            self.assertIn(b"SCAN t1", page.data)
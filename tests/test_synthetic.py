@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from astrolog import synthetic
+from astrolog.database import (
+    MODELS,
+    AltName,
+    Object,
+    Observation,
+    Session,
+    database_proxy,
+)
+
+db = SqliteDatabase(":memory:")
+
+
+class TestSynthetic(TestCase):
+    def setUp(self) -> None:
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+
+    def dump(self) -> list[tuple]:
+        return [
+            (o.id, o.session_id, o.object_id, o.telescope_id, o.note)
+            for o in Observation.select().order_by(Observation.id)
+        ]
+
+    def test_sizes(self) -> None:
+        sizes = synthetic.generate(2000)
+        self.assertEqual(Observation.select().count(), 2000)
+        self.assertEqual(Session.select().count(), sizes.sessions)
+        self.assertEqual(Object.select().count(), sizes.objects)
+        self.assertGreater(AltName.select().count(), 0)
+        # Every session has observations, and the first objects are the popular ones
+        empty = Session.select().where(
+            ~Session.id.in_(Observation.select(Observation.session))
+        )
+        self.assertFalse(empty.exists())
+        first = Observation.select().where(Observation.object == 1).count()
+        last = Observation.select().where(Observation.object == sizes.objects).count()
+        self.assertGreater(first, last)
+        with self.assertRaises(ValueError):
+            synthetic.generate(10)
+
+    def test_deterministic(self) -> None:
+        synthetic.generate(500, seed=1)
+        first = self.dump()
+        db.drop_tables(MODELS)
+        db.create_tables(MODELS)
+        synthetic.generate(500, seed=1)
+        self.assertEqual(self.dump(), first)
+        db.drop_tables(MODELS)
+        db.create_tables(MODELS)
+        synthetic.generate(500, seed=2)
+        self.assertNotEqual(self.dump(), first)
@@ -0,0 +1,569 @@
+import array
+import datetime
+import gzip
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest import TestCase, mock, skipUnless
+
+from flask import url_for
+from peewee import SqliteDatabase
+
+from astrolog.database import (
+    MODELS,
+    EyePiece,
+    Image,
+    Location,
+    Object,
+    Observation,
+    Session,
+    Telescope,
+    database_proxy,
+)
+from astrolog.images import store_upload
+from astrolog.pagination import encode_cursor
+from astrolog.web import caching, planning
+from astrolog.web.app import app
+from astrolog.web.compression import brotli
+
+db = SqliteDatabase(":memory:")
+
+
+class TestWeb(TestCase):
+    def setUp(self) -> None:
+        os.environ["TEST_FLASK"] = "1"
+        database_proxy.initialize(db)
+        db.create_tables(MODELS)
+        self.client = app.test_client()
+
+    def tearDown(self) -> None:
+        db.drop_tables(MODELS)
+        del os.environ["TEST_FLASK"]
+
+    def test_browsing_pages(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        session = Session.create(date=datetime.date(2013, 12, 1), location=location)
+        Observation.create(object=Object.create(name="M42"), session=session)
+        for url in (
+            "/session/all",
+            f"/session/{session.id}",
+            "/objects",
+            "/equipments",
+            "/structures",
+            "/gallery",
+            "/search?search=M4",
+            "/ajax/get_report?date=2013-12-01",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_gallery(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        session = Session.create(date=datetime.date(2013, 12, 1), location=location)
+        for i in range(5):
+            Observation.create(
+                object=Object.create(name=f"M{i}"),
+                session=session,
+                image=Image.create(fname=f"M{i}.png", thumbnail=f"M{i}-thumbnail.jpg"),
+            )
+        with mock.patch.dict(app.config, GALLERY_PAGE_SIZE=3):
+            first = self.client.get("/gallery")
+            self.assertEqual(first.status_code, 200)
+            self.assertIn(b'alt="2013-12-01: M4"', first.data)
+            self.assertIn(b'src="/static/uploads/M2-thumbnail.jpg"', first.data)
+            self.assertNotIn(b': M1"', first.data)
+            self.assertNotIn(b"before=", first.data)
+            after = first.data.split(b"after=")[1].split(b'"')[0].decode()
+
+            second = self.client.get(f"/gallery?after={after}")
+            self.assertIn(b'alt="2013-12-01: M0"', second.data)
+            self.assertNotIn(b': M2"', second.data)
+            self.assertNotIn(b"after=", second.data)
+            self.assertIn(b"before=", second.data)
+
+            for cursor in ("%%", "WzFd", encode_cursor([{"a": 1}, 1])):
+                with self.subTest(cursor=cursor):
+                    response = self.client.get(f"/gallery?after={cursor}")
+                    self.assertEqual(response.status_code, 400)
+
+    def test_changes(self) -> None:
+        for name in ("M1", "M2", "M3"):
+            Object.create(name=name)
+        Object.delete().where(Object.name == "M2").execute()
+        first = self.client.get("/ajax/changes?size=3").json
+        self.assertEqual(
+            [(c["seq"], c["table"], c["id"], c["action"]) for c in first["items"]],
+            [
+                (1, "object", 1, "insert"),
+                (2, "object", 2, "insert"),
+                (3, "object", 3, "insert"),
+            ],
+        )
+        self.assertEqual((first["last"], first["more"]), (3, True))
+        second = self.client.get(f'/ajax/changes?since={first["last"]}').json
+        self.assertEqual([c["action"] for c in second["items"]], ["delete"])
+        self.assertEqual((second["last"], second["more"]), (4, False))
+        empty = self.client.get("/ajax/changes?since=4").json
+        self.assertEqual((empty["items"], empty["last"]), ([], 4))
+        self.assertEqual(self.client.get("/ajax/changes?since=x").status_code, 400)
+
+    def test_listings_are_paginated(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        for day in range(1, 6):
+            Session.create(
+                date=datetime.date(2013, 12, day), location=location, note="clear"
+            )
+            Object.create(name=f"M{day}")
+        with mock.patch.dict(app.config, PAGE_SIZE=2):
+            response = self.client.get("/ajax/sessions")
+            first = response.json
+            self.assertEqual(
+                [session["date"] for session in first["items"]],
+                ["2013-12-05", "2013-12-04"],
+            )
+            self.assertIsNone(first["prev"])
+            self.assertIn(
+                f'after={first["next"]}'.encode(), self.client.get("/session/all").data
+            )
+
+            second = self.client.get(f'/ajax/sessions?after={first["next"]}').json
+            self.assertEqual(second["items"][0]["date"], "2013-12-03")
+            back = self.client.get(f'/ajax/sessions?before={second["prev"]}').json
+            self.assertEqual(back, first)
+
+            objects = self.client.get("/ajax/objects?size=3").json
+            self.assertEqual([o["name"] for o in objects["items"]], ["M1", "M2", "M3"])
+
+            found = self.client.get("/ajax/search/sessions?search=clear&size=1000").json
+            self.assertEqual(len(found["items"]), 5)
+            self.assertIsNone(found["next"])
+
+            # Each listing on the search page has its own cursor
+            page = self.client.get(f'/search?search=M&sessions_after={first["next"]}')
+            self.assertIn(
+                f'sessions_after={first["next"]}&amp;objects_after='.encode(), page.data
+            )
+            self.assertEqual(self.client.get("/ajax/search/users").status_code, 404)
+            self.assertEqual(self.client.get("/ajax/sessions?size=x").status_code, 400)
+
+    def test_unchanged_pages_are_not_modified(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        first = self.client.get("/session/all")
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        self.assertEqual(first.headers["Cache-Control"], "no-cache")
+
+        with mock.patch("astrolog.web.app.render_template") as render:
+            again = self.client.get("/session/all", headers={"If-None-Match": etag})
+            render.assert_not_called()
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.headers["ETag"], etag)
+        # Other pages have other tags
+        other = self.client.get("/equipments", headers={"If-None-Match": etag})
+        self.assertEqual(other.status_code, 200)
+
+        Session.create(date=datetime.date(2013, 12, 1), location=location)
+        changed = self.client.get("/session/all", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+        # Without a tag, the time of the last change is used
+        since = {"If-Modified-Since": "Sun, 01 Jan 2090 00:00:00 GMT"}
+        self.assertEqual(self.client.get("/equipments", headers=since).status_code, 304)
+        since = {"If-Modified-Since": "Sun, 01 Jan 2012 00:00:00 GMT"}
+        self.assertEqual(self.client.get("/equipments", headers=since).status_code, 200)
+
+    def test_fragments_are_cached(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        session = Session.create(date=datetime.date(2013, 12, 1), location=location)
+        m42 = Object.create(name="M42")
+        Observation.create(object=m42, session=session)
+        caching._fragment_cache = None
+        url = f"/session/{session.id}"
+        self.assertIn(b"M42", self.client.get(url).data)
+        with mock.patch.object(
+            Session, "observations", new_callable=mock.PropertyMock
+        ) as observations:
+            self.assertIn(b"M42", self.client.get(url).data)
+            observations.assert_not_called()
+
+        # Nor are the fragments of other templates
+        with mock.patch.object(caching, "_templates_version", "changed"):
+            with mock.patch.object(
+                Session, "observations", new_callable=mock.PropertyMock
+            ) as observations:
+                observations.return_value = []
+                self.assertNotIn(b"M42", self.client.get(url).data)
+
+        m42.name = "M43"
+        m42.save()
+        self.assertIn(b"M43", self.client.get(url).data)
+
+        report = "/ajax/get_report?date=2013-12-01"
+        self.assertIn(b"M43", self.client.get(report).data)
+        with mock.patch("astrolog.web.ajax.get_yearly_report") as yearly:
+            self.assertIn(b"M43", self.client.get(report).data)
+            yearly.assert_not_called()
+
+    def test_compression(self) -> None:
+        for i in range(20):
+            Object.create(name=f"M{i}")
+        plain = self.client.get("/objects")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        response = self.client.get("/objects", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data) / 4)
+
+        # Too small to be worth it
+        response = self.client.get(
+            "/ajax/objects?size=1", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        css = "/static/css/bootstrap.min.css"
+        with open(
+            os.path.join(str(app.static_folder), "css/bootstrap.min.css"), "rb"
+        ) as f:
+            original = f.read()
+        for _ in range(2):
+            response = self.client.get(css, headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(gzip.decompress(response.data), original)
+            response.close()
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli(self) -> None:
+        for i in range(20):
+            Object.create(name=f"M{i}")
+        plain = self.client.get("/objects")
+        response = self.client.get("/objects", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.data), plain.data)
+
+    def test_static_files_are_fingerprinted(self) -> None:
+        with app.test_request_context():
+            url = url_for("static", filename="js/plots.js")
+        path, version = url.split("?v=")
+        self.assertEqual(path, "/static/js/plots.js")
+        response = self.client.get(url)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+        response.close()
+        # Old versions are not kept for long
+        response = self.client.get(f"{path}?v=0123456789ab")
+        self.assertNotIn("immutable", response.headers.get("Cache-Control", ""))
+        response.close()
+
+    def test_uploads_are_served_in_ranges(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            uploads = os.path.join(directory, "uploads")
+            with open("resources/test/M42.png", "rb") as f:
+                image, _ = store_upload(f, "png", uploads)
+            static_folder, app.static_folder = app.static_folder, directory
+            try:
+                url = image.image_loc
+                response = self.client.get(url, headers={"Range": "bytes=0-99"})
+            finally:
+                app.static_folder = static_folder
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(len(response.data), 100)
+            self.assertIn("immutable", response.headers["Cache-Control"])
+            response.close()
+
+    def test_new_observation_with_equipment(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        session = Session.create(date=datetime.date(2013, 12, 1), location=location)
+        url = f"/observation/new/session/{session.id}"
+        self.assertNotIn(b"Dobson", self.client.get(url).data)
+        self.client.post(
+            "/equipments/new/telescope",
+            data={"name": "Dobson", "aperture": 200, "focal_length": 1200},
+        )
+        self.client.post(
+            "/equipments/new/eyepiece",
+            data={"type": "Plossl", "focal_length": 10, "width": 1.25},
+        )
+        self.assertIn(b"Dobson", self.client.get(url).data)
+        planner = self.client.get("/equipments/planner").data
+        self.assertIn(b"Plossl (10mm)", planner)
+        self.assertIn(b"120X", planner)
+
+        telescope, eyepiece = Telescope.get(), EyePiece.get()
+        response = self.client.post(
+            url,
+            data={
+                "object": "M42",
+                "observation-type": "telescope",
+                "telescope_id": telescope.id,
+                "eyepiece_id": eyepiece.id,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        observation = Observation.get()
+        self.assertEqual(observation.telescope, telescope)
+        self.assertEqual(observation.magnification, 120)
+
+    def test_startup_does_not_import_planning_stack(self) -> None:
+        code = (
+            "import sys\n"
+            "import astrolog.web.app\n"
+            "heavy = ('astropy', 'astroquery')\n"
+            "print(','.join(m for m in heavy if m in sys.modules))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, check=True, text=True
+        )
+        self.assertEqual(output.stdout.strip(), "")
+
+    def test_visibility_page(self) -> None:
+        response = self.client.get(
+            "/visibility?location=&latitude=55:51:38&longitude=-9:51:1&date=2023-01-01&name=M42"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'data-url="/visibility/data?latitude=55:51:38&amp;longitude=-9:51:1'
+            b'&amp;date=2023-01-01&amp;name=M42"',
+            response.data,
+        )
+
+    def test_planning_data_invalid(self) -> None:
+        coordinates = "latitude=55:51:38&longitude=-9:51:1"
+        for url, status in (
+            (f"/visibility/data?{coordinates}&date=", 400),
+            (f"/visibility/data?{coordinates}&date=2023-13-01", 400),
+            ("/visibility/data?latitude=55&longitude=9&date=2023-01-01", 400),
+            ("/visibility/data?date=2023-01-01", 400),
+            ("/visibility/data?location=x&date=2023-01-01", 400),
+            ("/visibility/data?location=99&date=2023-01-01", 404),
+            ("/finding-chart/data?name=M42&radius=wide", 400),
+            ("/finding-chart/data?name=M42&radius=nan", 400),
+            ("/finding-chart/data?name=M42&radius=-1", 400),
+            ("/finding-chart/data?name=M42&threshold=", 400),
+        ):
+            with (
+                self.subTest(url=url),
+                mock.patch.object(planning, "plan") as plan,
+            ):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn("error", response.json)
+                plan.assert_not_called()
+
+    def test_visibility_data_is_cached(self) -> None:
+        query = dict(
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude="0",
+            utcoffset="1",
+            date="2023-01-01",
+        )
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            mock.patch.dict(app.config, PLOT_WORKERS=0, PLOT_CACHE_DIR=directory),
+        ):
+            planning._plot_cache = None
+            with mock.patch.object(
+                planning, "_render", wraps=planning._render
+            ) as render:
+                first = self.client.get("/visibility/data", query_string=query)
+                second = self.client.get("/visibility/data", query_string=query)
+                self.assertEqual(render.call_count, 1)
+                # A new worker process only has the disk cache
+                planning._plot_cache = None
+                third = self.client.get("/visibility/data", query_string=query)
+                self.assertEqual(render.call_count, 1)
+                binary = self.client.get(
+                    "/visibility/data", query_string={**query, "format": "float32"}
+                )
+                self.assertEqual(render.call_count, 1)
+            planning._plot_cache = None
+        self.assertEqual(first.status_code, 200)
+        data = first.json
+        self.assertEqual(data["missing"], [])
+        self.assertEqual(set(data["columns"]), {"hours", "sun", "moon"})
+        self.assertEqual(first.json, second.json)
+        self.assertEqual(first.json, third.json)
+
+        self.assertEqual(binary.mimetype, "application/octet-stream")
+        (size,) = struct.unpack("<I", binary.data[:4])
+        header = json.loads(binary.data[4 : 4 + size])
+        self.assertEqual(size % 4, 0)
+        self.assertEqual(header["columns"], ["hours", "sun", "moon"])
+        values = array.array("f", binary.data[4 + size :])
+        self.assertEqual(len(values), 3 * header["length"])
+        self.assertAlmostEqual(values[header["length"] - 1], 12)
+        sun = values[header["length"] : 2 * header["length"]]
+        for encoded, decoded in zip(sun, data["columns"]["sun"]):
+            self.assertAlmostEqual(encoded, decoded, places=4)
+        # Far smaller than the mpld3 figure it replaces (~440kB)
+        self.assertLess(len(first.data), 5000)
+
+    def test_finding_chart_data_is_computed_by_a_job(self) -> None:
+        release = threading.Event()
+        data = {"threshold": 8.0, "columns": {"ra": [], "dec": [], "mag": []}}
+
+        def render(function: str, parameters: dict) -> tuple[dict, list[str]]:
+            release.wait()
+            return data, []
+
+        query = {"name": "M42", "radius": "0.5", "threshold": "8"}
+        with (
+            ThreadPoolExecutor(max_workers=1) as executor,
+            mock.patch.dict(app.config, PLOT_WORKERS=1, PLOT_CACHE_DIR=None),
+            mock.patch.object(planning, "_executor", executor),
+            mock.patch.object(planning, "_jobs", None),
+            mock.patch.object(planning, "_plot_cache", None),
+            mock.patch.object(planning, "_render", side_effect=render) as _render,
+        ):
+            response = self.client.get("/finding-chart/data", query_string=query)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.headers["Location"], response.json["url"])
+            job_url = response.json["url"]
+            # Asking again while the job runs does not start another one
+            again = self.client.get("/finding-chart/data", query_string=query)
+            self.assertEqual(again.json["url"], job_url)
+            self.assertEqual(self.client.get(job_url).status_code, 202)
+
+            release.set()
+            planning._jobs.get(response.json["id"]).future.result()
+            self.assertEqual(self.client.get(job_url).json, {**data, "missing": []})
+            # Now it is cached
+            response = self.client.get("/finding-chart/data", query_string=query)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(_render.call_count, 1)
+            self.assertEqual(self.client.get("/planning/jobs/unknown").status_code, 410)
+
+    def test_one_plot_pool(self) -> None:
+        def make_pool(**options: Any) -> mock.Mock:
+            time.sleep(0.05)
+            return mock.Mock()
+
+        def get_jobs() -> Any:
+            with app.app_context():
+                return planning.get_jobs()
+
+        with (
+            mock.patch.object(planning, "_executor", None),
+            mock.patch.object(planning, "_jobs", None),
+            mock.patch.object(
+                planning, "ProcessPoolExecutor", side_effect=make_pool
+            ) as pool,
+            ThreadPoolExecutor(max_workers=4) as clients,
+        ):
+            queues = [clients.submit(get_jobs) for _ in range(4)]
+            self.assertEqual(len({id(queue.result()) for queue in queues}), 1)
+            self.assertEqual(pool.call_count, 1)
+
+    def test_unknown_job_starts_no_workers(self) -> None:
+        for workers in (0, 1):
+            with (
+                self.subTest(workers=workers),
+                mock.patch.dict(app.config, PLOT_WORKERS=workers),
+                mock.patch.object(planning, "_executor", None),
+                mock.patch.object(planning, "_jobs", None),
+            ):
+                response = self.client.get("/planning/jobs/unknown")
+                self.assertEqual(response.status_code, 410)
+                self.assertIsNone(planning._executor)
+
+    def test_finding_chart_job_without_data(self) -> None:
+        release = threading.Event()
+
+        def render(function: str, parameters: dict) -> tuple[None, list[str]]:
+            release.wait()
+            return None, ["Nowhere"]
+
+        with (
+            ThreadPoolExecutor(max_workers=1) as executor,
+            mock.patch.dict(app.config, PLOT_WORKERS=1, PLOT_CACHE_DIR=None),
+            mock.patch.object(planning, "_executor", executor),
+            mock.patch.object(planning, "_jobs", None),
+            mock.patch.object(planning, "_plot_cache", None),
+            mock.patch.object(planning, "_render", side_effect=render),
+        ):
+            response = self.client.get("/finding-chart/data?name=Nowhere")
+            self.assertEqual(response.status_code, 202)
+            release.set()
+            planning._jobs.get(response.json["id"]).future.result()
+            # Final, unlike the 410 of a job that is not kept, which is asked again
+            done = self.client.get(response.json["url"])
+            self.assertEqual(done.status_code, 404)
+            self.assertEqual(done.json, {"missing": ["Nowhere"]})
+
+    def test_upload_image(self) -> None:
+        location = Location.create(
+            name="Horsens",
+            country="Denmark",
+            latitude="55:51:38",
+            longitude="-9:51:1",
+            altitude=0,
+        )
+        session = Session.create(date=datetime.date(2013, 12, 1), location=location)
+        observation = Observation.create(
+            object=Object.create(name="M42"), session=session
+        )
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            mock.patch.dict(app.config, IMAGE_WORKERS=0, UPLOAD_FOLDER=directory),
+            open("resources/test/M42.png", "rb") as f,
+        ):
+            response = self.client.post(
+                f"/observation/new/image/{observation.id}",
+                data={"file": (f, "M42.png")},
+            )
+            self.assertEqual(response.status_code, 302)
+            image = Observation.get_by_id(observation.id).image
+            for name in ("thumbnail", "preview"):
+                fname = f"{image.sha256[:2]}/{image.sha256}-{name}.jpg"
+                self.assertEqual(getattr(image, name), fname)
+                self.assertEqual(
+                    getattr(image, f"{name}_loc"), f"/static/uploads/{fname}"
+                )
+                self.assertTrue(os.path.exists(os.path.join(directory, fname)))
+        self.assertEqual(image.fname, f"{image.sha256[:2]}/{image.sha256}.png")
+        self.assertIn(image.thumbnail_loc.encode(), self.client.get("/gallery").data)